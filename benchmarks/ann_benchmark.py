@@ -0,0 +1,79 @@
+# benchmarks/ann_benchmark.py
+#
+# Recall@10 and latency of the ANN backends against exact search, on
+# synthetic clustered unit vectors shaped like MiniLM embeddings (d=384).
+#
+#   python -m benchmarks.ann_benchmark --vectors 200000 --queries 500
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from services.ann_index import create_ann_index
+from services.vector_store import VectorStore, encode_vector
+
+
+def _synthetic(n, dim, clusters, rng):
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, n)
+    data = centers[labels] + 0.35 * rng.standard_normal((n, dim)).astype(np.float32)
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    return data
+
+
+def _timed_search(store, queries, top_k, **kwargs):
+    results, latencies = [], []
+    for q in queries:
+        start = time.perf_counter()
+        hits = store.search(q, top_k, **kwargs)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append([key for key, _ in hits])
+    return results, np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--backend", default="ivf")
+    parser.add_argument("--probes", default="4,8,16,32,64")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    data = _synthetic(args.vectors, args.dim, clusters=max(50, args.vectors // 2000), rng=rng)
+    # Queries: perturbed documents, so they fall inside the data distribution
+    queries = data[rng.integers(0, args.vectors, args.queries)]
+    queries = queries + 0.05 * rng.standard_normal(queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    rows = [(i, encode_vector(vec)) for i, vec in enumerate(data)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ann = create_ann_index(args.backend, Path(tmp))
+        store = VectorStore(lambda: rows, ann=ann, ann_min=0)
+
+        start = time.perf_counter()
+        len(store)  # load + build
+        print(f"{args.backend}: built over {args.vectors} vectors in "
+              f"{time.perf_counter() - start:.1f}s")
+
+        truth, exact_ms = _timed_search(store, queries, args.top_k, exact=True)
+        print(f"{'exact':>12}  recall@{args.top_k}=1.000  "
+              f"p50={np.percentile(exact_ms, 50):7.2f}ms  p99={np.percentile(exact_ms, 99):7.2f}ms")
+
+        for probes in [int(p) for p in args.probes.split(",")]:
+            found, ann_ms = _timed_search(store, queries, args.top_k, probes=probes)
+            recall = np.mean([
+                len(set(a) & set(b)) / len(b) for a, b in zip(found, truth)
+            ])
+            print(f"{'probes=' + str(probes):>12}  recall@{args.top_k}={recall:.3f}  "
+                  f"p50={np.percentile(ann_ms, 50):7.2f}ms  p99={np.percentile(ann_ms, 99):7.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# benchmarks/cdc_benchmark.py
+#
+# How much new data each version of an edited file adds once old versions
+# are stored as content-defined chunks (services/chunk_store.py), compared
+# with keeping every version as a whole blob. Each version applies a few
+# small inserts / deletes / overwrites at random offsets.
+#
+#   python -m benchmarks.cdc_benchmark --size-mb 32 --versions 10 --edits 5
+
+import argparse
+import time
+
+import numpy as np
+
+from services.chunk_store import iter_cdc_chunks, CDC_READ_SIZE
+from services.blob_store import content_hasher
+
+
+def _edit(data: bytes, edits: int, rng) -> bytes:
+    buf = bytearray(data)
+    for _ in range(edits):
+        at = int(rng.integers(0, len(buf)))
+        n = int(rng.integers(1, 4096))
+        op = rng.integers(0, 3)
+        if op == 0:
+            buf[at:at] = rng.bytes(n)
+        elif op == 1:
+            del buf[at:at + n]
+        else:
+            buf[at:at + n] = rng.bytes(min(n, len(buf) - at))
+    return bytes(buf)
+
+
+def _pieces(data: bytes):
+    for i in range(0, len(data), CDC_READ_SIZE // 4):
+        yield data[i:i + CDC_READ_SIZE // 4]
+
+
+def _chunk(data: bytes):
+    out = []
+    for chunk in iter_cdc_chunks(_pieces(data)):
+        hasher = content_hasher()
+        hasher.update(chunk)
+        out.append((hasher.hexdigest(), len(chunk)))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=32)
+    parser.add_argument("--versions", type=int, default=10)
+    parser.add_argument("--edits", type=int, default=5, help="edits per version")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    data = rng.bytes(args.size_mb * 1024 * 1024)
+
+    stored = {}
+    whole = chunked = 0
+    chunk_seconds = 0.0
+
+    for version in range(1, args.versions + 1):
+        if version > 1:
+            data = _edit(data, args.edits, rng)
+
+        started = time.perf_counter()
+        chunks = _chunk(data)
+        chunk_seconds += time.perf_counter() - started
+
+        new = 0
+        for chunk_hash, length in chunks:
+            if chunk_hash not in stored:
+                stored[chunk_hash] = length
+                new += length
+        whole += len(data)
+        chunked += new
+        print(f"v{version:<3} size={len(data):>11,}  chunks={len(chunks):>5}  "
+              f"new={new:>11,} ({new / len(data):6.1%})")
+
+    sizes = list(stored.values())
+    print()
+    print(f"whole blobs : {whole:>13,} bytes")
+    print(f"chunk store : {chunked:>13,} bytes  ({whole / chunked:.2f}x smaller)")
+    print(f"chunks      : {len(sizes)} distinct, mean {np.mean(sizes) / 1024:.1f} KiB")
+    print(f"chunking    : {whole / chunk_seconds / 2**20:.1f} MiB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# benchmarks/ocr_benchmark.py
+#
+# OCR throughput (images/s) on synthetic text images: a fresh easyocr.Reader
+# per image (the old extract_image path), the shared reader one image at a
+# time, and the batched path used for multi-image jobs and scanned PDFs.
+#
+#   python -m benchmarks.ocr_benchmark --images 32
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from services.extractors import image_extractor
+
+
+def _synthetic(n, rng):
+    images = []
+    for i in range(n):
+        h, w = rng.integers(600, 1400), rng.integers(800, 2400)
+        img = np.full((h, w, 3), 255, dtype=np.uint8)
+        for line in range(8):
+            cv2.putText(img, f"Invoice {i}-{line} total {rng.integers(1, 99999)} EUR",
+                        (40, 80 + line * 60), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 2)
+        ok, png = cv2.imencode(".png", img)
+        images.append(png.tobytes())
+    return images
+
+
+def _rate(label, n, seconds):
+    print(f"{label:>22}: {n / seconds:6.2f} images/s  ({seconds:.1f}s for {n})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=32)
+    parser.add_argument("--cold", type=int, default=2, help="images for the reader-per-call baseline")
+    args = parser.parse_args()
+
+    images = _synthetic(args.images, np.random.default_rng(0))
+
+    import easyocr
+    start = time.perf_counter()
+    for raw in images[:args.cold]:
+        img = cv2.imdecode(np.frombuffer(raw, np.uint8), cv2.IMREAD_COLOR)
+        easyocr.Reader(["en"]).readtext(img, detail=0)
+    _rate("reader per image", args.cold, time.perf_counter() - start)
+
+    image_extractor.get_reader()  # load once, outside the timings
+
+    start = time.perf_counter()
+    for raw in images:
+        image_extractor.extract_text_from_image(raw)
+    _rate("shared reader", len(images), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    image_extractor.extract_text_from_images(images)
+    _rate("shared reader, batched", len(images), time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
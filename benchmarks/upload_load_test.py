@@ -0,0 +1,110 @@
+# benchmarks/upload_load_test.py
+#
+# Latency of GET /files while several large uploads are being stored, against
+# a running server. Samples GET /files on its own for a few seconds, then again
+# while --uploads concurrent uploads of --size-mb each go to a scratch project,
+# and prints p50 / p95 / p99 for both phases. With uploads stored off the event
+# loop (core/concurrency.py) the two should stay close.
+#
+#   uvicorn main:app --port 8000
+#   python -m benchmarks.upload_load_test --url http://127.0.0.1:8000 --uploads 4 --size-mb 500
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def _report(label, samples):
+    if not samples:
+        print(f"{label:<16} no samples")
+        return
+    print(
+        f"{label:<16} n={len(samples):<5} "
+        + "  ".join(f"p{p}={_percentile(samples, p) * 1000:8.1f} ms" for p in (50, 95, 99))
+        + f"  max={max(samples) * 1000:8.1f} ms"
+    )
+
+
+async def _sample_files(client, stop, interval, samples):
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get("/files")
+        response.raise_for_status()
+        samples.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+
+
+async def _upload(client, project_id, path, name):
+    with open(path, "rb") as f:
+        response = await client.post(
+            f"/projects/{project_id}/upload",
+            files={"file": (name, f, "application/octet-stream")},
+        )
+    response.raise_for_status()
+
+
+async def run(client, uploads, size_mb, baseline_s, interval):
+    """Both phases against `client` (an httpx.AsyncClient pointed at the app)."""
+    response = await client.post("/projects/", params={"name": f"loadtest-{int(time.time())}"})
+    response.raise_for_status()
+    project_id = response.json()["id"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Random bytes: nothing to dedup or compress, so every upload is fully encrypted
+        path = os.path.join(tmp, "payload.bin")
+        with open(path, "wb") as f:
+            for _ in range(size_mb):
+                f.write(os.urandom(1024 * 1024))
+
+        idle = []
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(_sample_files(client, stop, interval, idle))
+        await asyncio.sleep(baseline_s)
+        stop.set()
+        await sampler
+
+        loaded = []
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(_sample_files(client, stop, interval, loaded))
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            _upload(client, project_id, path, f"payload-{i}.bin") for i in range(uploads)
+        ))
+        upload_s = time.perf_counter() - started
+        stop.set()
+        await sampler
+
+    _report("GET /files idle", idle)
+    _report("GET /files load", loaded)
+    print(f"uploads: {uploads} x {size_mb} MiB in {upload_s:.1f}s "
+          f"({uploads * size_mb / upload_s:.1f} MiB/s)")
+    print(f"scratch project id={project_id} (DELETE /projects/{project_id} to clean up)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--uploads", type=int, default=4)
+    parser.add_argument("--size-mb", type=int, default=500)
+    parser.add_argument("--baseline-seconds", type=float, default=5.0)
+    parser.add_argument("--interval", type=float, default=0.05)
+    args = parser.parse_args()
+
+    async def _main():
+        async with httpx.AsyncClient(base_url=args.url, timeout=None) as client:
+            await run(client, args.uploads, args.size_mb, args.baseline_seconds, args.interval)
+
+    asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# core/concurrency.py
+
+import anyio
+from anyio import CapacityLimiter
+from anyio.to_thread import run_sync
+
+from core.config import UPLOAD_CONCURRENCY, DOWNLOAD_CONCURRENCY
+
+# -------------------------------------------------------
+# Bounded thread offloading for the request path
+# -------------------------------------------------------
+#
+# Hashing, compression, AES and sqlite writes block; run on the event loop
+# they stall every other request in the worker. Async endpoints hand that
+# work to threads through these limiters, which are separate from
+# Starlette's default pool (used by plain `def` endpoints such as GET
+# /files), so a burst of large uploads or downloads can't starve it:
+#   - uploads:   at most UPLOAD_CONCURRENCY stored at once (each already
+#                uses the crypto pool's cores), the rest wait their turn
+#   - downloads: response bodies are decrypted in at most
+#                DOWNLOAD_CONCURRENCY threads at a time
+
+_limiters = {}
+
+
+def _limiter(name: str, tokens: int) -> CapacityLimiter:
+    # Created lazily: a CapacityLimiter binds to the running event loop
+    limiter = _limiters.get(name)
+    if limiter is None:
+        limiter = _limiters[name] = CapacityLimiter(max(1, tokens))
+    return limiter
+
+
+async def run_upload_work(fn, *args):
+    """Run a blocking upload step off the event loop, bounded per worker."""
+    return await run_sync(fn, *args, limiter=_limiter("upload", UPLOAD_CONCURRENCY))
+
+
+async def iterate_offloaded(iterator):
+    """
+    Async view of a blocking iterator (e.g. decrypt_file): each next() runs
+    in the download limiter's threads, so the loop only moves bytes.
+    """
+    limiter = _limiter("download", DOWNLOAD_CONCURRENCY)
+    iterator = iter(iterator)
+    sentinel = object()
+    try:
+        while True:
+            piece = await run_sync(next, iterator, sentinel, limiter=limiter)
+            if piece is sentinel:
+                return
+            yield piece
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            with anyio.CancelScope(shield=True):
+                await run_sync(close, limiter=limiter)
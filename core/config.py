@@ -10,9 +10,56 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 STORAGE_DIR = BASE_DIR / "storage"
 DB_PATH = BASE_DIR / "db" / "vault.db"
 LOG_PATH = BASE_DIR / "vault.log"
+BLOB_DIR = BASE_DIR / "blobs"  # content-addressed encrypted blobs (outside STORAGE_DIR)
 
 MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", 500 * 1024 * 1024))  # default 500MB
+# Resumable upload sessions (services/upload_session_service.py); memory use doesn't grow with size
+RESUMABLE_UPLOAD_MAX_SIZE = int(os.getenv("RESUMABLE_UPLOAD_MAX_SIZE", 64 * 1024 ** 3))  # default 64GB
+UPLOAD_SESSION_TTL_HOURS = int(os.getenv("UPLOAD_SESSION_TTL_HOURS", 48))  # idle sessions are dropped
+UPLOAD_SESSION_DIR = BLOB_DIR / "sessions"  # same filesystem as the blobs, so finalize is a rename
 ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
 
+# Semantic search: "ivf" (built-in), "hnsw" (needs hnswlib) or "exact"
+ANN_BACKEND = os.getenv("ANN_BACKEND", "ivf")
+ANN_MIN_VECTORS = int(os.getenv("ANN_MIN_VECTORS", 20000))  # exact search below this
+ANN_INDEX_DIR = DB_PATH.parent  # persisted next to vault.db
+
+# Background indexing (services/job_queue.py)
+INDEX_WORKERS = int(os.getenv("INDEX_WORKERS", 2))
+INDEX_JOB_MAX_ATTEMPTS = int(os.getenv("INDEX_JOB_MAX_ATTEMPTS", 5))
+INDEX_JOB_BACKOFF_SECONDS = float(os.getenv("INDEX_JOB_BACKOFF_SECONDS", 5))  # doubles per retry
+
+# Queue re-extraction / re-embedding of stale index rows at startup (services/reindex_service.py)
+INDEX_SWEEP_ON_STARTUP = os.getenv("INDEX_SWEEP_ON_STARTUP", "1") == "1"
+
+# Text extraction process pool (services/extraction_pool.py); 0 workers = in-process
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", min(4, os.cpu_count() or 1)))
+EXTRACT_MAX_TASKS_PER_CHILD = int(os.getenv("EXTRACT_MAX_TASKS_PER_CHILD", 50))
+EXTRACT_MEMORY_LIMIT_MB = int(os.getenv("EXTRACT_MEMORY_LIMIT_MB", 4096))  # resident memory per worker, 0 = unlimited
+# Address-space backstop (RLIMIT_AS); torch / EasyOCR reserve far more virtual memory than they use
+EXTRACT_ADDRESS_SPACE_LIMIT_MB = int(os.getenv("EXTRACT_ADDRESS_SPACE_LIMIT_MB", 65536))  # 0 = unlimited
+
+# In-memory tier of services/text_cache.py (characters of extracted text)
+TEXT_CACHE_MAX_CHARS = int(os.getenv("TEXT_CACHE_MAX_CHARS", 64_000_000))
+
+# Threads sealing / opening container records in parallel (encryption/crypto_engine.py); 1 = serial
+CRYPTO_WORKERS = int(os.getenv("CRYPTO_WORKERS", os.cpu_count() or 1))
+
+# Threads per worker storing uploads / decrypting download bodies (core/concurrency.py)
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", 4))
+DOWNLOAD_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", 16))
+
+# POST /projects/{id}/upload/batch (services/batch_upload_service.py)
+BATCH_UPLOAD_MAX_FILES = int(os.getenv("BATCH_UPLOAD_MAX_FILES", 10_000))
+BATCH_UPLOAD_WORKERS = int(os.getenv("BATCH_UPLOAD_WORKERS", min(8, os.cpu_count() or 1)))  # blobs staged at once
+
+# GET /files and project listings: rows per page (default / max)
+FILES_PAGE_DEFAULT = int(os.getenv("FILES_PAGE_DEFAULT", 1000))
+FILES_PAGE_MAX = int(os.getenv("FILES_PAGE_MAX", 10_000))
+
+# Extracted text kept per file (file_index + embeddings); the rest is not indexed
+INDEX_MAX_CHARS = int(os.getenv("INDEX_MAX_CHARS", 2_000_000))
+
 # Ensure directories exist
 STORAGE_DIR.mkdir(parents=True, exist_ok=True)
+BLOB_DIR.mkdir(parents=True, exist_ok=True)
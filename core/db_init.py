@@ -1,10 +1,17 @@
-import sqlite3
-from core.config import DB_PATH
+from core.database import get_connection, transaction
+from core.schema import apply_migrations
 
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+    # Opening the shared connection also switches the database to WAL mode
+    get_connection()
 
+    with transaction() as conn:
+        _create_tables(conn.cursor())
+
+    apply_migrations()
+
+
+def _create_tables(cur):
     cur.execute("""
     CREATE TABLE IF NOT EXISTS files (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -58,9 +65,6 @@ def init_db():
     )
     """)
 
-    conn.commit()
-    conn.close()
-
 
 if __name__ == "__main__":
     init_db()
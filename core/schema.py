@@ -0,0 +1,473 @@
+# core/schema.py
+
+import hashlib
+import json
+from array import array
+
+from core.database import get_connection, transaction
+
+# -------------------------------------------------------
+# Versioned schema migrations
+# -------------------------------------------------------
+#
+# Each entry runs once, in order, inside its own transaction; the applied
+# version is tracked in SQLite's `PRAGMA user_version`. Append new steps at
+# the end, never edit or reorder applied ones.
+
+
+def _column_exists(cur, table: str, column: str) -> bool:
+    cur.execute(f"PRAGMA table_info({table})")
+    return column in [row[1] for row in cur.fetchall()]
+
+
+def _v1_projects_and_versioning(cur):
+    # Same shape as migrations/migrate_phase2.py, for databases that never ran it
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS projects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            created_at TEXT NOT NULL
+        )
+    """)
+    for column in ("project_id", "version", "is_latest"):
+        if not _column_exists(cur, "files", column):
+            cur.execute(f"ALTER TABLE files ADD COLUMN {column} INTEGER")
+
+
+def _v2_hot_path_indexes(cur):
+    # Version history / next-version lookup / flipping is_latest
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_files_project_name_version
+        ON files (project_id, name, version)
+    """)
+    # Latest files of a project, ordered by name
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_files_project_latest_name
+        ON files (project_id, is_latest, name)
+    """)
+    # Metadata / content search: latest versions ordered by recency
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_files_latest_modified
+        ON files (is_latest, modified_at)
+    """)
+    # Folder scanner and consistency lookups by relative path
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_files_path ON files (path)")
+
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_file_tags_file_tag
+        ON file_tags (file_id, tag)
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_file_tags_tag ON file_tags (tag)")
+
+
+def _v3_file_index_fts(cur):
+    # External-content FTS5 index over file_index.content, kept in sync by triggers
+    cur.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS file_index_fts USING fts5(
+            content,
+            content = 'file_index',
+            content_rowid = 'id',
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS file_index_fts_ai AFTER INSERT ON file_index BEGIN
+            INSERT INTO file_index_fts (rowid, content) VALUES (new.id, new.content);
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS file_index_fts_ad AFTER DELETE ON file_index BEGIN
+            INSERT INTO file_index_fts (file_index_fts, rowid, content)
+            VALUES ('delete', old.id, old.content);
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS file_index_fts_au AFTER UPDATE OF content ON file_index BEGIN
+            INSERT INTO file_index_fts (file_index_fts, rowid, content)
+            VALUES ('delete', old.id, old.content);
+            INSERT INTO file_index_fts (rowid, content) VALUES (new.id, new.content);
+        END
+    """)
+    # Index everything extracted before the FTS table existed
+    cur.execute("INSERT INTO file_index_fts (file_index_fts) VALUES ('rebuild')")
+
+
+def _v4_binary_embeddings(cur):
+    # JSON TEXT vectors → little-endian float32 BLOBs (4x smaller, no parsing on load)
+    cur.execute("SELECT id, embedding FROM file_embeddings WHERE typeof(embedding) = 'text'")
+    for row_id, text in cur.fetchall():
+        blob = array("f", json.loads(text)).tobytes()
+        cur.execute("UPDATE file_embeddings SET embedding = ? WHERE id = ?", (blob, row_id))
+
+
+def _v5_file_chunks(cur):
+    # Overlapping text windows per file; the text itself is sliced from
+    # file_index.content via start_char/end_char instead of being duplicated
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS file_chunks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_id INTEGER NOT NULL,
+            chunk_index INTEGER NOT NULL,
+            start_char INTEGER NOT NULL,
+            end_char INTEGER NOT NULL,
+            embedding BLOB,
+            model_name TEXT,
+            created_at TEXT NOT NULL,
+            UNIQUE (file_id, chunk_index),
+            FOREIGN KEY (file_id) REFERENCES files(id) ON DELETE CASCADE
+        )
+    """)
+
+
+def _v6_index_jobs(cur):
+    # Persistent background job queue (services/job_queue.py)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS index_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_id INTEGER NOT NULL,
+            kind TEXT NOT NULL DEFAULT 'index',
+            priority INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            next_run_at TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            started_at TEXT,
+            finished_at TEXT,
+            FOREIGN KEY (file_id) REFERENCES files(id) ON DELETE CASCADE
+        )
+    """)
+    # At most one pending job per file and kind (enqueue dedups onto it)
+    cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_index_jobs_pending
+        ON index_jobs (file_id, kind) WHERE status = 'pending'
+    """)
+    # Claim order for workers
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_index_jobs_claim
+        ON index_jobs (status, priority DESC, next_run_at)
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_index_jobs_file
+        ON index_jobs (file_id)
+    """)
+
+
+def _v7_file_index_locations(cur):
+    # Segment boundaries from the streaming extractors ([{"start", "page"|...}])
+    # and whether the text was cut at INDEX_MAX_CHARS
+    if not _column_exists(cur, "file_index", "locations"):
+        cur.execute("ALTER TABLE file_index ADD COLUMN locations TEXT")
+    if not _column_exists(cur, "file_index", "truncated"):
+        cur.execute("ALTER TABLE file_index ADD COLUMN truncated INTEGER NOT NULL DEFAULT 0")
+
+
+def _v8_blob_store(cur):
+    # Content-addressed encrypted blobs (services/blob_store.py); `refcount`
+    # counts the files rows pointing at a blob and is kept by triggers, so
+    # every delete path (single file, cascade, repair) releases references
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS blobs (
+            hash TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            plain_size INTEGER NOT NULL,
+            refcount INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL
+        )
+    """)
+    if not _column_exists(cur, "files", "blob_hash"):
+        cur.execute("ALTER TABLE files ADD COLUMN blob_hash TEXT")
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_files_blob_hash
+        ON files (blob_hash) WHERE blob_hash IS NOT NULL
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_blobs_unreferenced
+        ON blobs (refcount) WHERE refcount <= 0
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS files_blob_ai AFTER INSERT ON files
+        WHEN new.blob_hash IS NOT NULL BEGIN
+            UPDATE blobs SET refcount = refcount + 1 WHERE hash = new.blob_hash;
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS files_blob_ad AFTER DELETE ON files
+        WHEN old.blob_hash IS NOT NULL BEGIN
+            UPDATE blobs SET refcount = refcount - 1 WHERE hash = old.blob_hash;
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS files_blob_au AFTER UPDATE OF blob_hash ON files
+        WHEN old.blob_hash IS NOT new.blob_hash BEGIN
+            UPDATE blobs SET refcount = refcount - 1 WHERE hash = old.blob_hash;
+            UPDATE blobs SET refcount = refcount + 1 WHERE hash = new.blob_hash;
+        END
+    """)
+
+
+def _v9_chunk_manifests(cur):
+    # Content-defined chunk store for superseded versions (services/chunk_store.py):
+    # a version with storage = 'chunks' is the ordered list in file_manifests
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS chunks (
+            hash TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            plain_size INTEGER NOT NULL,
+            refcount INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS file_manifests (
+            file_id INTEGER NOT NULL,
+            seq INTEGER NOT NULL,
+            chunk_hash TEXT NOT NULL,
+            offset INTEGER NOT NULL,
+            length INTEGER NOT NULL,
+            PRIMARY KEY (file_id, seq),
+            FOREIGN KEY (file_id) REFERENCES files(id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    """)
+    if not _column_exists(cur, "files", "storage"):
+        cur.execute("ALTER TABLE files ADD COLUMN storage TEXT NOT NULL DEFAULT 'blob'")
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_chunks_unreferenced
+        ON chunks (refcount) WHERE refcount <= 0
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS file_manifests_ai AFTER INSERT ON file_manifests BEGIN
+            UPDATE chunks SET refcount = refcount + 1 WHERE hash = new.chunk_hash;
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS file_manifests_ad AFTER DELETE ON file_manifests BEGIN
+            UPDATE chunks SET refcount = refcount - 1 WHERE hash = old.chunk_hash;
+        END
+    """)
+
+
+def _v10_compression(cur):
+    # Per-blob compression codec (encryption/compression.py) and the logical
+    # (plaintext) size next to the physical `size` on each files row
+    if not _column_exists(cur, "blobs", "compression"):
+        cur.execute("ALTER TABLE blobs ADD COLUMN compression TEXT")
+    for column, kind in (("plain_size", "INTEGER"), ("compression", "TEXT")):
+        if not _column_exists(cur, "files", column):
+            cur.execute(f"ALTER TABLE files ADD COLUMN {column} {kind}")
+    cur.execute("""
+        UPDATE files SET plain_size = (
+            SELECT b.plain_size FROM blobs b WHERE b.hash = files.blob_hash
+        )
+        WHERE plain_size IS NULL AND blob_hash IS NOT NULL
+    """)
+
+
+def _v11_index_provenance(cur):
+    # What each derived row was built from, so the sweeper (services/
+    # reindex_service.py) only redoes stale work:
+    #   files.content_hash          plaintext HMAC (= blob hash; survives chunking)
+    #   file_index.content_hash     files.content_hash at extraction time
+    #   file_index.extractor_version
+    #   file_index.text_hash        sha256 of the extracted text
+    #   file_embeddings.text_hash   text_hash the vectors were computed from
+    if not _column_exists(cur, "files", "content_hash"):
+        cur.execute("ALTER TABLE files ADD COLUMN content_hash TEXT")
+    for column, kind in (("content_hash", "TEXT"), ("extractor_version", "INTEGER"),
+                         ("text_hash", "TEXT")):
+        if not _column_exists(cur, "file_index", column):
+            cur.execute(f"ALTER TABLE file_index ADD COLUMN {column} {kind}")
+    if not _column_exists(cur, "file_embeddings", "text_hash"):
+        cur.execute("ALTER TABLE file_embeddings ADD COLUMN text_hash TEXT")
+
+    cur.execute("UPDATE files SET content_hash = blob_hash WHERE content_hash IS NULL")
+
+    # Existing text and vectors were written together, so they match; the
+    # extractor version of old rows is unknown and left NULL (= stale)
+    cur.connection.create_function(
+        "sha256_hex", 1,
+        lambda text: hashlib.sha256((text or "").encode("utf-8")).hexdigest(),
+    )
+    cur.execute("UPDATE file_index SET text_hash = sha256_hex(content) WHERE text_hash IS NULL")
+    cur.execute("""
+        UPDATE file_embeddings SET text_hash = (
+            SELECT i.text_hash FROM file_index i WHERE i.file_id = file_embeddings.file_id
+        )
+        WHERE text_hash IS NULL
+    """)
+
+
+def _v12_upload_sessions(cur):
+    # Resumable uploads (services/upload_session_service.py): `received`
+    # plaintext bytes are sealed into the session's partial container, which
+    # is `stored_size` bytes long (anything past that was left by an
+    # interrupted append and is truncated on resume)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS upload_sessions (
+            id TEXT PRIMARY KEY,
+            project_id INTEGER,
+            filename TEXT NOT NULL,
+            total_size INTEGER NOT NULL,
+            received INTEGER NOT NULL DEFAULT 0,
+            stored_size INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_upload_sessions_updated
+        ON upload_sessions (updated_at)
+    """)
+
+
+def _v13_listing_indexes(cur):
+    # Sort keys of GET /files and project listings (file_service_db.query_files),
+    # all versions / latest only / per project. The rowid every index ends
+    # with doubles as the (sort key, id) keyset tie-breaker.
+    for name, columns in (
+        ("idx_files_name", "name"),
+        ("idx_files_modified", "modified_at"),
+        ("idx_files_size", "size"),
+        ("idx_files_latest_name", "is_latest, name"),
+        ("idx_files_latest_size", "is_latest, size"),
+        ("idx_files_project_latest_modified", "project_id, is_latest, modified_at"),
+        ("idx_files_project_latest_size", "project_id, is_latest, size"),
+    ):
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON files ({columns})")
+
+
+def _v14_upload_session_reservations(cur):
+    # Record indices an upload session has handed to the cipher, committed
+    # before they are sealed: when it runs ahead of `received` an append was
+    # interrupted and its indices may be on disk already, so the session is
+    # re-keyed instead of sealing them again under the same nonces
+    if not _column_exists(cur, "upload_sessions", "sealed_records"):
+        cur.execute("ALTER TABLE upload_sessions ADD COLUMN sealed_records INTEGER NOT NULL DEFAULT 0")
+
+
+SCHEMA_MIGRATIONS = [
+    (1, "projects table and versioning columns", _v1_projects_and_versioning),
+    (2, "hot path indexes on files and file_tags", _v2_hot_path_indexes),
+    (3, "FTS5 full-text index over file_index", _v3_file_index_fts),
+    (4, "float32 BLOB embeddings", _v4_binary_embeddings),
+    (5, "file_chunks for passage-level embeddings", _v5_file_chunks),
+    (6, "index_jobs background queue", _v6_index_jobs),
+    (7, "file_index segment locations and truncation flag", _v7_file_index_locations),
+    (8, "content-addressed blob store with refcounts", _v8_blob_store),
+    (9, "chunk store and version manifests", _v9_chunk_manifests),
+    (10, "compression codec and logical sizes", _v10_compression),
+    (11, "content hash, extractor version and text hash on derived rows", _v11_index_provenance),
+    (12, "resumable upload sessions", _v12_upload_sessions),
+    (13, "indexes for keyset-paginated file listings", _v13_listing_indexes),
+    (14, "record reservations on upload sessions", _v14_upload_session_reservations),
+]
+
+
+def get_schema_version() -> int:
+    return get_connection().execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations():
+    """
+    Bring the database up to the latest schema version. Returns the list of
+    versions applied by this call (empty when already current).
+    """
+    applied = []
+    current = get_schema_version()
+
+    for version, _description, step in SCHEMA_MIGRATIONS:
+        if version <= current:
+            continue
+        with transaction() as conn:
+            step(conn.cursor())
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+        applied.append(version)
+
+    if applied:
+        get_connection().execute("PRAGMA optimize")
+
+    return applied
+
+
+# -------------------------------------------------------
+# Query planner audit
+# -------------------------------------------------------
+#
+# The hot-path queries, with representative parameters. The SQL is taken
+# from the modules that run it, so the audit can't drift from the real
+# statements (imported lazily: those modules import core.database).
+
+def hot_path_queries() -> dict:
+    """{query_name: (sql, params)} for every hot-path statement."""
+    from file_system.folder_scanner import FILE_BY_PATH_SQL
+    from services.file_service import MARK_NOT_LATEST_SQL, ARCHIVE_LATEST_PATH_SQL
+    from services.file_service_db import (
+        PROJECT_FILES_LATEST_SQL,
+        FILE_VERSIONS_SQL,
+        MAX_VERSION_SQL,
+        listing_query,
+    )
+    from services.job_queue import CLAIM_JOB_SQL
+    from services.search_service import CONTENT_SEARCH_SQL, search_files_query
+    from services.tag_service import TAG_EXISTS_SQL
+
+    def listing(**kwargs):
+        _, sql, params = listing_query(limit=100, **kwargs)
+        return sql, params
+
+    return {
+        "list_files_page_by_name": listing(latest_only=True, sort="name", after=("a.txt", 1)),
+        "list_files_page_by_modified": listing(sort="modified_at", descending=True, after=("9999", 1)),
+        "list_files_page_by_id": listing(after=(1, 1)),
+        "list_project_files_page_by_size": listing(project_id=1, latest_only=True, sort="size",
+                                                   after=(0, 1)),
+        "get_project_files_latest": (PROJECT_FILES_LATEST_SQL, (1,)),
+        "get_file_versions": (FILE_VERSIONS_SQL, (1, "a.txt")),
+        "next_version": (MAX_VERSION_SQL, (1, "a.txt")),
+        "archive_latest_path": (ARCHIVE_LATEST_PATH_SQL, ("p/Version Control/a-v1.txt", 1, "a.txt")),
+        "mark_old_versions_not_latest": (MARK_NOT_LATEST_SQL, (1, "a.txt")),
+        "search_files": search_files_query(q="a", limit=10),
+        "search_files_by_tag": search_files_query(tag="x", limit=10),
+        "tag_exists": (TAG_EXISTS_SQL, (1, "x")),
+        "scan_and_index": (FILE_BY_PATH_SQL, ("a.txt",)),
+        "search_by_content": (CONTENT_SEARCH_SQL, ('"invoice"', 10)),
+        "claim_index_job": (CLAIM_JOB_SQL, ("9999",)),
+    }
+
+
+def audit_query_plans():
+    """
+    Run EXPLAIN QUERY PLAN over hot_path_queries() and return the ones that
+    fall back to a full table scan, as {query_name: [plan details]}.
+    An empty dict means every hot path is served by an index.
+    """
+    conn = get_connection()
+    offenders = {}
+
+    for name, (sql, params) in hot_path_queries().items():
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        details = [row[3] for row in plan]
+        # "SCAN f" is a table scan; "SCAN f USING INDEX ..." walks an index and
+        # "SCAN x VIRTUAL TABLE INDEX ..." is an FTS lookup
+        scans = [
+            d for d in details
+            if d.startswith("SCAN") and "USING" not in d and "VIRTUAL TABLE" not in d
+        ]
+        if scans:
+            offenders[name] = details
+
+    return offenders
+
+
+if __name__ == "__main__":
+    from core.db_init import init_db
+
+    init_db()
+    print(f"Schema version: {get_schema_version()}")
+
+    problems = audit_query_plans()
+    for name, details in problems.items():
+        print(f"FULL SCAN in {name}: {details}")
+    if not problems:
+        print("All hot-path queries use an index.")
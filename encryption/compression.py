@@ -0,0 +1,93 @@
+# encryption/compression.py
+
+import os
+import zlib
+
+# -------------------------------------------------------
+# Per-record compression inside the encrypted container
+# -------------------------------------------------------
+#
+# Ciphertext doesn't compress, so compression has to happen before
+# encryption. crypto_engine compresses each container record on its own,
+# which keeps streaming downloads and range reads (only the overlapping
+# records are decompressed). zstd and lz4 are used when installed; zlib
+# (stdlib) is always available. The codec id lives in the container header
+# flags, so readers never need the policy below.
+
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+CODEC_LZ4 = 3
+
+CODEC_NAMES = {CODEC_NONE: None, CODEC_ZLIB: "zlib", CODEC_ZSTD: "zstd", CODEC_LZ4: "lz4"}
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+
+# Already compressed containers / media: recompressing wastes CPU for ~0%
+SKIP_EXTENSIONS = {
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic",
+    ".mp3", ".mp4", ".m4a", ".mov", ".mkv", ".avi", ".webm", ".ogg", ".flac",
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".zst", ".7z", ".rar", ".lz4",
+    ".docx", ".xlsx", ".pptx", ".odt", ".ods", ".odp", ".epub", ".jar",
+}
+
+# Text-like formats compress several times over: spend more CPU on them
+TEXT_EXTENSIONS = {
+    ".txt", ".csv", ".tsv", ".json", ".jsonl", ".log", ".md", ".xml",
+    ".html", ".htm", ".yaml", ".yml", ".sql", ".py", ".js", ".ts", ".css",
+}
+
+
+def compression_for(filename: str):
+    """
+    (codec, level) to store `filename` with, or None to store it as is.
+    Text gets a stronger zstd level; other binaries (pdf, xls, ...) a fast
+    one, or lz4 when zstd is unavailable.
+    """
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext in SKIP_EXTENSIONS:
+        return None
+
+    text = ext in TEXT_EXTENSIONS
+    if zstandard is not None:
+        return (CODEC_ZSTD, 9 if text else 3)
+    if lz4_frame is not None and not text:
+        return (CODEC_LZ4, 0)
+    return (CODEC_ZLIB, 6 if text else 1)
+
+
+def codec_name(codec: int):
+    return CODEC_NAMES.get(codec)
+
+
+def compress(codec: int, level: int, data: bytes) -> bytes:
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    if codec == CODEC_LZ4:
+        return lz4_frame.compress(data, compression_level=level)
+    if codec == CODEC_ZLIB:
+        return zlib.compress(data, level)
+    raise ValueError(f"Unknown compression codec: {codec}")
+
+
+def decompress(codec: int, data: bytes) -> bytes:
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("Blob is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == CODEC_LZ4:
+        if lz4_frame is None:
+            raise ValueError("Blob is lz4-compressed but lz4 is not installed")
+        return lz4_frame.decompress(data)
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(data)
+    raise ValueError(f"Unknown compression codec: {codec}")
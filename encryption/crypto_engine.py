@@ -1,7 +1,15 @@
 import os
+import struct
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 from Crypto.Cipher import AES
+from Crypto.Hash import SHA256
+from Crypto.Protocol.KDF import HKDF
 from Crypto.Random import get_random_bytes
-from core.config import BASE_DIR
+from core.config import BASE_DIR, CRYPTO_WORKERS
+from encryption.compression import CODEC_NONE, compress, decompress
 
 KEY_PATH = os.path.join(BASE_DIR, "encryption", "vault.key")
 
@@ -12,7 +20,7 @@ def load_or_create_key():
     if os.path.exists(KEY_PATH):
         with open(KEY_PATH, "rb") as f:
             return f.read()
-    
+
     key = get_random_bytes(32)  # AES-256
     with open(KEY_PATH, "wb") as f:
         f.write(key)
@@ -21,8 +29,63 @@ def load_or_create_key():
 KEY = load_or_create_key()
 
 
+# -------------------------------------------------------
+# Chunked container format
+# -------------------------------------------------------
+#
+#   header : MAGIC (4) | version (1) | flags (1) | chunk_size (4) | nonce_prefix (8)
+#            | salt (16, version 2 only)
+#   record : AES-GCM ciphertext | tag (16)
+#
+# The plaintext is cut into full `chunk_size` records followed by exactly one
+# final record holding the remaining 0..chunk_size-1 bytes. Each record is
+# authenticated on its own (nonce = prefix + index, AAD = header + index +
+# final flag), so records can be produced, verified and decrypted one at a
+# time and reordering or truncation is detected.
+#
+# Version 2 seals records under a per-file key, HKDF-SHA256(vault key, salt),
+# so no two files ever share a (key, nonce) pair even if the random nonce
+# prefixes collide. Version 1 containers (vault key directly) stay readable.
+#
+# Compressed containers (flags = codec id, see encryption/compression.py)
+# compress each chunk_size slice of plaintext before sealing it, so records
+# vary in length and carry a prefix:
+#
+#   record : length (4, bit 31 = final, bit 30 = stored raw) | ciphertext | tag
+#
+# The prefix is part of the record's AAD. Slices that don't shrink are
+# stored raw. Range reads walk the prefixes to find the records they need.
+#
+# Records are independent, so sealing / opening (and compression) run on a
+# shared thread pool; PyCryptodome and zlib release the GIL while they work.
+# Reads and writes stay sequential and at most CRYPTO_WORKERS * 2 records
+# are in flight.
+
+MAGIC = b"VLTC"
+FORMAT_VERSION = 2
+READABLE_VERSIONS = (1, 2)
+CHUNK_SIZE = 1024 * 1024  # 1 MB plaintext per record
+TAG_SIZE = 16
+HEADER_STRUCT = struct.Struct(">4sBBI8s")   # version 1 header, common to all versions
+HEADER_SIZE = HEADER_STRUCT.size            # enough to recognise any container
+SALT_SIZE = 16
+HEADER_SIZE_V2 = HEADER_SIZE + SALT_SIZE
+KDF_CONTEXT = b"vault-container-v2"
+
+RECORD_PREFIX = struct.Struct(">I")
+PREFIX_FINAL = 1 << 31
+PREFIX_RAW = 1 << 30
+PREFIX_LENGTH = PREFIX_RAW - 1
+
+LEGACY_BLOCK = 16
+LEGACY_READ_SIZE = 64 * 1024
+
+_pool_lock = threading.Lock()
+_pool = None
+
+
 def pad(data):
-    pad_len = 16 - (data.len % 16)
+    pad_len = 16 - (len(data) % 16)
     return data + bytes([pad_len] * pad_len)
 
 
@@ -31,24 +94,556 @@ def unpad(data):
     return data[:-pad_len]
 
 
-def encrypt_bytes(raw_bytes):
-    iv = get_random_bytes(16)
+def _file_key(salt: bytes) -> bytes:
+    return HKDF(KEY, 32, salt, SHA256, context=KDF_CONTEXT)
+
+
+def _record_cipher(info: dict, index: int, final: bool, prefix: bytes = b""):
+    nonce = info["nonce_prefix"] + struct.pack(">I", index)
+    cipher = AES.new(info["key"], AES.MODE_GCM, nonce=nonce)
+    cipher.update(info["raw"] + struct.pack(">IB", index, 1 if final else 0) + prefix)
+    return cipher
+
+
+def _parse_header(header: bytes):
+    if len(header) < HEADER_SIZE:
+        raise ValueError("Truncated container header")
+
+    magic, version, flags, chunk_size, nonce_prefix = HEADER_STRUCT.unpack(header[:HEADER_SIZE])
+    if magic != MAGIC or version not in READABLE_VERSIONS:
+        raise ValueError("Not a chunked vault container")
+    if chunk_size <= 0:
+        raise ValueError("Invalid container chunk size")
+
+    if version == 1:
+        header_size, key = HEADER_SIZE, KEY
+    else:
+        header_size = HEADER_SIZE_V2
+        if len(header) < header_size:
+            raise ValueError("Truncated container header")
+        key = _file_key(header[HEADER_SIZE:header_size])
+
+    return {
+        "version": version,
+        "flags": flags,
+        "chunk_size": chunk_size,
+        "nonce_prefix": nonce_prefix,
+        "header_size": header_size,
+        "key": key,
+        "raw": header[:header_size],
+    }
+
+
+def is_container(head: bytes) -> bool:
+    """
+    True if `head` (at least the first HEADER_SIZE bytes of a blob) starts
+    a chunked container. Anything else is treated as a legacy IV+CBC blob.
+    """
+    return len(head) >= HEADER_SIZE and head[:4] == MAGIC and head[4] in READABLE_VERSIONS
+
+
+def _read_exact(reader, size: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < size:
+        part = reader.read(size - len(buf))
+        if not part:
+            break
+        buf += part
+    return bytes(buf)
+
+
+def _read_header(reader):
+    """
+    Read a container header from `reader`. Returns (info, head); info is
+    None when the bytes read (`head`) start a legacy blob instead.
+    """
+    head = _read_exact(reader, HEADER_SIZE)
+    if not is_container(head):
+        return None, head
+    if head[4] == 2:
+        head += _read_exact(reader, SALT_SIZE)
+    return _parse_header(head), head
+
+
+# -------------------------------------------------------
+# Parallel record pipeline
+# -------------------------------------------------------
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=CRYPTO_WORKERS, thread_name_prefix="crypto")
+        return _pool
+
+
+def _pipelined(calls):
+    """
+    Run the (fn, *args) tuples produced by `calls` on the crypto pool and
+    yield their results in order. `calls` is consumed lazily, so reading
+    input stays in the caller's thread and memory is bounded by the window.
+    """
+    if CRYPTO_WORKERS <= 1:
+        for fn, *args in calls:
+            yield fn(*args)
+        return
+
+    pool = _get_pool()
+    window = CRYPTO_WORKERS * 2
+    pending = deque()
+    try:
+        for fn, *args in calls:
+            pending.append(pool.submit(fn, *args))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _seal_record(info: dict, codec: int, level: int, index: int, chunk: bytes,
+                 final: bool) -> bytes:
+    if codec == CODEC_NONE:
+        ciphertext, tag = _record_cipher(info, index, final).encrypt_and_digest(chunk)
+        return ciphertext + tag
+
+    body, flags = compress(codec, level, chunk), 0
+    if len(body) >= len(chunk):
+        body, flags = chunk, PREFIX_RAW
+    if final:
+        flags |= PREFIX_FINAL
+    prefix = RECORD_PREFIX.pack(len(body) | flags)
+    ciphertext, tag = _record_cipher(info, index, final, prefix).encrypt_and_digest(body)
+    return prefix + ciphertext + tag
+
+
+def _open_record(info: dict, index: int, record: bytes, final: bool) -> bytes:
+    cipher = _record_cipher(info, index, final)
+    return cipher.decrypt_and_verify(record[:-TAG_SIZE], record[-TAG_SIZE:])
+
+
+def _open_compressed_record(info: dict, index: int, prefix: bytes, record: bytes) -> bytes:
+    word = RECORD_PREFIX.unpack(prefix)[0]
+    length = word & PREFIX_LENGTH
+    if len(record) < length + TAG_SIZE:
+        raise ValueError("Container truncated")
+
+    final = bool(word & PREFIX_FINAL)
+    cipher = _record_cipher(info, index, final, prefix)
+    body = cipher.decrypt_and_verify(record[:length], record[length:length + TAG_SIZE])
+    return body if word & PREFIX_RAW else decompress(info["flags"], body)
+
+
+# -------------------------------------------------------
+# Streaming encrypt / decrypt
+# -------------------------------------------------------
+
+def encrypt_stream(reader, chunk_size: int = CHUNK_SIZE, compression=None):
+    """
+    Encrypt a binary file-like object into the chunked container format.
+    Yields the header and then one sealed record at a time; records are
+    sealed in parallel, with only a bounded window of plaintext in memory.
+    `compression` is a (codec, level) pair from
+    encryption.compression.compression_for, or None.
+    """
+    codec, level = compression or (CODEC_NONE, 0)
+    header = new_container_header(compression, chunk_size)
+    info = _parse_header(header)
+    yield header
+
+    def calls():
+        index = 0
+        while True:
+            chunk = _read_exact(reader, chunk_size)
+            final = len(chunk) < chunk_size
+            yield _seal_record, info, codec, level, index, chunk, final
+            if final:
+                return
+            index += 1
+
+    yield from _pipelined(calls())
+
+
+def new_container_header(compression=None, chunk_size: int = CHUNK_SIZE) -> bytes:
+    """Header of a new container (fresh nonce prefix and key salt)."""
+    codec = compression[0] if compression else CODEC_NONE
+    return HEADER_STRUCT.pack(
+        MAGIC, FORMAT_VERSION, codec, chunk_size, get_random_bytes(8)
+    ) + get_random_bytes(SALT_SIZE)
+
+
+def seal_records(header: bytes, first_index: int, data: bytes, final: bool, level: int = 0):
+    """
+    Seal `data` as records first_index, first_index + 1, ... of the
+    container started by `header`, for containers written a piece at a time
+    (resumable uploads). `data` must be whole chunk_size slices unless
+    `final`, in which case its remainder (possibly empty) becomes the final
+    record. Yields the sealed records in order.
+    """
+    info = _parse_header(header)
+    chunk_size = info["chunk_size"]
+    if not final and len(data) % chunk_size:
+        raise ValueError("Only the final piece may end inside a record")
+
+    def calls():
+        index, offset = first_index, 0
+        while True:
+            chunk = data[offset:offset + chunk_size]
+            last = final and len(chunk) < chunk_size
+            if len(chunk) == chunk_size or last:
+                yield _seal_record, info, info["flags"], level, index, chunk, last
+            if len(chunk) < chunk_size:
+                return
+            index, offset = index + 1, offset + chunk_size
+
+    yield from _pipelined(calls())
+
+
+def reseal_records(reader, header: bytes, level: int = 0):
+    """
+    Re-encrypt a partial container (records up to EOF, none final yet) from
+    `reader` under the new `header`, which must use the same codec and
+    chunk size. Used to move a resumable upload to a fresh key when records
+    past its committed end may have been sealed already. Yields the new
+    records in order.
+    """
+    old, _ = _read_header(reader)
+    info = _parse_header(header)
+    if old is None or (old["flags"], old["chunk_size"]) != (info["flags"], info["chunk_size"]):
+        raise ValueError("Headers do not describe the same container layout")
+
+    def calls():
+        index = 0
+        while True:
+            if info["flags"] == CODEC_NONE:
+                record = _read_exact(reader, info["chunk_size"] + TAG_SIZE)
+                if not record:
+                    return
+                if len(record) < info["chunk_size"] + TAG_SIZE:
+                    raise ValueError("Container truncated")
+                chunk = _open_record(old, index, record, False)
+            else:
+                prefix = _read_exact(reader, RECORD_PREFIX.size)
+                if not prefix:
+                    return
+                if len(prefix) < RECORD_PREFIX.size:
+                    raise ValueError("Container truncated")
+                word = RECORD_PREFIX.unpack(prefix)[0]
+                if word & PREFIX_FINAL:
+                    raise ValueError("Container is already complete")
+                record = _read_exact(reader, (word & PREFIX_LENGTH) + TAG_SIZE)
+                chunk = _open_compressed_record(old, index, prefix, record)
+            yield _seal_record, info, info["flags"], level, index, chunk, False
+            index += 1
+
+    yield from _pipelined(calls())
+
+
+def decrypt_stream(reader):
+    """
+    Decrypt a chunked container (or a legacy IV+CBC blob) from a binary
+    file-like object, yielding plaintext pieces. Raises ValueError if any
+    record fails authentication or the container is truncated.
+    """
+    info, head = _read_header(reader)
+    if info is None:
+        yield from _decrypt_legacy_stream(head, reader)
+        return
+
+    if info["flags"] != CODEC_NONE:
+        yield from _pipelined(_compressed_record_calls(info, reader))
+        return
+
+    record_size = info["chunk_size"] + TAG_SIZE
+
+    def calls():
+        index = 0
+        while True:
+            record = _read_exact(reader, record_size)
+            if len(record) < TAG_SIZE:
+                raise ValueError("Container truncated")
+
+            final = len(record) < record_size
+            yield _open_record, info, index, record, final
+            if final:
+                return
+            index += 1
+
+    yield from _pipelined(calls())
+
+
+def _compressed_record_calls(info: dict, reader):
+    index = 0
+    while True:
+        prefix = _read_exact(reader, RECORD_PREFIX.size)
+        if len(prefix) < RECORD_PREFIX.size:
+            raise ValueError("Container truncated")
+        word = RECORD_PREFIX.unpack(prefix)[0]
+        record = _read_exact(reader, (word & PREFIX_LENGTH) + TAG_SIZE)
+        yield _open_compressed_record, info, index, prefix, record
+
+        if word & PREFIX_FINAL:
+            return
+        index += 1
+
+
+def _decrypt_legacy_stream(head: bytes, reader):
+    """
+    Streaming decrypt of the original IV + AES-CBC blob format. CBC decrypts
+    block by block, so only the last block is held back for unpadding.
+    """
+    iv, pending = head[:LEGACY_BLOCK], head[LEGACY_BLOCK:]
+    if len(iv) < LEGACY_BLOCK:
+        raise ValueError("Legacy blob truncated")
+
     cipher = AES.new(KEY, AES.MODE_CBC, iv)
 
-    # Pad before encrypt
-    pad_len = 16 - (len(raw_bytes) % 16)
-    raw_padded = raw_bytes + bytes([pad_len] * pad_len)
+    while True:
+        part = reader.read(LEGACY_READ_SIZE)
+        if not part:
+            break
+        pending += part
 
-    encrypted = cipher.encrypt(raw_padded)
+        # Keep at least one whole block back until EOF so padding can be removed
+        usable = (len(pending) - 1) // LEGACY_BLOCK * LEGACY_BLOCK
+        if usable > 0:
+            yield cipher.decrypt(pending[:usable])
+            pending = pending[usable:]
 
-    # Store IV + encrypted together
-    return iv + encrypted
+    if len(pending) != LEGACY_BLOCK:
+        raise ValueError("Legacy blob is not block aligned")
 
+    yield unpad(cipher.decrypt(pending))
 
-def decrypt_bytes(enc_bytes):
-    iv = enc_bytes[:16]
+
+class IteratorReader:
+    """
+    Minimal read(n) adapter over an iterator of byte strings, so plaintext
+    generators (e.g. decrypt_stream) can be fed back into encrypt_stream.
+    """
+
+    def __init__(self, pieces):
+        self._pieces = iter(pieces)
+        self._buffer = b""
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            piece = next(self._pieces, None)
+            if piece is None:
+                break
+            self._buffer += piece
+
+        if size < 0:
+            out, self._buffer = self._buffer, b""
+        else:
+            out, self._buffer = self._buffer[:size], self._buffer[size:]
+        return out
+
+
+def encrypt_file(reader, dest_path, compression=None) -> int:
+    """
+    Stream `reader` into a new container at `dest_path` (optionally
+    compressed, see encrypt_stream). The container is written to a temp file
+    next to the destination and moved into place, so a failed upload never
+    leaves a half-written blob. Returns bytes written.
+    """
+    dest_path = str(dest_path)
+    tmp_path = dest_path + ".part"
+    written = 0
+
+    try:
+        with open(tmp_path, "wb") as out:
+            for piece in encrypt_stream(reader, compression=compression):
+                out.write(piece)
+                written += len(piece)
+        os.replace(tmp_path, dest_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return written
+
+
+def decrypt_file(path):
+    """Generator of plaintext pieces for the blob stored at `path`."""
+    with open(path, "rb") as f:
+        yield from decrypt_stream(f)
+
+
+def _compressed_records(f, info: dict, upto: int = None):
+    """
+    Extend info["offsets"] with the (offset, prefix) of the records of an
+    open compressed container, up to record `upto` (default: all of them),
+    by hopping from prefix to prefix; nothing is decrypted.
+    """
+    records = info.setdefault("offsets", [])
+    if records:
+        offset, prefix = records[-1]
+        word = RECORD_PREFIX.unpack(prefix)[0]
+        if word & PREFIX_FINAL:
+            return records
+        offset += RECORD_PREFIX.size + (word & PREFIX_LENGTH) + TAG_SIZE
+    else:
+        offset = info["header_size"]
+
+    while upto is None or len(records) <= upto:
+        f.seek(offset)
+        prefix = _read_exact(f, RECORD_PREFIX.size)
+        if len(prefix) < RECORD_PREFIX.size:
+            raise ValueError("Container truncated")
+        records.append((offset, prefix))
+
+        word = RECORD_PREFIX.unpack(prefix)[0]
+        if word & PREFIX_FINAL:
+            break
+        offset += RECORD_PREFIX.size + (word & PREFIX_LENGTH) + TAG_SIZE
+    return records
+
+
+def _compressed_record_call(f, info: dict, index: int):
+    offset, prefix = _compressed_records(f, info, index)[index]
+    word = RECORD_PREFIX.unpack(prefix)[0]
+    f.seek(offset + RECORD_PREFIX.size)
+    record = _read_exact(f, (word & PREFIX_LENGTH) + TAG_SIZE)
+    return _open_compressed_record, info, index, prefix, record
+
+
+def _container_layout(f, total_size: int, plain_size: int = None):
+    """
+    Header info plus the record count of an open container, derived from
+    its size: n-1 full records of chunk_size + TAG_SIZE and one final record.
+    Record offsets of compressed containers are found lazily as records are
+    read; without a known `plain_size` they are walked to the end and the
+    final record opened to learn it.
+    """
+    f.seek(0)
+    info, _ = _read_header(f)
+    if info is None:
+        raise ValueError("Not a chunked vault container")
+
+    if info["flags"] != CODEC_NONE:
+        if plain_size is not None:
+            # Only the final record is short (possibly empty)
+            info["records"] = plain_size // info["chunk_size"] + 1
+            info["plain_size"] = plain_size
+            return info
+        info["records"] = len(_compressed_records(f, info))
+        fn, *args = _compressed_record_call(f, info, info["records"] - 1)
+        info["plain_size"] = (info["records"] - 1) * info["chunk_size"] + len(fn(*args))
+        return info
+
+    record_size = info["chunk_size"] + TAG_SIZE
+
+    body = total_size - info["header_size"] - TAG_SIZE
+    if body < 0:
+        raise ValueError("Container truncated")
+
+    full_records, tail = divmod(body, record_size)
+    info["records"] = full_records + 1
+    info["plain_size"] = full_records * info["chunk_size"] + tail
+    return info
+
+
+def _legacy_plain_size(f, total_size: int) -> int:
+    if total_size < 2 * LEGACY_BLOCK or total_size % LEGACY_BLOCK:
+        raise ValueError("Legacy blob is not block aligned")
+
+    f.seek(total_size - 2 * LEGACY_BLOCK)
+    prev, last = f.read(LEGACY_BLOCK), f.read(LEGACY_BLOCK)
+    pad_len = AES.new(KEY, AES.MODE_CBC, prev).decrypt(last)[-1]
+    return total_size - LEGACY_BLOCK - pad_len
+
+
+def read_layout(path, plain_size: int = None) -> dict:
+    """
+    Layout of the blob at `path` for decrypt_range: {"plain_size", ...}, with
+    {"legacy": True} for legacy blobs. Pass the stored plaintext size when
+    known (files.plain_size) to skip working it out; one layout serves any
+    number of ranges of the same blob.
+    """
+    total_size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        if is_container(_read_exact(f, HEADER_SIZE)):
+            return _container_layout(f, total_size, plain_size)
+        if plain_size is None:
+            plain_size = _legacy_plain_size(f, total_size)
+        return {"legacy": True, "plain_size": plain_size}
+
+
+def plaintext_size(path) -> int:
+    """
+    Plaintext length of the blob at `path`, without decrypting it (legacy
+    blobs need one block decrypted to read the padding, compressed
+    containers their final record).
+    """
+    return read_layout(path)["plain_size"]
+
+
+def decrypt_range(path, start: int, end: int, layout: dict = None):
+    """
+    Yield plaintext bytes start..end (inclusive) of the blob at `path`.
+    Only the records (or CBC blocks, for legacy blobs) that overlap the
+    range are read and decrypted, so the cost tracks the range length.
+    `layout` is read_layout(path), when the caller already has it.
+    """
+    info = layout or read_layout(path)
+
+    with open(path, "rb") as f:
+        if info.get("legacy"):
+            yield from _decrypt_legacy_range(f, start, end)
+            return
+
+        chunk_size = info["chunk_size"]
+        record_size = chunk_size + TAG_SIZE
+
+        first = start // chunk_size
+        last = min(end // chunk_size, info["records"] - 1)
+
+        def calls():
+            if info["flags"] != CODEC_NONE:
+                for index in range(first, last + 1):
+                    yield _compressed_record_call(f, info, index)
+                return
+
+            f.seek(info["header_size"] + first * record_size)
+            for index in range(first, last + 1):
+                record = _read_exact(f, record_size)
+                yield _open_record, info, index, record, index == info["records"] - 1
+
+        for index, plain in enumerate(_pipelined(calls()), first):
+            base = index * chunk_size
+            yield plain[max(start - base, 0):end - base + 1]
+
+
+def _decrypt_legacy_range(f, start: int, end: int):
+    # CBC: plaintext block b only needs ciphertext blocks b-1 (or the IV) and b
+    first_block, last_block = start // LEGACY_BLOCK, end // LEGACY_BLOCK
+
+    f.seek(first_block * LEGACY_BLOCK)  # IV sits at offset 0, block b at 16 * (b + 1)
+    iv = f.read(LEGACY_BLOCK)
     cipher = AES.new(KEY, AES.MODE_CBC, iv)
 
-    decrypted_padded = cipher.decrypt(enc_bytes[16:])
-    pad_len = decrypted_padded[-1]
-    return decrypted_padded[:-pad_len]
\ No newline at end of file
+    offset = first_block * LEGACY_BLOCK
+    remaining = (last_block - first_block + 1) * LEGACY_BLOCK
+    while remaining > 0:
+        part = f.read(min(LEGACY_READ_SIZE, remaining))
+        if not part:
+            break
+        remaining -= len(part)
+
+        plain = cipher.decrypt(part)
+        yield plain[max(start - offset, 0):end - offset + 1]
+        offset += len(part)
+
+
+def encrypt_bytes(raw_bytes, compression=None):
+    """Encrypt an in-memory payload into the chunked container format."""
+    return b"".join(encrypt_stream(BytesIO(raw_bytes), compression=compression))
+
+
+def decrypt_bytes(enc_bytes):
+    """Decrypt an in-memory blob in either the container or legacy format."""
+    return b"".join(decrypt_stream(BytesIO(enc_bytes)))
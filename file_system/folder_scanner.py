@@ -1,16 +1,20 @@
 import os
-import sqlite3
 from datetime import datetime
-from core.config import STORAGE_DIR, DB_PATH
+from core.config import STORAGE_DIR
+from core.database import transaction
+
+FILE_BY_PATH_SQL = "SELECT id FROM files WHERE path = ?"
 
 def scan_and_index():
     """
     Scans STORAGE_DIR recursively,
     extracts metadata, saves/updates them in SQLite.
     """
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+    with transaction() as conn:
+        _scan_into(conn.cursor())
+
 
+def _scan_into(cur):
     for root, dirs, files in os.walk(STORAGE_DIR):
         for filename in files:
             file_path = os.path.join(root, filename)
@@ -23,7 +27,7 @@ def scan_and_index():
             modified_at = datetime.fromtimestamp(stat.st_mtime).isoformat()
 
             # Check if file already exists in DB
-            cur.execute("SELECT id FROM files WHERE path = ?", (path,))
+            cur.execute(FILE_BY_PATH_SQL, (path,))
             existing = cur.fetchone()
 
             if existing:
@@ -39,6 +43,3 @@ def scan_and_index():
                     INSERT INTO files (name, path, size, created_at, modified_at)
                     VALUES (?, ?, ?, ?, ?)
                 """, (name, path, size, created_at, modified_at))
-
-    conn.commit()
-    conn.close()
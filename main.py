@@ -1,10 +1,10 @@
 # main.py
 
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, Header, Response
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 
+from core.config import INDEX_SWEEP_ON_STARTUP, FILES_PAGE_DEFAULT
 from core.db_init import init_db
 from core.logger import logger
 
@@ -15,6 +15,7 @@ from routes.search_routes import router as search_router
 from routes.index_routes import router as index_router
 from routes.search_routes import router as search_router
 from routes.ai_routes import router as ai_router
+from routes.upload_routes import router as upload_router
 from routes.session_routes import router as session_router
 from routes.preview_routes import router as preview_router
 
@@ -23,8 +24,15 @@ from services.file_service import (
     handle_upload,
     handle_download,
     handle_delete,
+    list_files_page,
+    count_files_matching,
 )
-from services.file_service_db import get_all_files
+from services.embedding_service import save_vector_index
+from services.job_queue import start_workers, stop_workers
+from services.extraction_pool import shutdown_extraction_pool
+from services.blob_store import sweep_blob_store
+from services.reindex_service import sweep_stale
+from services.upload_session_service import expire_sessions
 
 # Consistency tools
 from services.consistency_service import check_consistency, auto_repair
@@ -51,6 +59,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # pagination cursor for GET /files
 )
 
 
@@ -66,6 +75,7 @@ app.include_router(search_router)
 app.include_router(index_router)
 app.include_router(search_router)
 app.include_router(ai_router)
+app.include_router(upload_router)
 app.include_router(session_router)
 app.include_router(preview_router)
 
@@ -83,9 +93,24 @@ app.mount("/ui", StaticFiles(directory="frontend", html=True), name="ui")
 @app.on_event("startup")
 def startup_event():
     init_db()
+    sweep_blob_store()
+    expire_sessions()
+    start_workers()
+    if INDEX_SWEEP_ON_STARTUP:
+        try:
+            sweep_stale()
+        except Exception as e:
+            logger.error(f"Startup index sweep failed: {e}")
     logger.info("Vault backend initialized.")
 
 
+@app.on_event("shutdown")
+def shutdown_event():
+    stop_workers()
+    shutdown_extraction_pool()
+    save_vector_index()
+
+
 # -------------------------------------------------------
 # System Endpoints
 # -------------------------------------------------------
@@ -105,14 +130,13 @@ async def upload_file(file: UploadFile = File(...)):
 
 
 @app.get("/download/{file_id}")
-def download_file(file_id: int):
-    filename, decrypted_bytes = handle_download(file_id)
-
-    return StreamingResponse(
-        iter([decrypted_bytes]),
-        media_type="application/octet-stream",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
-    )
+def download_file(
+    file_id: int,
+    range: str | None = Header(None),
+    if_range: str | None = Header(None),
+):
+    """Streams the decrypted file. Supports Range / If-Range (206, multipart)."""
+    return handle_download(file_id, range, if_range)
 
 
 @app.delete("/files/{file_id}")
@@ -121,8 +145,32 @@ def delete_file(file_id: int):
 
 
 @app.get("/files")
-def list_files():
-    return get_all_files()
+def list_files(
+    response: Response,
+    project_id: int | None = None,
+    latest_only: bool = False,
+    sort: str = "id",
+    order: str = "asc",
+    fields: str | None = None,
+    limit: int = FILES_PAGE_DEFAULT,
+    cursor: str | None = None,
+):
+    """
+    A page of file rows (all versions by default, in upload order) as a
+    JSON array; when more follow, X-Next-Cursor holds the cursor to pass
+    back. See services/file_service.py list_files_page.
+    """
+    files, next_cursor = list_files_page(
+        project_id, latest_only, sort, order, fields, limit, cursor
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return files
+
+
+@app.get("/files/count")
+def files_count(project_id: int | None = None, latest_only: bool = False):
+    return count_files_matching(project_id, latest_only)
 
 
 # -------------------------------------------------------
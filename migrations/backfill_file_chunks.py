@@ -0,0 +1,35 @@
+# migrations/backfill_file_chunks.py
+
+from core.database import get_connection
+from services.embedding_service import upsert_embedding
+
+
+def run_migration():
+    """
+    Build passage-level (chunk) embeddings for indexed files that only have
+    the old whole-document vector. Re-uses the text already stored in
+    file_index, so nothing is decrypted or re-extracted. Safe to re-run.
+    """
+    conn = get_connection()
+    rows = conn.execute("""
+        SELECT i.file_id, i.content
+        FROM file_index i
+        WHERE NOT EXISTS (SELECT 1 FROM file_chunks c WHERE c.file_id = i.file_id)
+    """).fetchall()
+
+    done = 0
+    failed = 0
+
+    for file_id, content in rows:
+        try:
+            upsert_embedding(file_id, content or "")
+            done += 1
+        except Exception as e:
+            print(f"file {file_id}: {e}")
+            failed += 1
+
+    print(f"Chunk embedding backfill: embedded={done} failed={failed}")
+
+
+if __name__ == "__main__":
+    run_migration()
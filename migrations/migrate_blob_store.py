@@ -0,0 +1,58 @@
+# migrations/migrate_blob_store.py
+
+from core.config import STORAGE_DIR
+from core.database import get_connection, transaction
+from core.db_init import init_db
+from encryption.crypto_engine import decrypt_file
+from services.blob_store import content_hasher, adopt_blob
+
+
+def run_migration():
+    """
+    Move files stored before the blob store into it. Each file is decrypted
+    once to compute its content hash; the first copy of a content becomes
+    the blob (hard-linked, not re-encrypted) and later identical copies are
+    replaced by links to it, which is where the space comes back.
+    Safe to re-run: rows that already have a blob_hash are skipped.
+    """
+    init_db()
+    conn = get_connection()
+
+    rows = conn.execute(
+        "SELECT id, path FROM files WHERE blob_hash IS NULL ORDER BY id"
+    ).fetchall()
+
+    adopted = 0
+    missing = 0
+    failed = 0
+
+    for file_id, rel_path in rows:
+        abs_path = STORAGE_DIR / rel_path
+        if not abs_path.exists():
+            missing += 1
+            continue
+
+        try:
+            hasher = content_hasher()
+            plain_size = 0
+            for piece in decrypt_file(abs_path):
+                hasher.update(piece)
+                plain_size += len(piece)
+            blob_hash = hasher.hexdigest()
+
+            with transaction() as tx:
+                size = adopt_blob(abs_path, blob_hash, plain_size)
+                tx.execute(
+                    "UPDATE files SET blob_hash = ?, size = ? WHERE id = ?",
+                    (blob_hash, size, file_id),
+                )
+            adopted += 1
+        except Exception as e:
+            print(f"file {file_id} ({rel_path}): {e}")
+            failed += 1
+
+    print(f"Blob store migration: adopted={adopted} missing={missing} failed={failed}")
+
+
+if __name__ == "__main__":
+    run_migration()
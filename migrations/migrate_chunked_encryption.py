@@ -0,0 +1,98 @@
+# migrations/migrate_chunked_encryption.py
+
+import os
+
+from core.config import STORAGE_DIR
+from core.database import get_connection, transaction
+from core.db_init import init_db
+from encryption.crypto_engine import (
+    HEADER_SIZE,
+    IteratorReader,
+    decrypt_file,
+    encrypt_file,
+    is_container,
+)
+from services.blob_store import blob_path, link_blob
+
+
+def _is_legacy(path) -> bool:
+    with open(path, "rb") as f:
+        return not is_container(f.read(HEADER_SIZE))
+
+
+def _reencrypt(path) -> int:
+    """Rewrite one legacy blob as a container next to it; returns the new size."""
+    tmp_path = path.with_name(path.name + ".migrating")
+    size = encrypt_file(IteratorReader(decrypt_file(path)), tmp_path)
+    os.replace(tmp_path, path)
+    return size
+
+
+def run_migration():
+    """
+    Re-encrypt every legacy IV + AES-CBC blob into the chunked container
+    format. Blobs are streamed (legacy decrypt → container encrypt), so memory
+    use does not depend on file size. Safe to re-run: containers are skipped.
+    Downloads keep working for unmigrated blobs in the meantime.
+
+    Content in the blob store is rewritten once, at its blob path, and every
+    logical path of it is linked to the new blob again (replacing the file
+    in place would leave the links on the old, legacy copy). Files from
+    before the blob store are rewritten where they are.
+    """
+    init_db()
+    conn = get_connection()
+
+    rows = conn.execute(
+        "SELECT id, path, blob_hash FROM files WHERE storage = 'blob' ORDER BY id"
+    ).fetchall()
+
+    converted = 0
+    relinked = 0
+    skipped = 0
+    missing = 0
+    blob_sizes = {}   # blob_hash -> size on disk, once checked
+
+    for file_id, rel_path, blob_hash in rows:
+        abs_path = STORAGE_DIR / rel_path
+
+        if blob_hash is None:
+            if not abs_path.exists():
+                missing += 1
+                continue
+            if not _is_legacy(abs_path):
+                skipped += 1
+                continue
+            size = _reencrypt(abs_path)
+            with transaction() as tx:
+                tx.execute("UPDATE files SET size = ? WHERE id = ?", (size, file_id))
+            converted += 1
+            continue
+
+        blob = blob_path(blob_hash)
+        if blob_hash not in blob_sizes:
+            if not blob.exists():
+                missing += 1
+                continue
+            if _is_legacy(blob):
+                size = _reencrypt(blob)
+                with transaction() as tx:
+                    tx.execute("UPDATE blobs SET size = ? WHERE hash = ?", (size, blob_hash))
+                converted += 1
+            blob_sizes[blob_hash] = blob.stat().st_size
+
+        # Still the old inode (or a private copy) while it is legacy
+        if not abs_path.exists() or _is_legacy(abs_path):
+            link_blob(blob_hash, abs_path)
+            relinked += 1
+        else:
+            skipped += 1
+        with transaction() as tx:
+            tx.execute("UPDATE files SET size = ? WHERE id = ?", (blob_sizes[blob_hash], file_id))
+
+    print(f"Chunked encryption migration: converted={converted} relinked={relinked} "
+          f"already_chunked={skipped} missing={missing}")
+
+
+if __name__ == "__main__":
+    run_migration()
@@ -1,8 +1,11 @@
 from fastapi import APIRouter
 from services.analytics_service import (
     get_storage_stats,
+    get_storage_summary,
     get_version_stats,
-    get_daily_activity
+    get_daily_activity,
+    get_dedup_stats,
+    get_text_cache_stats,
 )
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
@@ -13,6 +16,11 @@ def storage():
     return get_storage_stats()
 
 
+@router.get("/storage/summary")
+def storage_summary():
+    return get_storage_summary()
+
+
 @router.get("/versions")
 def versions():
     return get_version_stats()
@@ -21,3 +29,13 @@ def versions():
 @router.get("/activity")
 def activity():
     return get_daily_activity()
+
+
+@router.get("/dedup")
+def dedup():
+    return get_dedup_stats()
+
+
+@router.get("/text-cache")
+def text_cache():
+    return get_text_cache_stats()
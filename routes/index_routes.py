@@ -1,20 +1,91 @@
 # routes/index_routes.py
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from services.indexing_service import index_file_content
 from services.file_service_db import get_file_by_id
+from services.job_queue import (
+    enqueue_index_job,
+    get_job,
+    list_jobs,
+    queue_stats,
+    PRIORITY_BACKFILL,
+)
+from services.reindex_service import (
+    start_rebuild,
+    cancel_rebuild,
+    get_rebuild_status,
+    sweep_stale,
+)
 
 router = APIRouter(prefix="/index", tags=["indexing"])
 
 
 @router.post("/file/{file_id}")
-def index_single_file(file_id: int):
+def index_single_file(file_id: int, background: bool = False, force: bool = False):
     """
     Manually trigger indexing of a single file (content + embedding).
-    Useful for reindex or backfill.
+    Useful for reindex or backfill. With background=true the work is queued
+    and the job id returned immediately. Up-to-date steps are skipped
+    unless force=true.
     """
     file = get_file_by_id(file_id)
     if not file:
         raise HTTPException(status_code=404, detail="File not found")
 
-    return index_file_content(file_id)
+    if background:
+        return {"queued": True, "job_id": enqueue_index_job(file_id, PRIORITY_BACKFILL)}
+
+    return index_file_content(file_id, force=force)
+
+
+@router.get("/jobs")
+def index_jobs(
+    status: str | None = Query(None, description="pending | running | done | failed"),
+    file_id: int | None = None,
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """
+    Background indexing queue: counts per status plus the most recent jobs.
+    """
+    return {
+        "stats": queue_stats(),
+        "jobs": list_jobs(status, file_id, limit),
+    }
+
+
+@router.get("/jobs/{job_id}")
+def index_job(job_id: int):
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.post("/rebuild")
+def rebuild_embeddings(project_id: int | None = None):
+    """
+    Re-embed all indexed files (or one project's) from their stored text,
+    in model-sized batches. Runs in the background; poll GET /index/rebuild.
+    Files that were never indexed are queued for indexing.
+    """
+    return start_rebuild(project_id)
+
+
+@router.get("/rebuild")
+def rebuild_status():
+    return get_rebuild_status()
+
+
+@router.post("/rebuild/cancel")
+def rebuild_cancel():
+    return cancel_rebuild()
+
+
+@router.post("/sweep")
+def sweep_index(project_id: int | None = None, retry_failed: bool = False):
+    """
+    Incremental reindex: re-extract files whose content hash or extractor
+    version changed, re-embed vectors built from other text or another
+    model. Does nothing when everything is current.
+    """
+    return sweep_stale(project_id, retry_failed)
@@ -1,6 +1,10 @@
 # routes/project_routes.py
 
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from typing import List
+
+from fastapi import APIRouter, UploadFile, File, HTTPException, Header, Request, Body, Response
+
+from core.config import FILES_PAGE_DEFAULT
 from services.project_service import (
     handle_project_create,
     handle_project_list,
@@ -10,10 +14,13 @@ from services.project_service import (
 from services.file_service import (
     handle_upload_to_project,
     list_files_in_project,
+    count_files_matching,
     get_version_history,
     get_version_history_ui,
     download_specific_version,
 )
+from services.batch_upload_service import handle_batch_upload
+from services.export_service import export_project, export_files
 
 router = APIRouter(prefix="/projects", tags=["projects"])
 
@@ -36,6 +43,15 @@ def list_projects():
     return handle_project_list()
 
 
+# -------------------------------------------------------
+# Export Selected Files as ZIP (e.g. search results)
+# -------------------------------------------------------
+
+@router.post("/export", operation_id="project_export_files")
+def export_selected_files(file_ids: List[int] = Body(..., embed=True), compress: bool = False):
+    return export_files(file_ids, compress)
+
+
 # -------------------------------------------------------
 # Get Single Project
 # -------------------------------------------------------
@@ -64,12 +80,41 @@ async def upload_into_project(project_id: int, file: UploadFile = File(...)):
 
 
 # -------------------------------------------------------
-# List Latest Files in Project
+# Batch Upload (multipart `files` / `archive`, or a tar body)
+# -------------------------------------------------------
+
+@router.post("/{project_id}/upload/batch", operation_id="project_upload_batch")
+async def upload_batch_into_project(project_id: int, request: Request):
+    return await handle_batch_upload(project_id, request)
+
+
+# -------------------------------------------------------
+# List Files in Project (latest versions by default; paginated)
 # -------------------------------------------------------
 
 @router.get("/{project_id}/files", operation_id="project_file_list")
-def list_project_files(project_id: int):
-    return list_files_in_project(project_id)
+def list_project_files(
+    project_id: int,
+    response: Response,
+    latest_only: bool = True,
+    sort: str = "name",
+    order: str = "asc",
+    fields: str | None = None,
+    limit: int = FILES_PAGE_DEFAULT,
+    cursor: str | None = None,
+):
+    """A JSON array of files; the next page's cursor is in X-Next-Cursor."""
+    files, next_cursor = list_files_in_project(
+        project_id, latest_only, sort, order, fields, limit, cursor
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return files
+
+
+@router.get("/{project_id}/files/count", operation_id="project_file_count")
+def count_project_files(project_id: int, latest_only: bool = True):
+    return count_files_matching(project_id, latest_only)
 
 
 # -------------------------------------------------------
@@ -95,9 +140,19 @@ def version_history_ui(project_id: int, filename: str):
 # -------------------------------------------------------
 
 @router.get("/{project_id}/files/version/{file_id}/download", operation_id="project_version_download")
-def download_version(project_id: int, file_id: int):
-    filename, content = download_specific_version(file_id)
-    return {
-        "filename": filename,
-        "content": content,
-    }
+def download_version(
+    project_id: int,
+    file_id: int,
+    range: str | None = Header(None),
+    if_range: str | None = Header(None),
+):
+    return download_specific_version(file_id, range, if_range)
+
+
+# -------------------------------------------------------
+# Export Project as ZIP (streamed)
+# -------------------------------------------------------
+
+@router.get("/{project_id}/export", operation_id="project_export")
+def export_project_zip(project_id: int, include_versions: bool = False, compress: bool = False):
+    return export_project(project_id, include_versions, compress)
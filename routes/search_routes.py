@@ -15,12 +15,13 @@ router = APIRouter(prefix="/search", tags=["search"])
 # --------------------------------------------------------
 @router.get("/content")
 def content_search(q: str = Query(..., description="Keyword to search within extracted document text"),
-                   limit: int = 50):
+                   limit: int = 50,
+                   syntax: str = Query("simple", description="'simple' words or raw 'fts' syntax (phrases, prefix*, AND/OR/NOT)")):
     """
     Full-text keyword search from extracted document content.
-    Uses LIKE on file_index table.
+    Uses the FTS5 index over file_index, ranked by BM25, with snippets.
     """
-    return search_by_content(q, limit)
+    return search_by_content(q, limit, syntax)
 
 
 # --------------------------------------------------------
@@ -28,11 +29,13 @@ def content_search(q: str = Query(..., description="Keyword to search within ext
 # --------------------------------------------------------
 @router.get("/semantic")
 def semantic_search(q: str = Query(..., description="Natural language query for semantic search"),
-                    top_k: int = 10):
+                    top_k: int = 10,
+                    probes: int | None = Query(None, ge=1, description="ANN search breadth: higher = better recall, slower"),
+                    exact: bool = Query(False, description="Bypass the ANN index (brute force)")):
     """
     Searches via embeddings (semantic meaning).
     """
-    return search_by_semantic(q, top_k)
+    return search_by_semantic(q, top_k, probes, exact)
 
 
 # --------------------------------------------------------
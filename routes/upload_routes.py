@@ -0,0 +1,47 @@
+# routes/upload_routes.py
+
+from fastapi import APIRouter, Request
+from services.upload_session_service import (
+    create_session,
+    get_session,
+    abort_session,
+    handle_put_chunk,
+    handle_finalize,
+)
+
+router = APIRouter(prefix="/uploads", tags=["uploads"])
+
+
+# -------------------------------------------------------
+# Resumable Upload Sessions
+# -------------------------------------------------------
+
+@router.post("/", operation_id="upload_session_create")
+def create_upload_session(filename: str, size: int, project_id: int = None):
+    """
+    Start a resumable upload of `size` bytes, into a project (new version)
+    or the root. Returns the session id and the chunk size PUTs must use.
+    """
+    return create_session(filename, size, project_id)
+
+
+@router.get("/{session_id}", operation_id="upload_session_get")
+def get_upload_session(session_id: str):
+    """How many bytes have arrived; resume with PUT at offset = received."""
+    return get_session(session_id)
+
+
+@router.put("/{session_id}", operation_id="upload_session_put")
+async def put_upload_chunk(session_id: str, offset: int, request: Request):
+    """Raw bytes of the file starting at `offset`."""
+    return await handle_put_chunk(session_id, offset, request)
+
+
+@router.post("/{session_id}/finalize", operation_id="upload_session_finalize")
+async def finalize_upload_session(session_id: str):
+    return await handle_finalize(session_id)
+
+
+@router.delete("/{session_id}", operation_id="upload_session_abort")
+def abort_upload_session(session_id: str):
+    return abort_session(session_id)
@@ -5,10 +5,9 @@ from services.search_service import (
     search_by_content,
     search_files,
 )
-from services.text_extraction_service import extract_text_from_bytes
-from services.file_service_db import get_file_by_id
-from encryption.crypto_engine import decrypt_bytes
-from core.config import STORAGE_DIR
+from services.text_cache import get_file_text
+from services.embedding_service import best_passages
+from core.config import INDEX_MAX_CHARS
 from core.logger import logger
 
 # OPTIONAL – GPT4All or local LLaMA backend
@@ -21,15 +20,32 @@ except Exception as e:
     logger.error(f"Local LLM not loaded: {e}")
 
 
-def _load_file_content(file_record: dict) -> str:
+def _load_file_content(file_record: dict, max_chars: int = INDEX_MAX_CHARS) -> str:
     """
-    Loads + decrypts + extracts text from a file.
+    Text of a file: from file_index or the text cache when possible,
+    decrypt + extract only as a last resort (services/text_cache.py).
     file_record is a row dict returned by get_file_by_id / search_*.
     """
-    abs_path = STORAGE_DIR / file_record["path"]
-    encrypted = abs_path.read_bytes()
-    raw = decrypt_bytes(encrypted)
-    return extract_text_from_bytes(file_record["name"], raw)
+    return get_file_text(file_record, max_chars=max_chars)
+
+
+def _relevant_text(file_record: dict, question: str) -> str:
+    """
+    Text to show the LLM for one file: its best-matching passages when the
+    file has chunk embeddings, otherwise the head of the extracted text.
+    """
+    passages = file_record.get("passages")
+    if not passages:
+        try:
+            passages = best_passages(file_record["id"], question)
+        except Exception as e:
+            logger.error(f"Passage lookup failed for file {file_record['id']}: {e}")
+            passages = []
+
+    if passages:
+        return "\n[...]\n".join(p["text"] for p in passages)
+
+    return _load_file_content(file_record, max_chars=5000)
 
 
 def _get_candidates(
@@ -100,7 +116,7 @@ def ai_query_engine(
     Main AI engine (backwards compatible):
       - Accepts optional filters: project_id, tag, ext
       - Picks candidate files
-      - Decrypts + extracts content
+      - Selects their most relevant passages (decrypt + extract as fallback)
       - Calls local LLM
     """
 
@@ -113,11 +129,11 @@ def ai_query_engine(
     if not candidates:
         return {"answer": "No relevant files found.", "sources": []}
 
-    # 2) Extract text from retrieved documents
+    # 2) Pick the relevant passages of each retrieved document
     docs = []
     for f in candidates:
         try:
-            text = _load_file_content(f)
+            text = _relevant_text(f, question)
             if text.strip():
                 docs.append({"file": f, "text": text})
         except Exception as e:
@@ -131,7 +147,7 @@ def ai_query_engine(
 
     # 3) Build prompt
     context = "\n\n".join(
-        f"[File: {d['file']['name']}]\n{d['text'][:5000]}" for d in docs
+        f"[File: {d['file']['name']}]\n{d['text']}" for d in docs
     )
 
     prompt = f"""
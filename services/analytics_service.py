@@ -1,37 +1,113 @@
-import sqlite3
-from core.config import DB_PATH
+from core.database import get_connection
+from services.blob_store import dedup_stats
+from services.chunk_store import chunk_stats
+from services.text_cache import text_cache_stats
+
+# Physical bytes are what the stores hold: each blob / chunk once, however
+# many versions (or projects) reference it, plus files outside the blob
+# store at their own size. files.size can't be summed for this: deduped
+# blobs would be counted once per row and compacted versions at the size
+# of the blob they no longer use.
+
+_PROJECT_BLOB_BYTES = """
+    SELECT r.project_id, SUM(b.size)
+    FROM (SELECT DISTINCT project_id, blob_hash FROM files
+          WHERE storage = 'blob' AND blob_hash IS NOT NULL) r
+    JOIN blobs b ON b.hash = r.blob_hash
+    GROUP BY r.project_id
+"""
+
+_PROJECT_CHUNK_BYTES = """
+    SELECT r.project_id, SUM(c.size)
+    FROM (SELECT DISTINCT f.project_id, m.chunk_hash FROM files f
+          JOIN file_manifests m ON m.file_id = f.id) r
+    JOIN chunks c ON c.hash = r.chunk_hash
+    GROUP BY r.project_id
+"""
+
+_PROJECT_UNMANAGED_BYTES = """
+    SELECT project_id, SUM(size) FROM files
+    WHERE storage = 'blob' AND blob_hash IS NULL
+    GROUP BY project_id
+"""
 
-def get_storage_stats():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
 
-    cur.execute("""
-        SELECT project_id, SUM(size)
+def get_storage_stats():
+    """
+    Per project: bytes of all versions as stored (total_size), plaintext
+    (logical_size) and held on disk for the project (physical_size; a blob
+    shared by two projects counts for both, see get_storage_summary).
+    """
+    conn = get_connection()
+    rows = conn.execute("""
+        SELECT project_id, SUM(size), SUM(COALESCE(plain_size, size)), COUNT(compression)
         FROM files
         GROUP BY project_id
-    """)
+    """).fetchall()
 
-    rows = cur.fetchall()
-    conn.close()
+    physical = {}
+    for sql in (_PROJECT_BLOB_BYTES, _PROJECT_CHUNK_BYTES, _PROJECT_UNMANAGED_BYTES):
+        for project_id, size in conn.execute(sql):
+            physical[project_id] = physical.get(project_id, 0) + (size or 0)
 
     return [
-        {"project_id": r[0], "total_size": r[1] or 0}
+        {
+            "project_id": r[0],
+            "total_size": r[1] or 0,
+            "logical_size": r[2] or 0,
+            "physical_size": physical.get(r[0], 0),
+            "compressed_files": r[3],
+        }
         for r in rows
     ]
 
 
-def get_version_stats():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+def get_storage_summary():
+    """
+    Vault-wide logical (plaintext of every version) vs physical bytes (blob
+    store + chunk store + unmanaged files), with compression per codec
+    measured over distinct blobs.
+    """
+    conn = get_connection()
+    logical = conn.execute(
+        "SELECT COALESCE(SUM(COALESCE(plain_size, size)), 0) FROM files"
+    ).fetchone()[0]
+    blob_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+    chunk_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM chunks").fetchone()[0]
+    unmanaged = conn.execute(
+        "SELECT COALESCE(SUM(size), 0) FROM files WHERE storage = 'blob' AND blob_hash IS NULL"
+    ).fetchone()[0]
+    physical = blob_bytes + chunk_bytes + unmanaged
+
+    codecs = conn.execute("""
+        SELECT r.compression, COUNT(*), SUM(b.plain_size), SUM(b.size)
+        FROM (SELECT DISTINCT compression, blob_hash FROM files
+              WHERE compression IS NOT NULL AND blob_hash IS NOT NULL) r
+        JOIN blobs b ON b.hash = r.blob_hash
+        GROUP BY r.compression
+    """).fetchall()
+
+    return {
+        "logical_bytes": logical,
+        "physical_bytes": physical,
+        "blob_bytes": blob_bytes,
+        "chunk_bytes": chunk_bytes,
+        "unmanaged_bytes": unmanaged,
+        "compression_ratio": round(logical / physical, 3) if physical else 1.0,
+        "codecs": [
+            {"codec": c[0], "blobs": c[1], "logical_bytes": c[2] or 0, "physical_bytes": c[3] or 0}
+            for c in codecs
+        ],
+    }
 
-    cur.execute("""
+
+def get_version_stats():
+    conn = get_connection()
+    rows = conn.execute("""
         SELECT name, COUNT(*)
         FROM files
         GROUP BY name
-    """)
-
-    rows = cur.fetchall()
-    conn.close()
+    """).fetchall()
 
     return [
         {"file": r[0], "version_count": r[1]}
@@ -40,20 +116,25 @@ def get_version_stats():
 
 
 def get_daily_activity():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute("""
+    conn = get_connection()
+    rows = conn.execute("""
         SELECT DATE(timestamp), COUNT(*)
         FROM audit_log
         GROUP BY DATE(timestamp)
         ORDER BY DATE(timestamp)
-    """)
-
-    rows = cur.fetchall()
-    conn.close()
+    """).fetchall()
 
     return [
         {"date": r[0], "events": r[1]}
         for r in rows
     ]
+
+
+def get_dedup_stats():
+    """Blob store dedup (logical vs physical bytes) plus chunked old versions."""
+    return {**dedup_stats(), **chunk_stats()}
+
+
+def get_text_cache_stats():
+    """Hit / miss counters of the extracted-text cache since startup."""
+    return text_cache_stats()
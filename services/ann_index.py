@@ -0,0 +1,262 @@
+# services/ann_index.py
+
+import os
+
+import numpy as np
+
+from core.logger import logger
+
+# -------------------------------------------------------
+# Approximate nearest-neighbour backends
+# -------------------------------------------------------
+#
+# A backend only proposes candidate ids for a query; VectorStore then scores
+# those candidates exactly against its float32 matrix. `probes` is the
+# recall/latency knob: more probes → more candidates → higher recall.
+#
+# Every backend implements:
+#   train(keys, matrix)  build from scratch
+#   add(key, vec)        incremental insert / update
+#   remove(key)          incremental delete
+#   candidates(q, top_k, probes) -> list of keys
+#   save() / load(keys, matrix) -> bool   persistence next to the database
+
+
+def _normalise_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class IVFIndex:
+    """
+    Inverted-file index (IVF-Flat) in plain NumPy: spherical k-means splits
+    the vectors into `nlist` cells, a query scans only the `probes` cells
+    whose centroids are closest to it.
+    """
+
+    name = "ivf"
+
+    TRAIN_SAMPLE = 50_000
+    TRAIN_ITERATIONS = 12
+
+    def __init__(self, path, default_probes: int = 32):
+        self.path = path
+        self.default_probes = default_probes
+        self.centroids = None
+        self.lists = []            # cell -> set of keys
+        self.assignment = {}       # key -> cell
+        self.trained_size = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.centroids is not None
+
+    def _nearest_cells(self, vecs):
+        return np.argmax(vecs @ self.centroids.T, axis=1)
+
+    def train(self, keys, matrix):
+        n = len(keys)
+        nlist = int(min(4096, max(16, 4 * np.sqrt(n))))
+        rng = np.random.default_rng(0)
+
+        sample = matrix
+        if n > self.TRAIN_SAMPLE:
+            sample = matrix[rng.choice(n, self.TRAIN_SAMPLE, replace=False)]
+        nlist = min(nlist, len(sample))
+
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(self.TRAIN_ITERATIONS):
+            cells = np.argmax(sample @ centroids.T, axis=1)
+            order = np.argsort(cells, kind="stable")
+            counts = np.bincount(cells, minlength=nlist)
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+            non_empty = counts > 0
+            sums = np.add.reduceat(sample[order], starts[non_empty], axis=0)
+            centroids[non_empty] = sums
+            centroids = _normalise_rows(centroids).astype(np.float32)
+
+        self.centroids = centroids
+        self.lists = [set() for _ in range(nlist)]
+        self.assignment = {}
+
+        for begin in range(0, n, 65_536):
+            batch_cells = self._nearest_cells(matrix[begin:begin + 65_536])
+            for key, cell in zip(keys[begin:begin + 65_536], batch_cells):
+                self.lists[cell].add(int(key))
+                self.assignment[int(key)] = int(cell)
+
+        self.trained_size = n
+        logger.info(f"IVF index trained: vectors={n} nlist={nlist}")
+
+    def add(self, key, vec):
+        if not self.ready:
+            return
+        self.remove(key)
+        cell = int(self._nearest_cells(vec[None, :])[0])
+        self.lists[cell].add(key)
+        self.assignment[key] = cell
+
+    def remove(self, key):
+        cell = self.assignment.pop(key, None)
+        if cell is not None:
+            self.lists[cell].discard(key)
+
+    def candidates(self, query_vec, top_k, probes=None):
+        probes = min(probes or self.default_probes, len(self.lists))
+        cell_scores = self.centroids @ query_vec
+        cells = np.argpartition(-cell_scores, probes - 1)[:probes]
+
+        keys = []
+        for cell in cells:
+            keys.extend(self.lists[cell])
+        return keys
+
+    def save(self):
+        if not self.ready:
+            return
+        keys = np.fromiter(self.assignment.keys(), dtype=np.int64, count=len(self.assignment))
+        cells = np.fromiter(self.assignment.values(), dtype=np.int32, count=len(self.assignment))
+        tmp_path = f"{self.path}.tmp.npz"
+        np.savez(tmp_path, centroids=self.centroids, keys=keys, cells=cells,
+                 trained_size=np.array([self.trained_size]))
+        os.replace(tmp_path, self.path)
+
+    def load(self, keys, matrix) -> bool:
+        """
+        Restore centroids/assignments, then reconcile with the current
+        vectors: unseen keys are assigned, vanished keys dropped.
+        """
+        try:
+            data = np.load(self.path)
+        except (OSError, ValueError):
+            return False
+
+        centroids = data["centroids"]
+        if matrix.shape[1] != centroids.shape[1]:
+            return False  # embedding model changed → retrain
+
+        self.centroids = centroids
+        self.trained_size = int(data["trained_size"][0])
+        self.lists = [set() for _ in range(len(centroids))]
+        self.assignment = {}
+
+        live = set(int(k) for k in keys)
+        for key, cell in zip(data["keys"].tolist(), data["cells"].tolist()):
+            if key in live:
+                self.lists[cell].add(key)
+                self.assignment[key] = cell
+
+        for i, key in enumerate(keys):
+            if int(key) not in self.assignment:
+                self.add(int(key), matrix[i])
+
+        return True
+
+
+class HNSWIndex:
+    """
+    HNSW graph via the optional `hnswlib` package. `probes` maps to the
+    query-time `ef` parameter.
+    """
+
+    name = "hnsw"
+
+    def __init__(self, path, default_probes: int = 64):
+        import hnswlib  # optional dependency; caller falls back if missing
+        self._hnswlib = hnswlib
+        self.path = path
+        self.default_probes = default_probes
+        self.index = None
+        self.trained_size = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.index is not None
+
+    def _new_index(self, dim, capacity):
+        index = self._hnswlib.Index(space="ip", dim=dim)
+        index.init_index(max_elements=max(capacity, 1024), ef_construction=200, M=16,
+                         allow_replace_deleted=True)
+        return index
+
+    def train(self, keys, matrix):
+        self.index = self._new_index(matrix.shape[1], len(keys) * 2)
+        self.index.add_items(matrix, np.asarray(keys, dtype=np.int64))
+        self.trained_size = len(keys)
+        logger.info(f"HNSW index built: vectors={len(keys)}")
+
+    def add(self, key, vec):
+        if not self.ready:
+            return
+        if self.index.get_current_count() >= self.index.get_max_elements():
+            self.index.resize_index(self.index.get_max_elements() * 2)
+        try:
+            self.index.unmark_deleted(key)
+        except RuntimeError:
+            pass
+        self.index.add_items(vec[None, :], np.array([key]), replace_deleted=True)
+
+    def remove(self, key):
+        if not self.ready:
+            return
+        try:
+            self.index.mark_deleted(key)
+        except RuntimeError:
+            pass  # unknown label
+
+    def candidates(self, query_vec, top_k, probes=None):
+        ef = max(probes or self.default_probes, top_k)
+        self.index.set_ef(ef)
+        k = min(ef, self.index.get_current_count())
+        if k <= 0:
+            return []
+        try:
+            labels, _ = self.index.knn_query(query_vec[None, :], k=k)
+        except RuntimeError:
+            # Fewer live (non-deleted) elements than k; ask for top_k only
+            labels, _ = self.index.knn_query(query_vec[None, :], k=min(top_k, k))
+        return [int(x) for x in labels[0]]
+
+    def save(self):
+        if self.ready:
+            self.index.save_index(str(self.path))
+
+    def load(self, keys, matrix) -> bool:
+        try:
+            index = self._hnswlib.Index(space="ip", dim=matrix.shape[1])
+            index.load_index(str(self.path), allow_replace_deleted=True)
+        except (OSError, RuntimeError):
+            return False
+
+        self.index = index
+        self.trained_size = len(keys)
+
+        stored = set(index.get_ids_list())
+        live = set(int(k) for k in keys)
+        for key in stored - live:
+            self.remove(key)
+        for i, key in enumerate(keys):
+            if int(key) not in stored:
+                self.add(int(key), matrix[i])
+        return True
+
+
+def create_ann_index(backend: str, index_dir, prefix: str = "ann"):
+    """
+    Build the configured backend, or None for exact search only.
+    Unknown or unavailable backends fall back to the local IVF index.
+    `prefix` names the persisted file, one per vector collection.
+    """
+    backend = (backend or "").lower()
+    if backend in ("", "exact", "none"):
+        return None
+
+    if backend == "hnsw":
+        try:
+            return HNSWIndex(index_dir / f"{prefix}_hnsw.bin")
+        except ImportError:
+            logger.error("ANN_BACKEND=hnsw but hnswlib is not installed; using IVF")
+
+    return IVFIndex(index_dir / f"{prefix}_ivf.npz")
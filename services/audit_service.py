@@ -1,18 +1,21 @@
-import sqlite3
 from datetime import datetime
-from core.config import DB_PATH
+from core.database import get_connection
 
 
 def log_event(action: str, project_id=None, file=None, version=None, meta=None):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
+    conn = get_connection()
     timestamp = datetime.utcnow().isoformat()
 
-    cur.execute("""
+    conn.execute("""
         INSERT INTO audit_log (action, project_id, file, version, meta, timestamp)
         VALUES (?, ?, ?, ?, ?, ?)
     """, (action, project_id, file, version, meta, timestamp))
 
-    conn.commit()
-    conn.close()
+
+def log_events(action: str, events, project_id=None):
+    """Bulk log_event: `events` are (file, version) pairs, written in one batch."""
+    timestamp = datetime.utcnow().isoformat()
+    get_connection().executemany("""
+        INSERT INTO audit_log (action, project_id, file, version, meta, timestamp)
+        VALUES (?, ?, ?, ?, NULL, ?)
+    """, [(action, project_id, file, version, timestamp) for file, version in events])
@@ -0,0 +1,298 @@
+# services/batch_upload_service.py
+
+import io
+import os
+import tarfile
+import tempfile
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+
+from anyio.to_thread import run_sync
+from fastapi import HTTPException, Request
+from starlette.datastructures import UploadFile
+
+from core.concurrency import run_upload_work
+from core.config import BATCH_UPLOAD_MAX_FILES, BATCH_UPLOAD_WORKERS
+from core.database import transaction
+from core.logger import logger
+
+from services.audit_service import log_events
+from services.blob_store import stage_blob, commit_blob, discard_staged, link_blob, release_unreferenced
+from services.file_service import _upload_size
+from services.file_service_db import insert_file_metadata
+from services.file_version_service import get_versioned_filename
+from services.job_queue import enqueue_jobs, PRIORITY_UPLOAD, PRIORITY_BACKFILL
+from services.project_db import get_project_by_id
+from services.project_service import get_project_folder, get_version_control_folder
+from services.validation_service import validate_upload
+from encryption.compression import compression_for
+
+# -------------------------------------------------------
+# Batch upload into a project
+# -------------------------------------------------------
+#
+# POST /projects/{id}/upload/batch takes many files at once, either as
+# repeated multipart `files` fields, multipart `archive` tar(.gz) files, or a
+# raw tar body (Content-Type application/x-tar / gzip). Tar members are
+# flattened to their base name; a name that occurs twice becomes two
+# successive versions.
+#
+#   1. every name and size is validated before anything is stored
+#   2. blobs are hashed + encrypted into staging on BATCH_UPLOAD_WORKERS
+#      threads (outside any transaction)
+#   3. one transaction allocates versions (one lookup for the whole batch),
+#      archives superseded blobs, inserts the rows and audit entries and
+#      queues indexing / compaction with bulk inserts
+#
+# The batch is all-or-nothing: any failure rolls back rows and disk.
+
+TAR_CONTENT_TYPES = ("application/x-tar", "application/gzip", "application/x-gzip", "application/x-gtar")
+TAR_INLINE_BYTES = 16 * 1024 * 1024   # larger members are staged by the reading thread
+_SQL_BATCH = 500                      # names per IN (...) lookup
+_SPOOL_BYTES = 1024 * 1024
+
+
+async def handle_batch_upload(project_id: int, request: Request):
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+
+    if content_type == "multipart/form-data":
+        form = await request.form(max_files=BATCH_UPLOAD_MAX_FILES, max_fields=BATCH_UPLOAD_MAX_FILES)
+        try:
+            uploads = [f for f in form.getlist("files") if isinstance(f, UploadFile)]
+            archives = [f.file for f in form.getlist("archive") if isinstance(f, UploadFile)]
+            return await run_upload_work(_store_batch, project_id, uploads, archives)
+        finally:
+            await form.close()
+
+    if content_type in TAR_CONTENT_TYPES:
+        body = await _spool_body(request)
+        try:
+            return await run_upload_work(_store_batch, project_id, [], [body])
+        finally:
+            body.close()
+
+    raise HTTPException(
+        status_code=415,
+        detail="Send multipart/form-data (files / archive fields) or a tar body",
+    )
+
+
+async def _spool_body(request: Request):
+    """Copy a raw request body to a temp file, writing 1 MiB at a time off the loop."""
+    spool = tempfile.SpooledTemporaryFile(max_size=_SPOOL_BYTES)
+    pending = bytearray()
+    async for chunk in request.stream():
+        pending += chunk
+        if len(pending) >= _SPOOL_BYTES:
+            await run_sync(spool.write, bytes(pending))
+            pending.clear()
+    if pending:
+        await run_sync(spool.write, bytes(pending))
+    spool.seek(0)
+    return spool
+
+
+# -------------------------------------------------------
+# Collect + validate
+# -------------------------------------------------------
+
+def _collect(uploads, archives):
+    """
+    (name, size, source) per file in request order; source is an UploadFile
+    or a (TarFile, TarInfo) pair. Raises 400 / 413 before anything is stored.
+    """
+    entries = [(f.filename, _upload_size(f), f) for f in uploads]
+
+    for fileobj in archives:
+        try:
+            archive = tarfile.open(fileobj=fileobj, mode="r:*")
+            members = archive.getmembers()
+        except (tarfile.TarError, EOFError, OSError) as e:
+            raise HTTPException(status_code=400, detail=f"Unreadable tar archive: {e}")
+        entries.extend(
+            (os.path.basename(m.name), m.size, (archive, m)) for m in members if m.isfile()
+        )
+
+    if not entries:
+        raise HTTPException(status_code=400, detail="No files in batch")
+    if len(entries) > BATCH_UPLOAD_MAX_FILES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch exceeds the limit of {BATCH_UPLOAD_MAX_FILES} files",
+        )
+
+    for name, size, _ in entries:
+        try:
+            validate_upload(name or "", size)
+        except HTTPException as e:
+            raise HTTPException(status_code=e.status_code, detail=f"{name!r}: {e.detail}")
+    return entries
+
+
+# -------------------------------------------------------
+# Stage blobs in parallel
+# -------------------------------------------------------
+
+def _stage_all(entries):
+    """
+    Staged blob per entry (same order); on failure nothing stays staged.
+    Pool threads keep one sqlite connection each for the whole batch; it is
+    released with the thread-local state when the pool shuts down.
+    """
+    results = []   # Future, or the staged dict for members staged inline
+    buffered = set()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, BATCH_UPLOAD_WORKERS),
+                                thread_name_prefix="batch-stage") as pool:
+            for name, size, source in entries:
+                if isinstance(source, UploadFile):
+                    results.append(pool.submit(stage_blob, source.file, compression_for(name)))
+                    continue
+
+                # Tar members share the archive's file handle: read them here,
+                # buffering small ones for the pool (at most 2 x workers ahead)
+                archive, member = source
+                if size > TAR_INLINE_BYTES:
+                    results.append(stage_blob(archive.extractfile(member), compression_for(name)))
+                    continue
+                if len(buffered) >= 2 * BATCH_UPLOAD_WORKERS:
+                    buffered = wait(buffered, return_when=FIRST_COMPLETED).not_done
+                data = archive.extractfile(member).read()
+                results.append(pool.submit(stage_blob, io.BytesIO(data), compression_for(name)))
+                buffered.add(results[-1])
+
+        return [r.result() if isinstance(r, Future) else r for r in results]
+    except Exception:
+        for r in results:
+            if not isinstance(r, Future):
+                discard_staged(r)
+            elif r.done() and r.exception() is None:
+                discard_staged(r.result())
+        raise
+
+
+# -------------------------------------------------------
+# Store
+# -------------------------------------------------------
+
+def _current_versions(conn, project_id: int, names) -> dict:
+    """name -> [highest version, id of the is_latest row] for names already stored."""
+    names = list(names)
+    current = {}
+    for i in range(0, len(names), _SQL_BATCH):
+        part = names[i:i + _SQL_BATCH]
+        marks = ",".join("?" * len(part))
+        for name, version in conn.execute(
+            f"SELECT name, MAX(version) FROM files WHERE project_id = ? AND name IN ({marks}) GROUP BY name",
+            [project_id, *part],
+        ):
+            current[name] = [version, None]
+        for file_id, name in conn.execute(
+            f"SELECT id, name FROM files WHERE project_id = ? AND is_latest = 1 AND name IN ({marks})",
+            [project_id, *part],
+        ):
+            current.setdefault(name, [0, None])[1] = file_id
+    return current
+
+
+def _undo(steps):
+    # Reverse order: a name can be placed, archived and placed again in one batch
+    for step in reversed(steps):
+        try:
+            if step[0] == "placed":
+                if step[1].exists():
+                    step[1].unlink()
+            else:
+                _, src, dst = step
+                if dst.exists():
+                    dst.replace(src)
+        except OSError as e:
+            logger.error(f"Batch upload rollback step {step} failed: {e}")
+
+
+def _store_batch(project_id: int, uploads, archives):
+    project = get_project_by_id(project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    entries = _collect(uploads, archives)
+
+    project_name = project["name"]
+    project_folder = get_project_folder(project_name)
+    vc_folder = get_version_control_folder(project_name)
+    project_folder.mkdir(parents=True, exist_ok=True)
+    vc_folder.mkdir(parents=True, exist_ok=True)
+
+    try:
+        staged_all = _stage_all(entries)
+    except Exception as e:
+        logger.error(f"Batch upload staging failed (project={project_name}): {e}")
+        raise HTTPException(status_code=500, detail="Failed to encrypt & save files")
+
+    now = datetime.utcnow().isoformat()
+    steps = []
+    stored = []
+    try:
+        with transaction() as conn:
+            current = _current_versions(conn, project_id, {name for name, _, _ in entries})
+            superseded = []
+
+            for (name, _, _), staged in zip(entries, staged_all):
+                version, previous = current.get(name, (0, None))
+                version += 1
+
+                dest = project_folder / name
+                archived_path = None
+                if dest.exists() and version > 1:
+                    versioned_name = get_versioned_filename(name, version - 1)
+                    dest.replace(vc_folder / versioned_name)
+                    steps.append(("archived", dest, vc_folder / versioned_name))
+                    archived_path = f"{project_name}/Version Control/{versioned_name}"
+
+                size = commit_blob(staged)
+                link_blob(staged["hash"], dest)
+                steps.append(("placed", dest))
+
+                if previous is not None:
+                    conn.execute(
+                        "UPDATE files SET path = COALESCE(?, path), is_latest = 0 WHERE id = ?",
+                        (archived_path, previous),
+                    )
+                    superseded.append(previous)
+
+                file_id = insert_file_metadata(
+                    name=name,
+                    path=f"{project_name}/{name}",
+                    size=size,
+                    created_at=now,
+                    modified_at=now,
+                    project_id=project_id,
+                    version=version,
+                    is_latest=1,
+                    blob_hash=staged["hash"],
+                    plain_size=staged["plain_size"],
+                    compression=staged["codec"],
+                )
+                current[name] = [version, file_id]
+                stored.append({"name": name, "version": version, "file_id": file_id})
+
+            file_ids = [s["file_id"] for s in stored]
+            enqueue_jobs(file_ids, "index", PRIORITY_UPLOAD)
+            enqueue_jobs(superseded, "compact_version", PRIORITY_BACKFILL)
+            # Same audit entry per file as a single upload to the project
+            log_events("UPLOAD_VERSION", [(s["name"], s["version"]) for s in stored], project_id)
+    except Exception as e:
+        _undo(steps)
+        for staged in staged_all:
+            discard_staged(staged)
+        release_unreferenced([staged["hash"] for staged in staged_all])
+        logger.error(f"Batch upload failed (project={project_name}, files={len(entries)}): {e}")
+        raise HTTPException(status_code=500, detail="Failed to store batch")
+
+    logger.info(f"Batch upload | project={project_name} files={len(stored)}")
+
+    return {
+        "message": f"Uploaded {len(stored)} files",
+        "count": len(stored),
+        "files": stored,
+    }
@@ -0,0 +1,298 @@
+# services/blob_store.py
+
+import hashlib
+import hmac
+import os
+import secrets
+import shutil
+from datetime import datetime
+
+from core.config import BLOB_DIR
+from core.database import get_connection, transaction
+from core.logger import logger
+from encryption.crypto_engine import KEY, encrypt_file
+from encryption.compression import codec_name
+
+# -------------------------------------------------------
+# Content-addressed blob store
+# -------------------------------------------------------
+#
+# Every distinct plaintext is encrypted once and kept at
+# BLOB_DIR/ab/cd/<hash>. The logical paths under STORAGE_DIR (project folder,
+# Version Control) are hard links to that blob, so downloads, the file tree
+# and the consistency checker keep working unchanged while identical uploads
+# across projects and versions share one copy on disk.
+#
+# The hash is an HMAC-SHA256 of the plaintext under a key derived from the
+# vault key, so blob names don't reveal which well-known files are stored.
+#
+# Reference counts live in `blobs.refcount` and are maintained by triggers on
+# `files` (core/schema.py v8). Blob placement and linking happen inside the
+# caller's write transaction; release_unreferenced() removes blobs whose
+# count dropped to zero.
+#
+# Blobs may be compressed inside the container (encryption/compression.py);
+# `size` is always the physical size on disk, `plain_size` the logical one.
+
+HASH_READ_SIZE = 1024 * 1024
+
+_HASH_KEY = hmac.new(KEY, b"vault-blob-id", hashlib.sha256).digest()
+_STAGING_DIR = BLOB_DIR / "staging"
+
+
+def content_hasher():
+    return hmac.new(_HASH_KEY, digestmod=hashlib.sha256)
+
+
+def blob_path(blob_hash: str):
+    return BLOB_DIR / blob_hash[:2] / blob_hash[2:4] / blob_hash
+
+
+class _HashingReader:
+    """Wrap a reader, hashing and counting the bytes handed to the encryptor."""
+
+    def __init__(self, reader):
+        self._reader = reader
+        self.hasher = content_hasher()
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._reader.read(size)
+        self.hasher.update(data)
+        self.size += len(data)
+        return data
+
+
+def _is_seekable(reader) -> bool:
+    try:
+        return reader.seekable()
+    except AttributeError:
+        return False
+
+
+def _hash_reader(reader):
+    hasher = content_hasher()
+    size = 0
+    while True:
+        data = reader.read(HASH_READ_SIZE)
+        if not data:
+            break
+        hasher.update(data)
+        size += len(data)
+    return hasher.hexdigest(), size
+
+
+def _blob_row(conn, blob_hash: str):
+    return conn.execute(
+        "SELECT hash, size, plain_size, refcount, compression FROM blobs WHERE hash = ?",
+        (blob_hash,),
+    ).fetchone()
+
+
+def stage_blob(reader, compression=None) -> dict:
+    """
+    Hash the plaintext and, unless an identical blob is already stored,
+    encrypt it into a staging file. Runs outside any transaction.
+    Seekable uploads are hashed first, so re-uploading known content skips
+    encryption entirely; other readers are hashed while being encrypted.
+    `compression` is a (codec, level) pair for new blobs (see
+    encryption.compression.compression_for).
+    Returns {"hash", "plain_size", "staging", ...} (staging None when deduped).
+    """
+    _STAGING_DIR.mkdir(parents=True, exist_ok=True)
+
+    if _is_seekable(reader):
+        start = reader.tell()
+        blob_hash, plain_size = _hash_reader(reader)
+        if _blob_row(get_connection(), blob_hash) and blob_path(blob_hash).exists():
+            # Keep the reader: commit re-encrypts if the blob is released meanwhile
+            return {"hash": blob_hash, "plain_size": plain_size, "staging": None,
+                    "reader": reader, "start": start, "compression": compression}
+        reader.seek(start)
+
+    staging = _STAGING_DIR / secrets.token_hex(16)
+    hashing = _HashingReader(reader)
+    encrypt_file(hashing, staging, compression=compression)
+
+    return {"hash": hashing.hasher.hexdigest(), "plain_size": hashing.size, "staging": staging,
+            "compression": compression}
+
+
+def discard_staged(staged: dict):
+    staging = staged.get("staging")
+    if staging is not None and staging.exists():
+        staging.unlink()
+
+
+def commit_blob(staged: dict) -> int:
+    """
+    Make the staged blob available under its hash. Call inside the write
+    transaction that inserts the referencing files row(s). If the blob
+    already exists the staging copy is dropped. Returns the encrypted size;
+    staged["codec"] is set to the stored blob's codec name (None = raw).
+    """
+    blob_hash = staged["hash"]
+    target = blob_path(blob_hash)
+
+    with transaction() as conn:
+        row = _blob_row(conn, blob_hash)
+        if row and target.exists():
+            discard_staged(staged)
+            staged["codec"] = row[4]
+            return row[1]
+
+        staging = staged.get("staging")
+        if staging is None:
+            # Deduped at staging time but released since (rare): encrypt now
+            staged["reader"].seek(staged["start"])
+            staging = _STAGING_DIR / secrets.token_hex(16)
+            encrypt_file(staged["reader"], staging, compression=staged.get("compression"))
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(staging, target)
+        size = target.stat().st_size
+        compression = staged.get("compression")
+        staged["codec"] = codec_name(compression[0]) if compression else None
+
+        conn.execute(
+            """
+            INSERT INTO blobs (hash, size, plain_size, refcount, created_at, compression)
+            VALUES (?, ?, ?, 0, ?, ?)
+            ON CONFLICT(hash) DO UPDATE SET
+                size = excluded.size,
+                compression = excluded.compression
+            """,
+            (blob_hash, size, staged["plain_size"], datetime.utcnow().isoformat(),
+             staged["codec"]),
+        )
+        return size
+
+
+def link_blob(blob_hash: str, dest_path):
+    """
+    Expose a blob at a logical storage path, replacing whatever is there
+    (hard link; copy when the filesystem can't link, which keeps
+    correctness but loses the dedup).
+    """
+    source = blob_path(blob_hash)
+    dest_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest_path.with_name(f".{dest_path.name}.{secrets.token_hex(8)}.link")
+    try:
+        os.link(source, tmp)
+    except OSError:
+        shutil.copyfile(source, tmp)
+    os.replace(tmp, dest_path)
+
+
+def adopt_blob(abs_path, blob_hash: str, plain_size: int) -> int:
+    """
+    Register an existing encrypted file (stored before the blob store) under
+    `blob_hash`. When that content is already stored, `abs_path` is replaced
+    by a link to it; otherwise the file itself becomes the blob. Call inside
+    a transaction. Returns the blob's encrypted size.
+    """
+    target = blob_path(blob_hash)
+
+    with transaction() as conn:
+        row = _blob_row(conn, blob_hash)
+        if row and target.exists():
+            tmp = abs_path.with_name(abs_path.name + ".relink")
+            try:
+                os.link(target, tmp)
+                os.replace(tmp, abs_path)
+            except OSError:
+                pass  # keep the private copy; still counted against the blob
+            return row[1]
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(abs_path, target)
+        except OSError:
+            shutil.copyfile(abs_path, target)
+        size = target.stat().st_size
+
+        conn.execute(
+            """
+            INSERT INTO blobs (hash, size, plain_size, refcount, created_at)
+            VALUES (?, ?, ?, 0, ?)
+            ON CONFLICT(hash) DO UPDATE SET size = excluded.size
+            """,
+            (blob_hash, size, plain_size, datetime.utcnow().isoformat()),
+        )
+        return size
+
+
+def release_unreferenced(blob_hashes=None) -> int:
+    """
+    Delete blobs nobody references any more (optionally only among
+    `blob_hashes`, which also drops their files left by a rolled-back
+    commit). Runs under the write lock, so it cannot race a commit that is
+    about to link the same blob. Returns the number removed.
+    """
+    with transaction() as conn:
+        if blob_hashes is None:
+            doomed = [r[0] for r in conn.execute("SELECT hash FROM blobs WHERE refcount <= 0")]
+        else:
+            doomed = []
+            for blob_hash in set(h for h in blob_hashes if h):
+                row = _blob_row(conn, blob_hash)
+                if row is None or row[3] <= 0:
+                    doomed.append(blob_hash)
+
+        removed = 0
+        for blob_hash in doomed:
+            conn.execute("DELETE FROM blobs WHERE hash = ?", (blob_hash,))
+            try:
+                blob_path(blob_hash).unlink()
+                removed += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"Failed to remove blob {blob_hash}: {e}")
+
+    return removed
+
+
+def sweep_blob_store() -> int:
+    """
+    Startup housekeeping: drop staging files left by interrupted uploads and
+    blobs whose last reference is gone. Returns blobs removed.
+    """
+    if _STAGING_DIR.exists():
+        for leftover in _STAGING_DIR.iterdir():
+            try:
+                leftover.unlink()
+            except OSError:
+                pass
+    return release_unreferenced()
+
+
+def dedup_stats() -> dict:
+    """
+    Logical bytes (what the files rows reference) vs physical bytes (what
+    the blob store holds), for rows that live in the blob store.
+    """
+    conn = get_connection()
+    logical, references = conn.execute(
+        """
+        SELECT COALESCE(SUM(b.size), 0), COUNT(*)
+        FROM files f JOIN blobs b ON b.hash = f.blob_hash
+        """
+    ).fetchone()
+    physical, blobs, plain = conn.execute(
+        "SELECT COALESCE(SUM(size), 0), COUNT(*), COALESCE(SUM(plain_size), 0) FROM blobs"
+    ).fetchone()
+    unmanaged = conn.execute(
+        "SELECT COUNT(*) FROM files WHERE blob_hash IS NULL AND storage = 'blob'"
+    ).fetchone()[0]
+
+    return {
+        "files": references,
+        "blobs": blobs,
+        "logical_bytes": logical,
+        "physical_bytes": physical,
+        "plaintext_bytes": plain,
+        "saved_bytes": logical - physical,
+        "dedup_ratio": round(logical / physical, 3) if physical else 1.0,
+        "files_outside_blob_store": unmanaged,
+    }
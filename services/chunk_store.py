@@ -0,0 +1,355 @@
+# services/chunk_store.py
+
+import os
+import secrets
+import threading
+from bisect import bisect_right
+from datetime import datetime
+
+from core.config import BLOB_DIR, STORAGE_DIR
+from core.database import get_connection, transaction
+from core.logger import logger
+from encryption.crypto_engine import decrypt_bytes, decrypt_file, encrypt_bytes
+from encryption.compression import compression_for
+from services.blob_store import content_hasher, release_unreferenced
+
+# -------------------------------------------------------
+# Chunk-level dedup for superseded versions
+# -------------------------------------------------------
+#
+# The latest version of a file stays a whole blob (fast download / range
+# reads). Once a version is superseded, a background 'compact_version' job
+# cuts its plaintext into content-defined chunks (FastCDC), stores each
+# distinct chunk once (encrypted, BLOB_DIR/chunks/ab/<hash>) and replaces the
+# Version Control copy with a manifest: the ordered chunk list in
+# file_manifests. Small edits only change the chunks around the edit, so
+# each extra version costs roughly the edited bytes, not the whole file.
+#
+# Chunk refcounts are maintained by triggers on file_manifests. Unreferenced
+# chunks are removed by release_unreferenced_chunks(), which runs under the
+# same process-wide lock as compaction so a chunk can't vanish between
+# "already stored" and its manifest row being written.
+
+CDC_MIN_SIZE = 8 * 1024
+CDC_AVG_SIZE = 32 * 1024
+CDC_MAX_SIZE = 128 * 1024
+CDC_READ_SIZE = 4 * 1024 * 1024
+
+CHUNK_DIR = BLOB_DIR / "chunks"
+
+_lock = threading.Lock()
+_gear = None
+
+
+# -------------------------------------------------------
+# FastCDC (normalised chunking, gear rolling hash)
+# -------------------------------------------------------
+
+def _mask(bits: int) -> int:
+    # Bit j of the gear hash depends only on the last j + 1 bytes, so the
+    # high bits (full 64-byte window) are the ones worth testing
+    return ((1 << bits) - 1) << (64 - bits)
+
+
+_AVG_BITS = CDC_AVG_SIZE.bit_length() - 1
+MASK_S = _mask(_AVG_BITS + 2)   # harder: before the average size
+MASK_L = _mask(_AVG_BITS - 2)   # easier: past the average size
+
+
+def _gear_table():
+    global _gear
+    if _gear is None:
+        import numpy as np
+        _gear = np.random.default_rng(0x5EED_CDC).integers(
+            0, 2**64, size=256, dtype=np.uint64, endpoint=False
+        )
+    return _gear
+
+
+def _gear_hashes(buf: bytes):
+    """
+    h[i] = sum(gear[b[i-k]] << k for k in 0..63), i.e. the FastCDC rolling
+    hash at every position, computed with log2(64) = 6 vectorised passes
+    (h_2m[i] = h_m[i] + (h_m[i-m] << m)) instead of a per-byte Python loop.
+    """
+    import numpy as np
+    h = _gear_table()[np.frombuffer(buf, dtype=np.uint8)]
+    m = 1
+    while m < 64:
+        shifted = np.zeros_like(h)
+        shifted[m:] = h[:-m] << np.uint64(m)
+        h = h + shifted
+        m *= 2
+    return h
+
+
+def _cut_points(buf: bytes, final: bool):
+    """
+    Chunk boundaries in `buf` (which starts at a chunk boundary). Returns
+    the end offsets of complete chunks; without `final`, the tail after the
+    last boundary is left for the next buffer.
+    """
+    import numpy as np
+    n = len(buf)
+    h = _gear_hashes(buf)
+    strict = np.flatnonzero((h & np.uint64(MASK_S)) == 0) + 1   # cut after the byte
+    loose = np.flatnonzero((h & np.uint64(MASK_L)) == 0) + 1
+
+    cuts = []
+    pos = 0
+    while pos < n:
+        if n - pos <= CDC_MIN_SIZE:
+            if final:
+                cuts.append(n)
+            break
+
+        normal = min(pos + CDC_AVG_SIZE, n)
+        limit = pos + CDC_MAX_SIZE
+
+        i = np.searchsorted(strict, pos + CDC_MIN_SIZE, side="left")
+        if i < len(strict) and strict[i] < normal:
+            cut = int(strict[i])
+        else:
+            j = np.searchsorted(loose, normal, side="left")
+            if j < len(loose) and loose[j] <= min(limit, n):
+                cut = int(loose[j])
+            elif limit <= n:
+                cut = limit
+            elif final:
+                cut = n
+            else:
+                break  # not enough data yet to place this cut
+
+        cuts.append(cut)
+        pos = cut
+
+    return cuts
+
+
+def iter_cdc_chunks(pieces):
+    """Re-cut an iterable of byte pieces into content-defined chunks."""
+    buffer = b""
+    for piece in pieces:
+        buffer += piece
+        if len(buffer) < CDC_READ_SIZE:
+            continue
+        start = 0
+        for cut in _cut_points(buffer, final=False):
+            yield buffer[start:cut]
+            start = cut
+        buffer = buffer[start:]
+
+    if buffer:
+        start = 0
+        for cut in _cut_points(buffer, final=True):
+            yield buffer[start:cut]
+            start = cut
+
+
+# -------------------------------------------------------
+# Chunk storage
+# -------------------------------------------------------
+
+def chunk_path(chunk_hash: str):
+    return CHUNK_DIR / chunk_hash[:2] / chunk_hash
+
+
+def _write_chunk(chunk_hash: str, data: bytes, compression=None) -> int:
+    target = chunk_path(chunk_hash)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f".{chunk_hash}.{secrets.token_hex(4)}.part")
+    enc = encrypt_bytes(data, compression=compression)
+    with open(tmp, "wb") as f:
+        f.write(enc)
+    os.replace(tmp, target)
+    return len(enc)
+
+
+def read_chunk(chunk_hash: str) -> bytes:
+    with open(chunk_path(chunk_hash), "rb") as f:
+        return decrypt_bytes(f.read())
+
+
+def compact_version(file_id: int):
+    """
+    Convert a superseded version from a whole blob into a chunk manifest and
+    drop its Version Control copy. Idempotent; the latest version is never
+    compacted. Returns a summary dict.
+    """
+    from services.file_service_db import get_file_by_id
+
+    with _lock:
+        file = get_file_by_id(file_id)
+        if not file:
+            raise ValueError(f"File not found: id={file_id}")
+        if file["is_latest"] or file["storage"] == "chunks" or not file["blob_hash"]:
+            return {"compacted": False, "file_id": file_id, "reason": "not eligible"}
+
+        abs_path = STORAGE_DIR / file["path"]
+        if not abs_path.exists():
+            raise ValueError(f"File missing on disk: {abs_path}")
+
+        conn = get_connection()
+        manifest = []          # (seq, hash, offset, length)
+        new_chunks = {}        # hash -> (encrypted size, plain size)
+        offset = 0
+        compression = compression_for(file["name"])
+
+        for seq, data in enumerate(iter_cdc_chunks(decrypt_file(abs_path))):
+            hasher = content_hasher()
+            hasher.update(data)
+            chunk_hash = hasher.hexdigest()
+
+            known = chunk_hash in new_chunks or (
+                conn.execute("SELECT 1 FROM chunks WHERE hash = ?", (chunk_hash,)).fetchone()
+                and chunk_path(chunk_hash).exists()
+            )
+            if not known:
+                new_chunks[chunk_hash] = (_write_chunk(chunk_hash, data, compression), len(data))
+
+            manifest.append((seq, chunk_hash, offset, len(data)))
+            offset += len(data)
+
+        now = datetime.utcnow().isoformat()
+        try:
+            _commit_manifest(file_id, manifest, new_chunks, now)
+        except Exception:
+            for chunk_hash in new_chunks:
+                chunk_path(chunk_hash).unlink(missing_ok=True)
+            raise
+
+        try:
+            abs_path.unlink()
+        except FileNotFoundError:
+            pass
+        release_unreferenced([file["blob_hash"]])
+        _release_unreferenced_chunks()
+
+    stored = sum(size for size, _ in new_chunks.values())
+    logger.info(
+        f"Compacted file_id={file_id} | chunks={len(manifest)} new={len(new_chunks)} "
+        f"| plain={offset} stored={stored}"
+    )
+    return {
+        "compacted": True,
+        "file_id": file_id,
+        "chunks": len(manifest),
+        "new_chunks": len(new_chunks),
+        "plain_bytes": offset,
+        "stored_bytes": stored,
+    }
+
+
+def _commit_manifest(file_id: int, manifest, new_chunks, now: str):
+    with transaction() as tx:
+        tx.executemany(
+            """
+            INSERT INTO chunks (hash, size, plain_size, refcount, created_at)
+            VALUES (?, ?, ?, 0, ?)
+            ON CONFLICT(hash) DO NOTHING
+            """,
+            [(h, size, plain, now) for h, (size, plain) in new_chunks.items()],
+        )
+        tx.execute("DELETE FROM file_manifests WHERE file_id = ?", (file_id,))
+        tx.executemany(
+            """
+            INSERT INTO file_manifests (file_id, seq, chunk_hash, offset, length)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            [(file_id, *entry) for entry in manifest],
+        )
+        # Releases the whole-file blob reference (files_blob_au trigger)
+        tx.execute(
+            "UPDATE files SET storage = 'chunks', blob_hash = NULL WHERE id = ?",
+            (file_id,),
+        )
+
+
+def _release_unreferenced_chunks() -> int:
+    removed = 0
+    with transaction() as conn:
+        rows = conn.execute("SELECT hash FROM chunks WHERE refcount <= 0").fetchall()
+        for (chunk_hash,) in rows:
+            conn.execute("DELETE FROM chunks WHERE hash = ?", (chunk_hash,))
+            try:
+                chunk_path(chunk_hash).unlink()
+                removed += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"Failed to remove chunk {chunk_hash}: {e}")
+    return removed
+
+
+def release_unreferenced_chunks(blocking: bool = True) -> int:
+    """
+    Delete chunks no manifest references. With blocking=False this is
+    skipped while a compaction runs (which sweeps itself when done).
+    """
+    if not _lock.acquire(blocking=blocking):
+        return 0
+    try:
+        return _release_unreferenced_chunks()
+    finally:
+        _lock.release()
+
+
+# -------------------------------------------------------
+# Reading manifests
+# -------------------------------------------------------
+
+class ManifestSource:
+    """
+    Plaintext of a chunked version, as a services/range_service.py source
+    (`size`, `iter_all()`, `iter_range(start, end)` inclusive, ...).
+    Only the chunks overlapping a range are read and decrypted.
+    """
+
+    def __init__(self, file: dict):
+        conn = get_connection()
+        rows = conn.execute(
+            "SELECT chunk_hash, offset, length FROM file_manifests WHERE file_id = ? ORDER BY seq",
+            (file["id"],),
+        ).fetchall()
+        self.hashes = [r[0] for r in rows]
+        self.offsets = [r[1] for r in rows]
+        self.size = (rows[-1][1] + rows[-1][2]) if rows else 0
+        self.mtime = datetime.fromisoformat(file["modified_at"]).timestamp()
+        # Manifests are immutable once written
+        self.stored_size = self.size
+        self.validator = f"m{len(rows)}"
+
+    def iter_all(self):
+        for chunk_hash in self.hashes:
+            yield read_chunk(chunk_hash)
+
+    def iter_range(self, start: int, end: int):
+        i = bisect_right(self.offsets, start) - 1
+        while i < len(self.hashes) and self.offsets[i] <= end:
+            data = read_chunk(self.hashes[i])
+            base = self.offsets[i]
+            yield data[max(start - base, 0):end - base + 1]
+            i += 1
+
+
+def iter_plaintext(file: dict):
+    """Plaintext pieces of any version, whole blob or chunk manifest."""
+    if file.get("storage") == "chunks":
+        return ManifestSource(file).iter_all()
+    return decrypt_file(STORAGE_DIR / file["path"])
+
+
+def chunk_stats() -> dict:
+    conn = get_connection()
+    versions, logical = conn.execute(
+        "SELECT COUNT(DISTINCT file_id), COALESCE(SUM(length), 0) FROM file_manifests"
+    ).fetchone()
+    chunks, physical = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM chunks"
+    ).fetchone()
+    return {
+        "chunked_versions": versions,
+        "chunks": chunks,
+        "chunked_plaintext_bytes": logical,
+        "chunk_bytes": physical,
+    }
@@ -0,0 +1,39 @@
+# services/chunking_service.py
+
+import re
+
+# MiniLM truncates at ~256 word-pieces; ~180 words stays safely below that.
+CHUNK_WORDS = 180
+CHUNK_OVERLAP_WORDS = 40
+
+_WORD = re.compile(r"\S+")
+
+
+def split_into_chunks(text: str, chunk_words: int = CHUNK_WORDS,
+                      overlap_words: int = CHUNK_OVERLAP_WORDS):
+    """
+    Split text into overlapping word windows.
+    Returns [{"chunk_index", "start", "end", "text"}], where start/end are
+    character offsets into `text` (so passages can be re-sliced from
+    file_index.content without storing the text twice).
+    """
+    spans = [m.span() for m in _WORD.finditer(text)]
+    if not spans:
+        return []
+
+    step = max(1, chunk_words - overlap_words)
+    chunks = []
+
+    for index, first in enumerate(range(0, len(spans), step)):
+        last = min(first + chunk_words, len(spans)) - 1
+        start, end = spans[first][0], spans[last][1]
+        chunks.append({
+            "chunk_index": index,
+            "start": start,
+            "end": end,
+            "text": text[start:end],
+        })
+        if last == len(spans) - 1:
+            break
+
+    return chunks
@@ -3,6 +3,7 @@
 import os
 from core.config import STORAGE_DIR
 from services.file_service_db import get_all_files, delete_file_metadata
+from services.blob_store import release_unreferenced
 
 
 # -------------------------------------------------------
@@ -15,6 +16,8 @@ def find_missing_files():
     """
     missing = []
     for f in get_all_files():
+        if f["storage"] == "chunks":
+            continue  # compacted old version: lives in the chunk store
         abs_path = STORAGE_DIR / f["path"]
         if not abs_path.exists():
             missing.append(f)
@@ -75,6 +78,7 @@ def auto_repair():
     for f in missing:
         delete_file_metadata(f["id"])
         repaired["cleared_missing_db"] += 1
+    release_unreferenced([f["blob_hash"] for f in missing])
 
     # Remove orphan disk files
     for rel in orphaned:
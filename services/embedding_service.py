@@ -1,22 +1,60 @@
 # services/embedding_service.py
 
+import hashlib
 import json
+from bisect import bisect_right
 from datetime import datetime
 
-import sqlite3
-from core.config import DB_PATH
+from core.config import ANN_BACKEND, ANN_INDEX_DIR, ANN_MIN_VECTORS
+from core.database import get_connection, transaction
+from services.chunking_service import split_into_chunks
 
 MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 
+EMBED_BATCH_SIZE = 32
+EMBED_GROUP_CHUNKS = 2048  # chunks per upsert_embeddings write (bounds memory)
+CHUNK_OVERFETCH = 5        # chunk hits fetched per requested file
+PASSAGES_PER_FILE = 3
+
 try:
     from sentence_transformers import SentenceTransformer
     import numpy as np
+    from services.vector_store import encode_vector, decode_vector
     _model = SentenceTransformer(MODEL_NAME)
 except Exception:
     _model = None
     np = None
 
 
+_store = None
+
+
+def _load_embeddings():
+    # The searchable vectors are per chunk; keys are file_chunks.id
+    conn = get_connection()
+    return conn.execute("SELECT id, embedding FROM file_chunks WHERE embedding IS NOT NULL")
+
+
+def _get_store():
+    """Process-wide chunk embedding matrix, built on first use."""
+    global _store
+    if _store is None:
+        from services.vector_store import VectorStore
+        from services.ann_index import create_ann_index
+        _store = VectorStore(
+            _load_embeddings,
+            ann=create_ann_index(ANN_BACKEND, ANN_INDEX_DIR, prefix="ann_chunks"),
+            ann_min=ANN_MIN_VECTORS,
+        )
+    return _store
+
+
+def save_vector_index():
+    """Persist the ANN index (called on shutdown; cheap no-op when unused)."""
+    if _store is not None:
+        _store.save_ann()
+
+
 def _ensure_model():
     if _model is None:
         raise RuntimeError(
@@ -30,42 +68,237 @@ def compute_embedding(text: str):
     return vec  # numpy array
 
 
+def compute_embeddings(texts: list):
+    """
+    Batch-encode many texts; returns a (len(texts), dim) float32 array.
+    Texts are encoded longest first, so each model batch holds texts of
+    similar length and little padding is computed.
+    """
+    _ensure_model()
+    if not texts:
+        return np.zeros((0, _model.get_sentence_embedding_dimension()), dtype=np.float32)
+
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+    vecs = np.asarray(
+        _model.encode([texts[i] for i in order], batch_size=EMBED_BATCH_SIZE,
+                      normalize_embeddings=True),
+        dtype=np.float32,
+    )
+    out = np.empty_like(vecs)
+    out[order] = vecs
+    return out
+
+
+def text_digest(text: str) -> str:
+    """sha256 of extracted text; ties file_embeddings to the file_index text."""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def embedding_is_current(file_id: int, text_hash: str) -> bool:
+    """True if the stored vectors were built from this text with MODEL_NAME."""
+    row = get_connection().execute(
+        "SELECT model_name, text_hash FROM file_embeddings WHERE file_id = ?", (file_id,)
+    ).fetchone()
+    return bool(row) and row[0] == MODEL_NAME and row[1] == text_hash
+
+
 def upsert_embedding(file_id: int, text: str):
     """
-    Compute embedding for text and upsert into file_embeddings table.
+    Split text into overlapping chunks, embed them in batches and replace the
+    file's rows in file_chunks. file_embeddings keeps one document vector
+    (the normalised mean of its chunks) per file.
+    """
+    upsert_embeddings([(file_id, text)])
+
+
+def upsert_embeddings(items):
+    """
+    upsert_embedding for many (file_id, text) pairs at once: the chunks of
+    all files are encoded together in model-sized batches and every file's
+    rows are replaced in one transaction (per EMBED_GROUP_CHUNKS chunks).
+    Returns the number of chunks embedded.
     """
-    if not text.strip():
-        return  # nothing to embed
+    empty = [file_id for file_id, text in items if not text.strip()]
+    for file_id in empty:
+        discard_embedding(file_id)  # old chunks would point into the wrong text
 
+    items = [(file_id, text) for file_id, text in items if text.strip()]
+    if not items:
+        return 0
     _ensure_model()
-    vec = compute_embedding(text)
 
-    embedding_str = json.dumps(vec.tolist())
+    total = 0
+    group = []
+    group_chunks = 0
+    for file_id, text in items:
+        chunks = split_into_chunks(text)
+        group.append((file_id, text_digest(text), chunks))
+        group_chunks += len(chunks)
+        if group_chunks >= EMBED_GROUP_CHUNKS:
+            total += _embed_group(group)
+            group, group_chunks = [], 0
+    if group:
+        total += _embed_group(group)
+    return total
+
+
+def _embed_group(group):
+    vecs = compute_embeddings([c["text"] for _, _, chunks in group for c in chunks])
     now = datetime.utcnow().isoformat()
 
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute(
-        """
-        INSERT INTO file_embeddings (file_id, embedding, model_name, created_at, updated_at)
-        VALUES (?, ?, ?, ?, ?)
-        ON CONFLICT(file_id) DO UPDATE SET
-            embedding=excluded.embedding,
-            model_name=excluded.model_name,
-            updated_at=excluded.updated_at
+    updates = []   # (old chunk ids, new chunk ids, vectors)
+    offset = 0
+    with transaction() as conn:
+        for file_id, text_hash, chunks in group:
+            file_vecs = vecs[offset:offset + len(chunks)]
+            offset += len(chunks)
+
+            doc_vec = file_vecs.mean(axis=0)
+            doc_vec /= max(float(np.linalg.norm(doc_vec)), 1e-12)
+
+            old_ids = _chunk_ids(conn, file_id)
+            conn.execute("DELETE FROM file_chunks WHERE file_id = ?", (file_id,))
+
+            new_ids = []
+            for chunk, vec in zip(chunks, file_vecs):
+                cur = conn.execute(
+                    """
+                    INSERT INTO file_chunks
+                        (file_id, chunk_index, start_char, end_char, embedding, model_name, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (file_id, chunk["chunk_index"], chunk["start"], chunk["end"],
+                     encode_vector(vec), MODEL_NAME, now),
+                )
+                new_ids.append(cur.lastrowid)
+
+            conn.execute(
+                """
+                INSERT INTO file_embeddings
+                    (file_id, embedding, model_name, text_hash, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(file_id) DO UPDATE SET
+                    embedding=excluded.embedding,
+                    model_name=excluded.model_name,
+                    text_hash=excluded.text_hash,
+                    updated_at=excluded.updated_at
+                """,
+                (file_id, encode_vector(doc_vec), MODEL_NAME, text_hash, now, now),
+            )
+            updates.append((old_ids, new_ids, file_vecs))
+
+    store = _get_store()
+    for old_ids, new_ids, file_vecs in updates:
+        for chunk_id in old_ids:
+            store.remove(chunk_id)
+        for chunk_id, vec in zip(new_ids, file_vecs):
+            store.upsert(chunk_id, vec)
+    return len(vecs)
+
+
+def _chunk_ids(conn, file_id: int):
+    rows = conn.execute("SELECT id FROM file_chunks WHERE file_id = ?", (file_id,)).fetchall()
+    return [r[0] for r in rows]
+
+
+def discard_embedding(file_id: int):
+    """
+    Drop a file's chunk + document embeddings (rows and in-memory vectors), e.g. on delete.
+    """
+    with transaction() as conn:
+        old_ids = _chunk_ids(conn, file_id)
+        conn.execute("DELETE FROM file_chunks WHERE file_id = ?", (file_id,))
+        conn.execute("DELETE FROM file_embeddings WHERE file_id = ?", (file_id,))
+
+    if _store is not None:
+        for chunk_id in old_ids:
+            _store.remove(chunk_id)
+
+
+# -------------------------------------------------------
+# Passages
+# -------------------------------------------------------
+
+_PASSAGE_COLUMNS = """
+    c.id, c.file_id, c.chunk_index, c.start_char, c.end_char,
+    substr(i.content, c.start_char + 1, c.end_char - c.start_char),
+    i.locations
+"""
+
+
+def _location(locations_json, start: int):
+    """The extractor segment (page / sheet rows / slide) a passage starts in."""
+    if not locations_json:
+        return None
+    locations = json.loads(locations_json)
+    pos = bisect_right([loc["start"] for loc in locations], start) - 1
+    if pos < 0:
+        return None
+    return {k: v for k, v in locations[pos].items() if k != "start"}
+
+
+def _passage(row, score):
+    return {
+        "chunk_index": row[2],
+        "start": row[3],
+        "end": row[4],
+        "text": row[5],
+        "location": _location(row[6], row[3]),
+        "score": score,
+    }
+
+
+def _load_chunks(chunk_ids):
+    if not chunk_ids:
+        return {}
+    conn = get_connection()
+    placeholders = ",".join("?" * len(chunk_ids))
+    rows = conn.execute(
+        f"""
+        SELECT {_PASSAGE_COLUMNS}
+        FROM file_chunks c
+        JOIN file_index i ON i.file_id = c.file_id
+        WHERE c.id IN ({placeholders})
         """,
-        (file_id, embedding_str, MODEL_NAME, now, now),
-    )
+        list(chunk_ids),
+    ).fetchall()
+    return {r[0]: r for r in rows}
 
-    conn.commit()
-    conn.close()
 
+def best_passages(file_id: int, query: str, limit: int = PASSAGES_PER_FILE):
+    """
+    The `limit` chunks of one file closest to `query`, best first.
+    Used to give the LLM relevant passages instead of a text prefix.
+    """
+    _ensure_model()
+    q_vec = compute_embedding(query)
+
+    conn = get_connection()
+    rows = conn.execute(
+        f"""
+        SELECT {_PASSAGE_COLUMNS}, c.embedding
+        FROM file_chunks c
+        JOIN file_index i ON i.file_id = c.file_id
+        WHERE c.file_id = ?
+        """,
+        (file_id,),
+    ).fetchall()
+
+    if not rows:
+        return []
+
+    scores = np.stack([decode_vector(r[7]) for r in rows]) @ q_vec
+    order = np.argsort(-scores)[:limit]
+    return [_passage(rows[i], float(scores[i])) for i in order]
 
-def semantic_search(query: str, top_k: int = 10):
+
+def semantic_search(query: str, top_k: int = 10, probes: int = None, exact: bool = False):
     """
-    Brute-force semantic search over all embeddings in SQLite.
-    Returns list of {file_id, score}.
+    Chunk-level semantic search over the in-memory embedding matrix (through
+    the ANN index once the vault is large enough). Chunk scores are
+    aggregated per file (best chunk wins) and the best passages returned.
+    `probes` trades latency for recall; `exact=True` forces brute force.
+    Returns list of {file_id, score, passages}.
     """
     _ensure_model()
     if np is None:
@@ -73,31 +306,16 @@ def semantic_search(query: str, top_k: int = 10):
 
     q_vec = compute_embedding(query)
 
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT file_id, embedding FROM file_embeddings"
-    )
-    rows = cur.fetchall()
-    conn.close()
-
-    if not rows:
-        return []
+    hits = _get_store().search(q_vec, top_k * CHUNK_OVERFETCH, probes=probes, exact=exact)
+    chunks = _load_chunks([chunk_id for chunk_id, _ in hits])
 
-    scores = []
-    for file_id, emb_str in rows:
-        try:
-            vec = np.array(json.loads(emb_str), dtype=float)
-            # cosine similarity since both are normalized
-            sim = float(np.dot(q_vec, vec))
-            scores.append((file_id, sim))
-        except Exception:
+    files = {}
+    for chunk_id, score in hits:  # best first
+        row = chunks.get(chunk_id)
+        if row is None:
             continue
+        entry = files.setdefault(row[1], {"file_id": row[1], "score": score, "passages": []})
+        if len(entry["passages"]) < PASSAGES_PER_FILE:
+            entry["passages"].append(_passage(row, score))
 
-    scores.sort(key=lambda x: x[1], reverse=True)
-    scores = scores[:top_k]
-
-    return [
-        {"file_id": fid, "score": score}
-        for fid, score in scores
-    ]
+    return list(files.values())[:top_k]
@@ -0,0 +1,178 @@
+# services/export_service.py
+
+import os
+import zipfile
+from datetime import datetime
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from core.concurrency import iterate_offloaded
+from core.database import get_connection
+from core.logger import logger
+from encryption.compression import TEXT_EXTENSIONS
+from services.audit_service import log_event
+from services.chunk_store import iter_plaintext
+from services.file_service_db import FILE_COLUMNS, _row_to_file
+from services.file_version_service import get_versioned_filename
+from services.project_db import get_project_by_id
+
+# -------------------------------------------------------
+# Streaming ZIP export
+# -------------------------------------------------------
+#
+# A project (or any set of file ids) is streamed out as one ZIP. zipfile
+# writes into an unseekable sink, so every entry gets a data descriptor
+# instead of a patched-up local header, and the response body is drained
+# from the sink as each decrypted record is written: files are decrypted one
+# at a time, record by record, and memory stays constant however large the
+# export is. Entries that might pass 4 GiB are written as ZIP64.
+#
+# Entries are stored as-is unless compress=true, which deflates text types
+# (deflate gains little on binaries and would cap throughput).
+
+MEDIA_TYPE = "application/zip"
+_SQL_BATCH = 500
+
+
+class _StreamSink:
+    """Write-only, unseekable file object that collects zipfile output."""
+
+    def __init__(self):
+        self._pieces = []
+
+    def write(self, data) -> int:
+        self._pieces.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        out = b"".join(self._pieces)
+        self._pieces.clear()
+        return out
+
+
+def _zip_time(timestamp: str):
+    try:
+        moment = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        moment = datetime.utcnow()
+    return max(moment, datetime(1980, 1, 1)).timetuple()[:6]
+
+
+def _zip_stream(entries, compress: bool):
+    """Yield the ZIP of (arcname, file row) entries, one decrypted record at a time."""
+    sink = _StreamSink()
+    with zipfile.ZipFile(sink, "w", allowZip64=True) as archive:
+        for arcname, file in entries:
+            info = zipfile.ZipInfo(arcname, date_time=_zip_time(file["modified_at"]))
+            deflate = compress and os.path.splitext(file["name"])[1].lower() in TEXT_EXTENSIONS
+            info.compress_type = zipfile.ZIP_DEFLATED if deflate else zipfile.ZIP_STORED
+            plain_size = file.get("plain_size")
+            large = plain_size is None or plain_size >= zipfile.ZIP64_LIMIT
+
+            try:
+                with archive.open(info, "w", force_zip64=large) as out:
+                    for piece in iter_plaintext(file):
+                        out.write(piece)
+                        data = sink.drain()
+                        if data:
+                            yield data
+            except Exception as e:
+                # Half an entry is already on the wire; all we can do is stop
+                logger.error(f"Export aborted at {arcname} (file_id={file['id']}): {e}")
+                raise
+            yield sink.drain()
+    yield sink.drain()
+
+
+def _export_response(entries, download_name: str, compress: bool):
+    return StreamingResponse(
+        iterate_offloaded(_zip_stream(entries, compress)),
+        media_type=MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="{download_name}"'},
+    )
+
+
+# -------------------------------------------------------
+# Project export
+# -------------------------------------------------------
+
+def export_project(project_id: int, include_versions: bool = False, compress: bool = False):
+    """
+    Stream a project's latest files as <project>.zip; with include_versions,
+    older versions go under "Version Control/" as name-vN.ext.
+    """
+    project = get_project_by_id(project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    latest_only = "" if include_versions else " AND is_latest = 1"
+    rows = get_connection().execute(f"""
+        SELECT {FILE_COLUMNS}
+        FROM files
+        WHERE project_id = ?{latest_only}
+        ORDER BY name, version DESC
+    """, (project_id,)).fetchall()
+
+    entries = []
+    for file in map(_row_to_file, rows):
+        if file["is_latest"]:
+            entries.append((file["name"], file))
+        else:
+            versioned = get_versioned_filename(file["name"], file["version"])
+            entries.append((f"Version Control/{versioned}", file))
+
+    log_event("EXPORT_PROJECT", project_id=project_id, meta=f"{len(entries)} files")
+    logger.info(f"Export | project={project['name']} files={len(entries)}")
+    return _export_response(entries, f"{project['name']}.zip", compress)
+
+
+# -------------------------------------------------------
+# Export of selected files (e.g. search results)
+# -------------------------------------------------------
+
+def export_files(file_ids, compress: bool = False):
+    """
+    Stream the given file versions as one ZIP, each under its project's
+    folder ("root/" for root files); a name taken twice gets its version.
+    """
+    file_ids = list(dict.fromkeys(file_ids))
+    if not file_ids:
+        raise HTTPException(status_code=400, detail="No file ids given")
+
+    files = {}
+    conn = get_connection()
+    for i in range(0, len(file_ids), _SQL_BATCH):
+        part = file_ids[i:i + _SQL_BATCH]
+        marks = ",".join("?" * len(part))
+        for r in conn.execute(f"SELECT {FILE_COLUMNS} FROM files WHERE id IN ({marks})", part):
+            files[r[0]] = _row_to_file(r)
+
+    missing = [file_id for file_id in file_ids if file_id not in files]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Files not found: {missing[:20]}")
+
+    project_names = {}
+    entries, taken = [], set()
+    for file_id in file_ids:
+        file = files[file_id]
+        project_id = file["project_id"]
+        if project_id not in project_names:
+            project = get_project_by_id(project_id) if project_id is not None else None
+            project_names[project_id] = project["name"] if project else "root"
+        folder = project_names[project_id]
+
+        arcname = f"{folder}/{file['name']}"
+        if arcname in taken:
+            arcname = f"{folder}/{get_versioned_filename(file['name'], file['version'])}"
+        if arcname in taken:
+            arcname = f"{folder}/{file['id']}-{file['name']}"
+        taken.add(arcname)
+        entries.append((arcname, file))
+
+    log_event("EXPORT_FILES", meta=f"{len(entries)} files")
+    logger.info(f"Export | files={len(entries)}")
+    return _export_response(entries, "vault-export.zip", compress)
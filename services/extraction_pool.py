@@ -0,0 +1,312 @@
+# services/extraction_pool.py
+
+import multiprocessing
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from core.config import (
+    EXTRACT_WORKERS,
+    EXTRACT_MAX_TASKS_PER_CHILD,
+    EXTRACT_MEMORY_LIMIT_MB,
+    EXTRACT_ADDRESS_SPACE_LIMIT_MB,
+)
+from core.logger import logger
+from services.text_extraction_service import (
+    collect_text,
+    iter_segments_from_pieces,
+    file_extension,
+    TEXT_EXTENSIONS,
+    XLSX_EXTENSIONS,
+    IMAGE_EXTENSIONS,
+    HTML_EXTENSIONS,
+)
+
+# -------------------------------------------------------
+# Process-pool text extraction
+# -------------------------------------------------------
+#
+# PyMuPDF / python-docx / openpyxl / EasyOCR run in worker processes, so they
+# neither hold the API's GIL nor can pin it forever:
+#   - every call has a per-format wall-clock timeout, counted from when a
+#     worker is free for it (calls beyond EXTRACT_WORKERS wait their turn
+#     first); on expiry the pool is torn down (killing the stuck worker)
+#     and replaced
+#   - while waiting, callers poll the workers' resident memory (RSS, from
+#     /proc) and recycle the pool when one goes over EXTRACT_MEMORY_LIMIT_MB;
+#     the job that did it fails with memory_limit if it does so again
+#   - an address-space limit (RLIMIT_AS) is only a backstop: torch and
+#     EasyOCR map many GB they never touch, so it is set far above the RSS
+#     cap, where hitting it turns a runaway parse into a MemoryError
+#   - workers are recycled after EXTRACT_MAX_TASKS_PER_CHILD jobs
+# Results are dicts, never exceptions:
+#   {"ok", "text", "truncated", "locations", "error", "detail", "format", "elapsed_ms"}
+# where error is one of: decrypt_failed, extract_failed, memory_limit,
+# timeout, worker_crashed.
+
+DEFAULT_TIMEOUT_SECONDS = 30
+
+EXTRACT_TIMEOUTS = {
+    ".pdf": 300,                                # includes scanned-page OCR
+    ".docx": 60,
+    ".pptx": 60,
+    **{ext: 120 for ext in XLSX_EXTENSIONS},
+    **{ext: 180 for ext in IMAGE_EXTENSIONS},   # OCR
+    **{ext: 30 for ext in HTML_EXTENSIONS},
+    **{ext: 30 for ext in TEXT_EXTENSIONS},
+}
+
+_lock = threading.Lock()
+_executor = None
+# At most one job per worker is handed to the pool, so a job is running by
+# the time its timeout starts counting (callers queue here instead)
+_slots = threading.BoundedSemaphore(max(1, EXTRACT_WORKERS))
+# Pools recycled because a worker went over EXTRACT_MEMORY_LIMIT_MB
+_memory_recycled = weakref.WeakSet()
+
+RSS_POLL_SECONDS = 0.5
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+
+def timeout_for(filename: str) -> float:
+    return EXTRACT_TIMEOUTS.get(file_extension(filename), DEFAULT_TIMEOUT_SECONDS)
+
+
+def _result(ok, fmt, started, text="", truncated=False, locations=None, error=None, detail=None):
+    return {
+        "ok": ok,
+        "text": text,
+        "truncated": truncated,
+        "locations": locations or [],
+        "error": error,
+        "detail": detail,
+        "format": fmt,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+# -------------------------------------------------------
+# Worker process side
+# -------------------------------------------------------
+
+def _init_worker(address_space_limit_mb: int):
+    if address_space_limit_mb <= 0:
+        return
+    try:
+        import resource
+        limit = address_space_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        pass  # not available on this platform
+
+
+class _DecryptError(Exception):
+    pass
+
+
+def _decrypted(pieces):
+    # Tell decrypt failures apart from extractor failures further down
+    try:
+        yield from pieces
+    except MemoryError:
+        raise
+    except Exception as e:
+        raise _DecryptError(str(e)) from e
+
+
+def _plaintext(abs_path=None, raw_bytes: bytes = None, file: dict = None):
+    if raw_bytes is not None:
+        return [raw_bytes]
+    if file is not None:
+        from services.chunk_store import iter_plaintext
+        return _decrypted(iter_plaintext(file))
+    from encryption.crypto_engine import decrypt_file
+    return _decrypted(decrypt_file(abs_path))
+
+
+def _extract_task(filename: str, abs_path=None, raw_bytes: bytes = None, max_chars: int = None,
+                  file: dict = None):
+    """
+    Runs inside a worker. Decrypts there too when given a path or a files
+    row, so only the extracted text (at most max_chars of it) crosses the
+    process boundary; text formats stop decrypting once max_chars is reached.
+    """
+    started = time.perf_counter()
+    fmt = file_extension(filename)
+
+    try:
+        pieces = _plaintext(abs_path, raw_bytes, file)
+        collected = collect_text(iter_segments_from_pieces(filename, pieces), max_chars)
+    except _DecryptError as e:
+        return _result(False, fmt, started, error="decrypt_failed", detail=str(e))
+    except MemoryError:
+        return _result(False, fmt, started, error="memory_limit",
+                       detail=f"exceeded {EXTRACT_ADDRESS_SPACE_LIMIT_MB} MB of address space")
+    except Exception as e:
+        return _result(False, fmt, started, error="extract_failed",
+                       detail=f"{e.__class__.__name__}: {e}")
+
+    return _result(True, fmt, started, text=collected["text"],
+                   truncated=collected["truncated"], locations=collected["locations"])
+
+
+# -------------------------------------------------------
+# Pool management
+# -------------------------------------------------------
+
+def _new_executor():
+    return ProcessPoolExecutor(
+        max_workers=EXTRACT_WORKERS,
+        # spawn: the API process is multi-threaded, fork would copy held locks
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(EXTRACT_ADDRESS_SPACE_LIMIT_MB,),
+        max_tasks_per_child=EXTRACT_MAX_TASKS_PER_CHILD,
+    )
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = _new_executor()
+        return _executor
+
+
+def _recycle(broken):
+    """
+    Replace `broken` with a fresh pool and kill its workers. Jobs still
+    running in it fail with BrokenProcessPool and are resubmitted by their
+    callers. No-op if another thread already recycled it.
+    """
+    global _executor
+    with _lock:
+        if _executor is not broken:
+            return
+        _executor = _new_executor()
+
+    processes = list((getattr(broken, "_processes", None) or {}).values())
+    broken.shutdown(wait=False, cancel_futures=True)
+    for p in processes:
+        if p.is_alive():
+            p.kill()
+
+
+def _rss_mb(pid: int) -> float:
+    """Resident memory of a process in MB; 0 where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return 0
+    return pages * _PAGE_SIZE / (1024 * 1024)
+
+
+def _worker_over_memory(executor):
+    """(pid, MB) of a worker of `executor` over EXTRACT_MEMORY_LIMIT_MB, or None."""
+    for p in list((getattr(executor, "_processes", None) or {}).values()):
+        rss = _rss_mb(p.pid)
+        if rss > EXTRACT_MEMORY_LIMIT_MB:
+            return p.pid, rss
+    return None
+
+
+def _wait(future, executor, timeout: float):
+    """
+    future.result(timeout), checking worker RSS every RSS_POLL_SECONDS and
+    recycling the pool (the future then fails with BrokenProcessPool) when
+    a worker is over the cap.
+    """
+    if EXTRACT_MEMORY_LIMIT_MB <= 0:
+        return future.result(timeout=timeout)
+
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise FutureTimeout()
+        try:
+            return future.result(timeout=min(RSS_POLL_SECONDS, remaining))
+        except FutureTimeout:
+            pass
+        over = _worker_over_memory(executor)
+        if over:
+            logger.error(f"Extraction worker {over[0]} at {over[1]:.0f} MB RSS "
+                         f"(limit {EXTRACT_MEMORY_LIMIT_MB} MB); recycling pool")
+            _memory_recycled.add(executor)
+            _recycle(executor)
+
+
+def shutdown_extraction_pool():
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# -------------------------------------------------------
+# Public API
+# -------------------------------------------------------
+
+def _run(filename: str, abs_path=None, raw_bytes: bytes = None, max_chars: int = None,
+         timeout: float = None, file: dict = None):
+    started = time.perf_counter()
+    fmt = file_extension(filename)
+    timeout = timeout or timeout_for(filename)
+
+    if EXTRACT_WORKERS <= 0:
+        return _extract_task(filename, abs_path, raw_bytes, max_chars, file)
+
+    # One resubmit when the pool was recycled under us by someone else's timeout
+    for attempt in range(2):
+        with _slots:
+            executor = _get_executor()
+            try:
+                future = executor.submit(_extract_task, filename, abs_path, raw_bytes, max_chars, file)
+                return _wait(future, executor, timeout)
+            except FutureTimeout:
+                if future.cancel():
+                    # Never reached a worker (e.g. a replacement still
+                    # spawning): nothing is stuck, so leave the pool alone
+                    logger.error(f"Extraction of {filename} not started within {timeout}s")
+                else:
+                    logger.error(f"Extraction timed out after {timeout}s for {filename}; recycling pool")
+                    _recycle(executor)
+                return _result(False, fmt, started, error="timeout", detail=f"{timeout}s")
+            except (BrokenProcessPool, RuntimeError) as e:
+                # RuntimeError: submit() on a pool that was just shut down
+                _recycle(executor)
+                if attempt == 0:
+                    continue
+                if executor in _memory_recycled:
+                    logger.error(f"Extraction of {filename} went over {EXTRACT_MEMORY_LIMIT_MB} MB RSS")
+                    return _result(False, fmt, started, error="memory_limit",
+                                   detail=f"exceeded {EXTRACT_MEMORY_LIMIT_MB} MB")
+                logger.error(f"Extraction worker crashed for {filename}: {e}")
+                return _result(False, fmt, started, error="worker_crashed", detail=str(e))
+
+
+def extract_file(filename: str, abs_path, max_chars: int = None, timeout: float = None) -> dict:
+    """Decrypt + extract an encrypted blob in a worker process."""
+    return _run(filename, abs_path=str(abs_path), max_chars=max_chars, timeout=timeout)
+
+
+def extract_bytes(filename: str, raw_bytes: bytes, max_chars: int = None,
+                  timeout: float = None) -> dict:
+    """Extract already-decrypted bytes in a worker process."""
+    return _run(filename, raw_bytes=raw_bytes, max_chars=max_chars, timeout=timeout)
+
+
+def extract_stored(file: dict, max_chars: int = None, timeout: float = None) -> dict:
+    """
+    Extract a stored version (files row), whole blob or chunk manifest; the
+    worker reads and decrypts it.
+    """
+    return _run(file["name"], max_chars=max_chars, timeout=timeout, file=file)
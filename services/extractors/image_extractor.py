@@ -1,12 +1,89 @@
-import easyocr
+import threading
+
 import numpy as np
 import cv2
 
-# Initialize reader once to save resources
-_reader = easyocr.Reader(["en"])
+# Detection cost grows with pixel count; text stays legible well below this
+OCR_MAX_SIDE = 2000
+OCR_BATCH_SIZE = 8
 
-def extract_text_from_image(raw_bytes: bytes) -> str:
-    np_img = np.frombuffer(raw_bytes, np.uint8)
+# Initialize reader once per process, on first use (loading the detection and
+# recognition models takes seconds and hundreds of MB). Separate locks: one
+# guards lazy init, the other serialises inference on the shared reader.
+_reader = None
+_init_lock = threading.Lock()
+_reader_lock = threading.Lock()
+
+
+def get_reader():
+    global _reader
+    if _reader is None:
+        with _init_lock:
+            if _reader is None:
+                import easyocr
+                _reader = easyocr.Reader(["en"])
+    return _reader
+
+
+def _decode(image):
+    if isinstance(image, np.ndarray):
+        return image
+    np_img = np.frombuffer(image, np.uint8)
     img = cv2.imdecode(np_img, cv2.IMREAD_COLOR)
-    results = _reader.readtext(img, detail=0)
+    if img is None:
+        raise ValueError("Unreadable image")
+    return img
+
+
+def prepare_image(image, max_side: int = OCR_MAX_SIDE):
+    """Decode (bytes or BGR array) and downscale so the longest side <= max_side."""
+    img = _decode(image)
+    h, w = img.shape[:2]
+    scale = max_side / max(h, w)
+    if scale < 1:
+        img = cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    return img
+
+
+def _pad_to(img, height, width):
+    # readtext_batched needs equal shapes; pad with white instead of stretching
+    h, w = img.shape[:2]
+    if (h, w) == (height, width):
+        return img
+    canvas = np.full((height, width, 3), 255, dtype=img.dtype)
+    canvas[:h, :w] = img
+    return canvas
+
+
+def extract_text_from_image(raw_bytes: bytes) -> str:
+    img = prepare_image(raw_bytes)
+    reader = get_reader()
+    with _reader_lock:
+        results = reader.readtext(img, detail=0, batch_size=OCR_BATCH_SIZE)
     return "\n".join(results)
+
+
+def extract_text_from_images(images, batch_size: int = OCR_BATCH_SIZE):
+    """
+    OCR many images (bytes or BGR arrays) with batched detection and
+    recognition. Returns one text per input image, in order.
+    """
+    prepared = [prepare_image(img) for img in images]
+    reader = get_reader()
+    texts = [""] * len(prepared)
+
+    # Sort by size so each batch pads as little as possible
+    order = sorted(range(len(prepared)), key=lambda i: prepared[i].shape[:2])
+
+    for begin in range(0, len(order), batch_size):
+        batch = order[begin:begin + batch_size]
+        height = max(prepared[i].shape[0] for i in batch)
+        width = max(prepared[i].shape[1] for i in batch)
+        padded = [_pad_to(prepared[i], height, width) for i in batch]
+
+        with _reader_lock:
+            results = reader.readtext_batched(padded, detail=0, batch_size=batch_size)
+        for i, lines in zip(batch, results):
+            texts[i] = "\n".join(lines)
+
+    return texts
@@ -1,22 +1,26 @@
 # services/file_service.py
 
-import sqlite3
+import base64
+import json
 from datetime import datetime
 from fastapi import HTTPException, UploadFile
 
-from core.config import STORAGE_DIR, DB_PATH
+from core.config import STORAGE_DIR, FILES_PAGE_DEFAULT, FILES_PAGE_MAX
+from core.concurrency import run_upload_work
+from core.database import get_connection, transaction
 from core.logger import logger
 
-from encryption.crypto_engine import encrypt_bytes, decrypt_bytes
-
 from services.validation_service import validate_upload
 from services.file_service_db import (
     insert_file_metadata,
     get_file_by_id,
     delete_file_metadata,
     get_all_files,
-    get_project_files_latest,
     get_file_versions,
+    query_files,
+    count_files,
+    FILE_FIELDS,
+    SORT_KEYS,
 )
 from services.project_db import get_project_by_id
 from services.project_service import (
@@ -29,76 +33,129 @@ from services.file_version_service import (
 )
 
 from services.audit_service import log_event
-from services.indexing_service import index_file_content
+from services.range_service import build_download_response, build_source_response
+from services.job_queue import enqueue_index_job, enqueue_job, PRIORITY_BACKFILL
+from services.blob_store import (
+    stage_blob,
+    commit_blob,
+    discard_staged,
+    link_blob,
+    release_unreferenced,
+)
+from services.chunk_store import ManifestSource, release_unreferenced_chunks
+from services.embedding_service import discard_embedding
+from services.text_cache import discard_file_text
+from encryption.compression import compression_for
 
 
 # -------------------------------------------------------
 # Shared helpers
 # -------------------------------------------------------
 
-def _mark_old_versions_not_latest(project_id: int, filename: str) -> None:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE files SET is_latest = 0 WHERE project_id = ? AND name = ?",
-        (project_id, filename),
-    )
-    conn.commit()
-    conn.close()
+def _upload_size(file: UploadFile) -> int:
+    """
+    Size of a spooled upload without reading it into memory.
+    """
+    src = file.file
+    src.seek(0, 2)
+    size = src.tell()
+    src.seek(0)
+    return size
+
+
+ARCHIVE_LATEST_PATH_SQL = "UPDATE files SET path = ? WHERE project_id = ? AND name = ? AND is_latest = 1"
+MARK_NOT_LATEST_SQL = "UPDATE files SET is_latest = 0 WHERE project_id = ? AND name = ? AND is_latest = 1"
+
+
+def _mark_old_versions_not_latest(project_id: int, filename: str, archived_path: str = None) -> None:
+    """
+    Flip the current latest row to is_latest = 0. When its blob was moved
+    into Version Control, `archived_path` repoints the row at the new location.
+    """
+    conn = get_connection()
+    if archived_path is not None:
+        conn.execute(ARCHIVE_LATEST_PATH_SQL, (archived_path, project_id, filename))
+    conn.execute(MARK_NOT_LATEST_SQL, (project_id, filename))
 
 
 # -------------------------------------------------------
 # Upload handler (root)
 # -------------------------------------------------------
+#
+# Hashing, encryption, the blob move and the sqlite write all block, so the
+# async handlers only hand the spooled upload to a bounded worker thread
+# (core/concurrency.py) and the event loop stays free for other requests.
 
 async def handle_upload(file: UploadFile):
+    return await run_upload_work(_store_upload, file)
+
+
+def _store_upload(file: UploadFile):
     filename = file.filename
-    raw_bytes = await file.read()
 
-    validate_upload(filename, raw_bytes)
+    validate_upload(filename, _upload_size(file))
 
     file_path = STORAGE_DIR / filename
 
     if file_path.exists():
         raise HTTPException(status_code=409, detail="File already exists")
 
-    # Encrypt
+    # Hash + compress/encrypt (streamed chunk by chunk); known content is not re-encrypted
     try:
-        encrypted_bytes = encrypt_bytes(raw_bytes)
+        staged = stage_blob(file.file, compression_for(filename))
     except Exception:
-        raise HTTPException(status_code=500, detail="Encryption failed")
+        raise HTTPException(status_code=500, detail="Failed to encrypt & save file")
 
-    # Save
-    try:
-        file_path.parent.mkdir(parents=True, exist_ok=True)
-        file_path.write_bytes(encrypted_bytes)
-    except Exception:
-        raise HTTPException(status_code=500, detail="Failed to save file")
+    return _commit_upload(filename, staged)
 
+
+def _commit_upload(filename: str, staged: dict):
+    """
+    Store a staged blob as root file `filename` (version 1). On failure the
+    staged blob is discarded. Shared with resumable upload sessions.
+    """
+    file_path = STORAGE_DIR / filename
     now = datetime.utcnow().isoformat()
-    size = len(encrypted_bytes)
-
-    # Insert metadata
-    file_id = insert_file_metadata(
-        name=filename,
-        path=filename,
-        size=size,
-        created_at=now,
-        modified_at=now,
-        project_id=None,
-        version=1,
-        is_latest=1,
-    )
 
-    # INDEXING
+    # Place the blob, link it into storage, insert metadata + queue indexing
+    # (decrypt/extract/embed run in the background)
+    placed = False
     try:
-        index_file_content(file_id)
+        with transaction():
+            size = commit_blob(staged)
+            link_blob(staged["hash"], file_path)
+            placed = True
+
+            file_id = insert_file_metadata(
+                name=filename,
+                path=filename,
+                size=size,
+                created_at=now,
+                modified_at=now,
+                project_id=None,
+                version=1,
+                is_latest=1,
+                blob_hash=staged["hash"],
+                plain_size=staged["plain_size"],
+                compression=staged["codec"],
+            )
+            job_id = enqueue_index_job(file_id)
     except Exception as e:
-        logger.error(f"Indexing failed for root upload {filename}: {e}")
+        if placed and file_path.exists():
+            file_path.unlink()
+        discard_staged(staged)
+        release_unreferenced([staged["hash"]])
+        logger.error(f"Root upload failed for {filename}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to encrypt & save file")
 
     log_event("UPLOAD_ROOT", project_id=None, file=filename, version=1)
 
-    return {"message": "File encrypted & uploaded", "version": 1, "file_id": file_id}
+    return {
+        "message": "File encrypted & uploaded",
+        "version": 1,
+        "file_id": file_id,
+        "index_job_id": job_id,
+    }
 
 
 # -------------------------------------------------------
@@ -106,16 +163,35 @@ async def handle_upload(file: UploadFile):
 # -------------------------------------------------------
 
 async def handle_upload_to_project(project_id: int, file: UploadFile):
+    return await run_upload_work(_store_upload_to_project, project_id, file)
+
+
+def _store_upload_to_project(project_id: int, file: UploadFile):
     filename = file.filename
-    raw_bytes = await file.read()
 
-    validate_upload(filename, raw_bytes)
+    validate_upload(filename, _upload_size(file))
 
     # Check project
     project = get_project_by_id(project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
 
+    # Hash + encrypt into the blob store's staging area first; nothing is
+    # visible until the version is committed. Identical content is shared.
+    try:
+        staged = stage_blob(file.file, compression_for(filename))
+    except Exception:
+        raise HTTPException(status_code=500, detail="Failed to encrypt & save file")
+
+    return _commit_upload_to_project(project, filename, staged)
+
+
+def _commit_upload_to_project(project: dict, filename: str, staged: dict):
+    """
+    Store a staged blob as the next version of `filename` in `project`. On
+    failure the staged blob is discarded. Shared with upload sessions.
+    """
+    project_id = project["id"]
     project_name = project["name"]
     project_folder = get_project_folder(project_name)
     vc_folder = get_version_control_folder(project_name)
@@ -123,54 +199,66 @@ async def handle_upload_to_project(project_id: int, file: UploadFile):
     project_folder.mkdir(parents=True, exist_ok=True)
     vc_folder.mkdir(parents=True, exist_ok=True)
 
-    next_version = get_next_version(project_id, filename)
-
-    # Move old version
-    existing_path = project_folder / filename
-    if existing_path.exists() and next_version > 1:
-        prev_version = next_version - 1
-        versioned_path = vc_folder / get_versioned_filename(filename, prev_version)
-        try:
-            versioned_path.parent.mkdir(parents=True, exist_ok=True)
-            existing_path.replace(versioned_path)
-        except Exception:
-            raise HTTPException(status_code=500, detail="Failed to move old version")
-
-    # Encrypt
-    try:
-        encrypted_bytes = encrypt_bytes(raw_bytes)
-    except Exception:
-        raise HTTPException(status_code=500, detail="Encryption failed")
-
-    # Save new version
     new_file_path = project_folder / filename
-    try:
-        new_file_path.write_bytes(encrypted_bytes)
-    except Exception:
-        raise HTTPException(status_code=500, detail="Failed to save file")
-
     now = datetime.utcnow().isoformat()
-    size = len(encrypted_bytes)
-
-    _mark_old_versions_not_latest(project_id, filename)
-
-    # Insert new version row
-    file_id = insert_file_metadata(
-        name=filename,
-        path=f"{project_name}/{filename}",
-        size=size,
-        created_at=now,
-        modified_at=now,
-        project_id=project_id,
-        version=next_version,
-        is_latest=1,
-    )
 
-    # INDEXING
+    # Allocate the version, archive the previous blob and insert the new row
+    # under one write lock, so concurrent uploads of the same file serialise
+    # here and always receive distinct, increasing versions.
+    archived = None
+    placed = False
     try:
-        index_file_content(file_id)
+        with transaction():
+            next_version = get_next_version(project_id, filename)
+
+            archived_path = None
+            if new_file_path.exists() and next_version > 1:
+                versioned_name = get_versioned_filename(filename, next_version - 1)
+                archived = (new_file_path, vc_folder / versioned_name)
+                new_file_path.replace(archived[1])
+                archived_path = f"{project_name}/Version Control/{versioned_name}"
+
+            size = commit_blob(staged)
+            link_blob(staged["hash"], new_file_path)
+            placed = True
+
+            previous = get_connection().execute(
+                "SELECT id FROM files WHERE project_id = ? AND name = ? AND is_latest = 1",
+                (project_id, filename),
+            ).fetchone()
+            _mark_old_versions_not_latest(project_id, filename, archived_path)
+
+            # Insert new version row
+            file_id = insert_file_metadata(
+                name=filename,
+                path=f"{project_name}/{filename}",
+                size=size,
+                created_at=now,
+                modified_at=now,
+                project_id=project_id,
+                version=next_version,
+                is_latest=1,
+                blob_hash=staged["hash"],
+                plain_size=staged["plain_size"],
+                compression=staged["codec"],
+            )
+
+            # Indexing runs in the background; the job commits with the version
+            job_id = enqueue_index_job(file_id)
+
+            # The superseded version is re-stored as chunks shared with its siblings
+            if previous:
+                enqueue_job(previous[0], "compact_version", PRIORITY_BACKFILL)
     except Exception as e:
-        logger.error(f"Indexing failed for {filename} (project={project_name}): {e}")
+        # Roll the disk back to match the rolled-back rows
+        if archived and archived[1].exists():
+            archived[1].replace(archived[0])
+        elif placed and new_file_path.exists():
+            new_file_path.unlink()
+        discard_staged(staged)
+        release_unreferenced([staged["hash"]])
+        logger.error(f"Versioned upload failed for {filename} (project={project_name}): {e}")
+        raise HTTPException(status_code=500, detail="Failed to store new version")
 
     log_event(
         "UPLOAD_VERSION",
@@ -179,51 +267,70 @@ async def handle_upload_to_project(project_id: int, file: UploadFile):
         version=next_version,
     )
 
-    return {"message": f"Uploaded version v{next_version}", "version": next_version, "file_id": file_id}
+    return {
+        "message": f"Uploaded version v{next_version}",
+        "version": next_version,
+        "file_id": file_id,
+        "index_job_id": job_id,
+    }
 
 
 # -------------------------------------------------------
 # Download handlers
 # -------------------------------------------------------
 
-def handle_download(file_id: int):
+def _is_follow_up_range(range_header) -> bool:
+    # Players fetch many ranges per view; audit only the request that starts the file
+    return bool(range_header) and not range_header.replace(" ", "").startswith("bytes=0-")
+
+
+def handle_download(file_id: int, range_header=None, if_range=None):
     file = get_file_by_id(file_id)
     if not file:
         raise HTTPException(status_code=404, detail="File not found")
 
+    if file["storage"] == "chunks":
+        return download_specific_version(file_id, range_header, if_range)
+
     abs_path = STORAGE_DIR / file["path"]
 
     if not abs_path.exists():
         delete_file_metadata(file_id)
+        release_unreferenced([file.get("blob_hash")])
         raise HTTPException(status_code=404, detail="File missing — metadata cleaned")
 
-    encrypted = abs_path.read_bytes()
-    decrypted = decrypt_bytes(encrypted)
+    if not _is_follow_up_range(range_header):
+        log_event("DOWNLOAD", project_id=file.get("project_id"), file=file["name"])
 
-    log_event("DOWNLOAD", project_id=file.get("project_id"), file=file["name"])
+    # Plaintext is produced lazily (only the requested chunks) as the response is sent
+    return build_download_response(file, abs_path, range_header, if_range)
 
-    return file["name"], decrypted
 
-
-def download_specific_version(file_id: int):
+def download_specific_version(file_id: int, range_header=None, if_range=None):
     file = get_file_by_id(file_id)
     if not file:
         raise HTTPException(status_code=404, detail="Version not found")
 
-    abs_path = STORAGE_DIR / file["path"]
-    if not abs_path.exists():
-        raise HTTPException(status_code=404, detail="File missing on disk")
+    # Compacted versions are reassembled from their chunk manifest as they stream
+    if file["storage"] == "chunks":
+        source = ManifestSource(file)
+    else:
+        abs_path = STORAGE_DIR / file["path"]
+        if not abs_path.exists():
+            raise HTTPException(status_code=404, detail="File missing on disk")
+        source = None
 
-    decrypted = decrypt_bytes(abs_path.read_bytes())
+    if not _is_follow_up_range(range_header):
+        log_event(
+            "DOWNLOAD_VERSION",
+            project_id=file.get("project_id"),
+            file=file["name"],
+            version=file["version"],
+        )
 
-    log_event(
-        "DOWNLOAD_VERSION",
-        project_id=file.get("project_id"),
-        file=file["name"],
-        version=file["version"],
-    )
-
-    return file["name"], decrypted
+    if source is not None:
+        return build_source_response(file, source, range_header, if_range)
+    return build_download_response(file, abs_path, range_header, if_range)
 
 
 # -------------------------------------------------------
@@ -237,13 +344,19 @@ def handle_delete(file_id: int):
 
     abs_path = STORAGE_DIR / file["path"]
 
-    if abs_path.exists():
+    if file["storage"] != "chunks" and abs_path.exists():
         try:
             abs_path.unlink()
         except:
             raise HTTPException(status_code=500, detail="Failed to delete file")
 
+    discard_embedding(file_id)
+    discard_file_text(file_id)
     delete_file_metadata(file_id)
+    # The blob itself goes once no other version / project references it
+    release_unreferenced([file.get("blob_hash")])
+    if file["storage"] == "chunks":
+        release_unreferenced_chunks(blocking=False)
 
     log_event(
         "DELETE_FILE",
@@ -255,12 +368,81 @@ def handle_delete(file_id: int):
     return {"message": "File deleted"}
 
 
+# -------------------------------------------------------
+# Listing (keyset pagination)
+# -------------------------------------------------------
+#
+# Pages are ordered by (sort key, id) and the cursor is the last row's pair,
+# so fetching page N doesn't read the N-1 pages before it and rows inserted
+# meanwhile don't shift the pages. The cursor also records the sort it
+# belongs to; it is opaque to clients.
+
+def _encode_cursor(sort: str, order: str, row: dict) -> str:
+    raw = json.dumps([sort, order, row[sort], row["id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str, sort: str, order: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, cursor_order, value, last_id = json.loads(raw)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if (cursor_sort, cursor_order) != (sort, order):
+        raise HTTPException(status_code=400, detail="Cursor belongs to a different sort order")
+    return value, last_id
+
+
+def _parse_fields(fields: str):
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in FILE_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {unknown}; choose from {FILE_FIELDS}")
+    return requested
+
+
+def list_files_page(project_id: int = None, latest_only: bool = False, sort: str = "id",
+                    order: str = "asc", fields: str = None, limit: int = FILES_PAGE_DEFAULT,
+                    cursor: str = None):
+    """
+    One page of file rows and the cursor of the next page (None on the last
+    page). `fields` is a comma separated projection of FILE_FIELDS.
+    """
+    if sort not in SORT_KEYS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {list(SORT_KEYS)}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be asc or desc")
+    if not 1 <= limit <= FILES_PAGE_MAX:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {FILES_PAGE_MAX}")
+
+    requested = _parse_fields(fields)
+    after = _decode_cursor(cursor, sort, order) if cursor else None
+
+    # One extra row tells whether another page follows
+    rows = query_files(project_id, latest_only, sort, order == "desc", after, limit + 1, requested)
+    next_cursor = _encode_cursor(sort, order, rows[limit - 1]) if len(rows) > limit else None
+    rows = rows[:limit]
+
+    if requested is not None:
+        rows = [{f: row[f] for f in requested} for row in rows]
+    return rows, next_cursor
+
+
+def count_files_matching(project_id: int = None, latest_only: bool = False):
+    return {"count": count_files(project_id, latest_only)}
+
+
 # -------------------------------------------------------
 # Version history
 # -------------------------------------------------------
 
-def list_files_in_project(project_id: int):
-    return get_project_files_latest(project_id)
+def list_files_in_project(project_id: int, latest_only: bool = True, sort: str = "name",
+                          order: str = "asc", fields: str = None,
+                          limit: int = FILES_PAGE_DEFAULT, cursor: str = None):
+    """Files of a project (latest versions by default), paginated like /files."""
+    return list_files_page(project_id, latest_only, sort, order, fields, limit, cursor)
 
 
 def get_version_history(project_id: int, filename: str):
@@ -1,16 +1,40 @@
-import sqlite3
-from core.config import DB_PATH
+from core.database import get_connection
+
+FILE_COLUMNS = """
+    id, name, path, size, created_at, modified_at,
+    project_id, version, is_latest, blob_hash, storage,
+    plain_size, compression, content_hash
+"""
+
+
+def _row_to_file(r):
+    return {
+        "id": r[0],
+        "name": r[1],
+        "path": r[2],
+        "size": r[3],
+        "created_at": r[4],
+        "modified_at": r[5],
+        "project_id": r[6],
+        "version": r[7],
+        "is_latest": r[8],
+        "blob_hash": r[9],
+        "storage": r[10],
+        "plain_size": r[11],
+        "compression": r[12],
+        "content_hash": r[13],
+    }
 
 
 def insert_file_metadata(name, path, size, created_at, modified_at,
-                         project_id, version, is_latest):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute("""
-        INSERT INTO files 
-        (name, path, size, created_at, modified_at, project_id, version, is_latest)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                         project_id, version, is_latest, blob_hash=None,
+                         plain_size=None, compression=None, content_hash=None):
+    conn = get_connection()
+    cur = conn.execute("""
+        INSERT INTO files
+        (name, path, size, created_at, modified_at, project_id, version, is_latest, blob_hash,
+         plain_size, compression, content_hash)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     """, (
         name,
         path,
@@ -19,136 +43,153 @@ def insert_file_metadata(name, path, size, created_at, modified_at,
         modified_at,
         project_id,
         version,
-        is_latest
+        is_latest,
+        blob_hash,
+        plain_size,
+        compression,
+        content_hash if content_hash is not None else blob_hash
     ))
 
-    conn.commit()
-    conn.close()
+    return cur.lastrowid
 
 
 def delete_file_metadata(file_id):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("DELETE FROM files WHERE id = ?", (file_id,))
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+    conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
 
 
 def get_file_by_id(file_id):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute("""
-        SELECT id, name, path, size, created_at, modified_at,
-               project_id, version, is_latest
+    conn = get_connection()
+    row = conn.execute(f"""
+        SELECT {FILE_COLUMNS}
         FROM files WHERE id = ?
-    """, (file_id,))
-
-    row = cur.fetchone()
-    conn.close()
+    """, (file_id,)).fetchone()
 
     if not row:
         return None
-    
-    return {
-        "id": row[0],
-        "name": row[1],
-        "path": row[2],
-        "size": row[3],
-        "created_at": row[4],
-        "modified_at": row[5],
-        "project_id": row[6],
-        "version": row[7],
-        "is_latest": row[8],
-    }
 
+    return _row_to_file(row)
 
-def get_all_files():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
 
-    cur.execute("""
-        SELECT id, name, path, size, created_at, modified_at,
-               project_id, version, is_latest
+def get_all_files():
+    conn = get_connection()
+    rows = conn.execute(f"""
+        SELECT {FILE_COLUMNS}
         FROM files
-    """)
-
-    rows = cur.fetchall()
-    conn.close()
-
-    files = []
-    for r in rows:
-        files.append({
-            "id": r[0],
-            "name": r[1],
-            "path": r[2],
-            "size": r[3],
-            "created_at": r[4],
-            "modified_at": r[5],
-            "project_id": r[6],
-            "version": r[7],
-            "is_latest": r[8],
-        })
-
-    return files
+    """).fetchall()
+
+    return [_row_to_file(r) for r in rows]
+
+
+# Hot-path statements are module constants so core/schema.py can check
+# their query plans (audit_query_plans)
+PROJECT_FILES_LATEST_SQL = f"""
+    SELECT {FILE_COLUMNS}
+    FROM files
+    WHERE project_id = ? AND is_latest = 1
+    ORDER BY name
+"""
+
+FILE_VERSIONS_SQL = f"""
+    SELECT {FILE_COLUMNS}
+    FROM files
+    WHERE project_id = ? AND name = ?
+    ORDER BY version DESC
+"""
+
+MAX_VERSION_SQL = """
+    SELECT MAX(version)
+    FROM files
+    WHERE project_id = ? AND name = ?
+"""
+
 
 def get_project_files_latest(project_id):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+    conn = get_connection()
+    rows = conn.execute(PROJECT_FILES_LATEST_SQL, (project_id,)).fetchall()
 
-    cur.execute("""
-        SELECT id, name, path, size, created_at, modified_at,
-               project_id, version, is_latest
-        FROM files
-        WHERE project_id = ? AND is_latest = 1
-        ORDER BY name
-    """, (project_id,))
-
-    rows = cur.fetchall()
-    conn.close()
-
-    return [
-        {
-            "id": r[0],
-            "name": r[1],
-            "path": r[2],
-            "size": r[3],
-            "created_at": r[4],
-            "modified_at": r[5],
-            "project_id": r[6],
-            "version": r[7],
-            "is_latest": r[8],
-        }
-        for r in rows
-    ]
+    return [_row_to_file(r) for r in rows]
 
 
 def get_file_versions(project_id, filename):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+    conn = get_connection()
+    rows = conn.execute(FILE_VERSIONS_SQL, (project_id, filename)).fetchall()
+
+    return [_row_to_file(r) for r in rows]
+
+
+def get_max_version(project_id, filename):
+    """
+    Highest version stored for (project_id, filename), or 0 if none.
+    Served by idx_files_project_name_version.
+    """
+    conn = get_connection()
+    row = conn.execute(MAX_VERSION_SQL, (project_id, filename)).fetchone()
+
+    return row[0] or 0
+
+
+# -------------------------------------------------------
+# Keyset-paginated listing
+# -------------------------------------------------------
+
+FILE_FIELDS = [c.strip() for c in FILE_COLUMNS.split(",")]
+SORT_KEYS = ("id", "name", "modified_at", "size")
+
+
+def _listing_filter(project_id, latest_only: bool):
+    clauses, params = [], []
+    if project_id is not None:
+        clauses.append("project_id = ?")
+        params.append(project_id)
+    if latest_only:
+        clauses.append("is_latest = 1")
+    return clauses, params
+
+
+def listing_query(project_id=None, latest_only=False, sort="id", descending=False,
+                  after=None, limit=100, fields=None):
+    """(columns, sql, params) of one query_files page."""
+    columns = list(dict.fromkeys(["id", sort, *(fields or FILE_FIELDS)]))
+    clauses, params = _listing_filter(project_id, latest_only)
+
+    direction, compare = ("DESC", "<") if descending else ("ASC", ">")
+    if after is not None:
+        if sort == "id":
+            clauses.append(f"id {compare} ?")
+            params.append(after[1])
+        else:
+            clauses.append(f"({sort}, id) {compare} (?, ?)")
+            params.extend(after)
 
-    cur.execute("""
-        SELECT id, name, path, size, created_at, modified_at,
-               project_id, version, is_latest
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    order = "id" if sort == "id" else f"{sort} {direction}, id"
+    sql = f"""
+        SELECT {', '.join(columns)}
         FROM files
-        WHERE project_id = ? AND name = ?
-        ORDER BY version DESC
-    """, (project_id, filename))
-
-    rows = cur.fetchall()
-    conn.close()
-
-    return [
-        {
-            "id": r[0],
-            "name": r[1],
-            "path": r[2],
-            "size": r[3],
-            "created_at": r[4],
-            "modified_at": r[5],
-            "project_id": r[6],
-            "version": r[7],
-            "is_latest": r[8],
-        }
-        for r in rows
-    ]
+        {where}
+        ORDER BY {order} {direction}
+        LIMIT ?
+    """
+    return columns, sql, (*params, limit)
+
+
+def query_files(project_id=None, latest_only=False, sort="id", descending=False,
+                after=None, limit=100, fields=None):
+    """
+    One page of files rows ordered by (sort, id), starting after the
+    (sort value, id) pair `after`. Each (project_id, is_latest, sort) combo
+    is served by an index (schema v2 / v13), so a page costs the same at
+    any depth. `fields` limits the columns read; rows are returned as
+    dicts of those fields plus the sort key and id the next cursor needs.
+    """
+    columns, sql, params = listing_query(project_id, latest_only, sort, descending, after, limit, fields)
+    rows = get_connection().execute(sql, params).fetchall()
+
+    return [dict(zip(columns, r)) for r in rows]
+
+
+def count_files(project_id=None, latest_only=False) -> int:
+    clauses, params = _listing_filter(project_id, latest_only)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return get_connection().execute(f"SELECT COUNT(*) FROM files {where}", params).fetchone()[0]
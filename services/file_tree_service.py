@@ -1,18 +1,25 @@
-from services.file_service_db import get_project_files_latest
+from core.config import FILES_PAGE_DEFAULT
+from services.file_service import list_files_in_project
 from services.project_db import get_project_by_id
 
 
-def build_project_file_tree(project_id: int):
+def build_project_file_tree(project_id: int, limit: int = FILES_PAGE_DEFAULT, cursor: str = None):
     project = get_project_by_id(project_id)
     if not project:
         return None
 
-    files = get_project_files_latest(project_id)
+    files, next_cursor = list_files_in_project(
+        project_id,
+        fields="id,name,version,is_latest,size,modified_at",
+        limit=limit,
+        cursor=cursor,
+    )
 
     tree = {
         "project_id": project_id,
         "project_name": project["name"],
-        "files": []
+        "files": [],
+        "next_cursor": next_cursor,
     }
 
     for f in files:
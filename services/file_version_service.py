@@ -1,26 +1,17 @@
 # services/file_version_service.py
 
 import os
-from core.config import STORAGE_DIR
-from services.file_service_db import get_all_files
+from services.file_service_db import get_max_version
 
 
 def get_next_version(project_id: int, filename: str):
     """
     Determines the next version number based on existing files
     in the same project with the same name.
+    Call inside core.database.transaction() together with the insert,
+    so concurrent uploads of the same file cannot get the same number.
     """
-    files = get_all_files()
-
-    matching = [
-        f for f in files
-        if f["project_id"] == project_id and f["name"] == filename
-    ]
-
-    if not matching:
-        return 1  # first time this file is uploaded
-
-    return max(f["version"] for f in matching) + 1
+    return get_max_version(project_id, filename) + 1
 
 
 def get_versioned_filename(original_name: str, version: int):
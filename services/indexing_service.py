@@ -1,74 +1,114 @@
 # services/indexing_service.py
 
-import sqlite3
+import json
 from datetime import datetime
 
-from core.config import DB_PATH, STORAGE_DIR
+from core.config import STORAGE_DIR, INDEX_MAX_CHARS
+from core.database import get_connection
 from core.logger import logger
 
-from encryption.crypto_engine import decrypt_bytes
 from services.file_service_db import get_file_by_id
-from services.text_extraction_service import extract_text_from_bytes
-from services.embedding_service import upsert_embedding
+from services.extraction_pool import extract_stored
+from services.text_extraction_service import extractor_version
+from services.embedding_service import upsert_embedding, text_digest, embedding_is_current
 
 
-def index_file_content(file_id: int):
+def _index_row(file_id: int):
+    return get_connection().execute(
+        "SELECT content, content_hash, extractor_version, text_hash FROM file_index WHERE file_id = ?",
+        (file_id,),
+    ).fetchone()
+
+
+def extraction_is_current(file: dict, row) -> bool:
+    """True if the file_index row was extracted from these bytes by the current extractor."""
+    return (
+        row is not None
+        and row[2] == extractor_version(file["name"])
+        and row[1] == file["content_hash"]
+    )
+
+
+def index_file_content(file_id: int, force: bool = False):
     """
     Decrypt file → extract text → update file_index → update embedding.
-    Safe, idempotent, and robust against binary files.
+    Safe, idempotent, and robust against binary files. Decrypt + extract run
+    in a worker process (services/extraction_pool.py).
+    Steps whose inputs haven't changed (same content hash and extractor
+    version; same text and MODEL_NAME) are skipped unless force=True.
     """
     file = get_file_by_id(file_id)
     if not file:
         raise ValueError(f"File not found: id={file_id}")
 
+    row = _index_row(file_id)
+    if not force and extraction_is_current(file, row):
+        text, text_hash = row[0] or "", row[3]
+        if text_hash is not None and (not text.strip() or embedding_is_current(file_id, text_hash)):
+            return {"indexed": True, "file_id": file_id, "skipped": True,
+                    "has_text": bool(text.strip()), "length": len(text)}
+        return _embed_only(file_id, text)
+
     abs_path = STORAGE_DIR / file["path"]
-    if not abs_path.exists():
+    if file["storage"] != "chunks" and not abs_path.exists():
         raise ValueError(f"File missing on disk: {abs_path}")
 
-    try:
-        encrypted = abs_path.read_bytes()
-        raw_bytes = decrypt_bytes(encrypted)
-    except Exception as e:
-        logger.error(f"Decryption failed for file_id={file_id}: {e}")
-        return {"indexed": False, "error": "decrypt_failed"}
+    # Decrypt + extract in the extraction pool (timeouts / memory caps),
+    # reading segments only until INDEX_MAX_CHARS
+    result = extract_stored(file, max_chars=INDEX_MAX_CHARS)
+    if not result["ok"]:
+        logger.error(
+            f"Extraction failed for file_id={file_id}: {result['error']} ({result['detail']})"
+        )
+        return {
+            "indexed": False,
+            "error": result["error"],
+            "detail": result["detail"],
+            # Same bytes, same extractor: only a crash caused by a neighbour is worth retrying
+            "retryable": result["error"] == "worker_crashed",
+        }
 
-    # Extract text safely
-    text = extract_text_from_bytes(file["name"], raw_bytes) or ""
-    if not isinstance(text, str):
-        text = str(text)
+    text = result["text"]
+    truncated = result["truncated"]
+    text_hash = text_digest(text)
 
     now = datetime.utcnow().isoformat()
 
     # Insert/update file_index
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
-
-        cur.execute(
+        conn = get_connection()
+        conn.execute(
             """
-            INSERT INTO file_index (file_id, content, created_at, updated_at)
-            VALUES (?, ?, ?, ?)
+            INSERT INTO file_index
+                (file_id, content, locations, truncated, content_hash, extractor_version,
+                 text_hash, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             ON CONFLICT(file_id) DO UPDATE SET
                 content=excluded.content,
+                locations=excluded.locations,
+                truncated=excluded.truncated,
+                content_hash=excluded.content_hash,
+                extractor_version=excluded.extractor_version,
+                text_hash=excluded.text_hash,
                 updated_at=excluded.updated_at
             """,
-            (file_id, text, now, now),
+            (file_id, text, json.dumps(result["locations"]), int(truncated),
+             file["content_hash"], extractor_version(file["name"]), text_hash, now, now),
         )
-
-        conn.commit()
-        conn.close()
     except Exception as e:
         logger.error(f"DB indexing failed for file_id={file_id}: {e}")
         return {"indexed": False, "error": "db_failed"}
 
-    # Embeddings are optional but logged
-    try:
-        upsert_embedding(file_id, text)
-    except Exception as e:
-        logger.error(f"Semantic indexing failed for file_id={file_id}: {e}")
+    # Embeddings are optional but logged; unchanged text keeps its vectors
+    if force or not embedding_is_current(file_id, text_hash):
+        try:
+            upsert_embedding(file_id, text)
+        except Exception as e:
+            logger.error(f"Semantic indexing failed for file_id={file_id}: {e}")
 
     logger.info(
         f"Indexed content for file_id={file_id} | chars={len(text)} | has_text={bool(text.strip())}"
+        + (f" | truncated at {INDEX_MAX_CHARS}" if truncated else "")
     )
 
     return {
@@ -76,4 +116,16 @@ def index_file_content(file_id: int):
         "file_id": file_id,
         "has_text": bool(text.strip()),
         "length": len(text),
+        "truncated": truncated,
     }
+
+
+def _embed_only(file_id: int, text: str):
+    # Text is current; only the vectors are missing or from another model
+    try:
+        upsert_embedding(file_id, text)
+        logger.info(f"Re-embedded file_id={file_id} | chars={len(text)} (text unchanged)")
+    except Exception as e:
+        logger.error(f"Semantic indexing failed for file_id={file_id}: {e}")
+    return {"indexed": True, "file_id": file_id, "reembedded": True,
+            "has_text": bool(text.strip()), "length": len(text)}
@@ -0,0 +1,329 @@
+# services/job_queue.py
+
+import random
+import threading
+from datetime import datetime, timedelta
+
+from core.config import (
+    INDEX_WORKERS,
+    INDEX_JOB_MAX_ATTEMPTS,
+    INDEX_JOB_BACKOFF_SECONDS,
+)
+from core.database import get_connection, transaction, close_connection
+from core.logger import logger
+
+# -------------------------------------------------------
+# Persistent background job queue
+# -------------------------------------------------------
+#
+# Jobs live in the `index_jobs` table, so they survive restarts. Uploads only
+# enqueue; a small pool of worker threads claims jobs (highest priority first),
+# runs them and retries failures with exponential backoff. At most one pending
+# job exists per (file_id, kind): enqueueing again just raises its priority.
+
+PRIORITY_UPLOAD = 10
+PRIORITY_BACKFILL = 0
+
+POLL_INTERVAL_SECONDS = 2.0
+MAX_BACKOFF_SECONDS = 3600
+DONE_RETENTION_DAYS = 7
+
+JOB_COLUMNS = """
+    id, file_id, kind, priority, status, attempts, last_error,
+    next_run_at, created_at, started_at, finished_at
+"""
+
+# Next runnable job, skipping files that already have one running
+CLAIM_JOB_SQL = f"""
+    SELECT {JOB_COLUMNS}
+    FROM index_jobs j
+    WHERE status = 'pending' AND next_run_at <= ?
+      AND NOT EXISTS (
+          SELECT 1 FROM index_jobs r
+          WHERE r.file_id = j.file_id AND r.kind = j.kind AND r.status = 'running'
+      )
+    ORDER BY priority DESC, next_run_at, id
+    LIMIT 1
+"""
+
+_wakeup = threading.Event()
+_stop = threading.Event()
+_workers = []
+
+
+def _row_to_job(r):
+    return {
+        "id": r[0],
+        "file_id": r[1],
+        "kind": r[2],
+        "priority": r[3],
+        "status": r[4],
+        "attempts": r[5],
+        "last_error": r[6],
+        "next_run_at": r[7],
+        "created_at": r[8],
+        "started_at": r[9],
+        "finished_at": r[10],
+    }
+
+
+def _handler(kind: str):
+    if kind == "index":
+        from services.indexing_service import index_file_content
+        return index_file_content
+    if kind == "compact_version":
+        from services.chunk_store import compact_version
+        return compact_version
+    raise ValueError(f"Unknown job kind: {kind}")
+
+
+# -------------------------------------------------------
+# Producer side
+# -------------------------------------------------------
+
+def enqueue_job(file_id: int, kind: str = "index", priority: int = PRIORITY_BACKFILL) -> int:
+    """
+    Queue a job for file_id. If one is already pending it is reused (keeping
+    the higher priority and the earlier run time). Joins the caller's
+    transaction when there is one. Returns the job id.
+    """
+    now = datetime.utcnow().isoformat()
+
+    with transaction() as conn:
+        conn.execute(
+            """
+            INSERT INTO index_jobs (file_id, kind, priority, status, next_run_at, created_at)
+            VALUES (?, ?, ?, 'pending', ?, ?)
+            ON CONFLICT(file_id, kind) WHERE status = 'pending' DO UPDATE SET
+                priority = MAX(priority, excluded.priority),
+                next_run_at = MIN(next_run_at, excluded.next_run_at)
+            """,
+            (file_id, kind, priority, now, now),
+        )
+        job_id = conn.execute(
+            "SELECT id FROM index_jobs WHERE file_id = ? AND kind = ? AND status = 'pending'",
+            (file_id, kind),
+        ).fetchone()[0]
+
+    _wakeup.set()
+    return job_id
+
+
+def enqueue_index_job(file_id: int, priority: int = PRIORITY_UPLOAD) -> int:
+    return enqueue_job(file_id, "index", priority)
+
+
+def enqueue_jobs(file_ids, kind: str = "index", priority: int = PRIORITY_BACKFILL) -> int:
+    """
+    Bulk enqueue_job for many files in one statement batch (same pending-job
+    reuse). Joins the caller's transaction. Returns the number of files.
+    """
+    now = datetime.utcnow().isoformat()
+    rows = [(file_id, kind, priority, now, now) for file_id in file_ids]
+    if not rows:
+        return 0
+
+    with transaction() as conn:
+        conn.executemany(
+            """
+            INSERT INTO index_jobs (file_id, kind, priority, status, next_run_at, created_at)
+            VALUES (?, ?, ?, 'pending', ?, ?)
+            ON CONFLICT(file_id, kind) WHERE status = 'pending' DO UPDATE SET
+                priority = MAX(priority, excluded.priority),
+                next_run_at = MIN(next_run_at, excluded.next_run_at)
+            """,
+            rows,
+        )
+
+    _wakeup.set()
+    return len(rows)
+
+
+# -------------------------------------------------------
+# Worker side
+# -------------------------------------------------------
+
+def _claim_next():
+    """
+    Atomically move the best runnable job to 'running'. Skips files that
+    already have a running job so one file is never processed twice at once.
+    """
+    now = datetime.utcnow().isoformat()
+
+    with transaction() as conn:
+        row = conn.execute(CLAIM_JOB_SQL, (now,)).fetchone()
+        if row is None:
+            return None
+
+        conn.execute(
+            """
+            UPDATE index_jobs
+            SET status = 'running', attempts = attempts + 1, started_at = ?, last_error = NULL
+            WHERE id = ?
+            """,
+            (now, row[0]),
+        )
+
+    job = _row_to_job(row)
+    job["attempts"] += 1
+    return job
+
+
+def _backoff_seconds(attempts: int) -> float:
+    delay = min(INDEX_JOB_BACKOFF_SECONDS * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS)
+    return delay * random.uniform(0.8, 1.2)  # jitter, so retries don't stampede
+
+
+def _finish(job, error: str = None, retryable: bool = True):
+    now = datetime.utcnow()
+    conn = get_connection()
+
+    if error is None:
+        conn.execute(
+            "UPDATE index_jobs SET status = 'done', finished_at = ? WHERE id = ?",
+            (now.isoformat(), job["id"]),
+        )
+        return
+
+    if not retryable or job["attempts"] >= INDEX_JOB_MAX_ATTEMPTS:
+        logger.error(f"Job {job['id']} ({job['kind']} file_id={job['file_id']}) gave up: {error}")
+        conn.execute(
+            "UPDATE index_jobs SET status = 'failed', last_error = ?, finished_at = ? WHERE id = ?",
+            (error, now.isoformat(), job["id"]),
+        )
+        return
+
+    retry_at = now + timedelta(seconds=_backoff_seconds(job["attempts"]))
+    logger.error(
+        f"Job {job['id']} ({job['kind']} file_id={job['file_id']}) failed, "
+        f"retry {job['attempts']}/{INDEX_JOB_MAX_ATTEMPTS} at {retry_at.isoformat()}: {error}"
+    )
+    # A newer pending job for the same file supersedes this retry
+    with transaction() as conn:
+        superseded = conn.execute(
+            "SELECT 1 FROM index_jobs WHERE file_id = ? AND kind = ? AND status = 'pending'",
+            (job["file_id"], job["kind"]),
+        ).fetchone()
+        if superseded:
+            conn.execute(
+                "UPDATE index_jobs SET status = 'failed', last_error = ?, finished_at = ? WHERE id = ?",
+                (error, now.isoformat(), job["id"]),
+            )
+        else:
+            conn.execute(
+                "UPDATE index_jobs SET status = 'pending', last_error = ?, next_run_at = ? WHERE id = ?",
+                (error, retry_at.isoformat(), job["id"]),
+            )
+
+
+def run_job(job):
+    try:
+        result = _handler(job["kind"])(job["file_id"])
+    except Exception as e:
+        _finish(job, str(e) or e.__class__.__name__)
+        return
+
+    # index_file_content reports some failures in its result instead of raising
+    if isinstance(result, dict) and result.get("indexed") is False:
+        _finish(job, result.get("error", "indexing failed"), result.get("retryable", True))
+    else:
+        _finish(job)
+
+
+def _worker_loop():
+    try:
+        while not _stop.is_set():
+            try:
+                job = _claim_next()
+            except Exception as e:
+                logger.error(f"Job claim failed: {e}")
+                job = None
+
+            if job is None:
+                _wakeup.wait(POLL_INTERVAL_SECONDS)
+                _wakeup.clear()
+                continue
+
+            run_job(job)
+    finally:
+        close_connection()
+
+
+def _recover_and_prune():
+    """
+    Jobs left 'running' by a crash go back to pending (or are dropped when a
+    newer pending job for the same file exists). Old 'done' rows are pruned.
+    """
+    cutoff = (datetime.utcnow() - timedelta(days=DONE_RETENTION_DAYS)).isoformat()
+
+    with transaction() as conn:
+        conn.execute("UPDATE OR IGNORE index_jobs SET status = 'pending' WHERE status = 'running'")
+        conn.execute("DELETE FROM index_jobs WHERE status = 'running'")
+        conn.execute("DELETE FROM index_jobs WHERE status = 'done' AND finished_at < ?", (cutoff,))
+
+
+def start_workers(count: int = INDEX_WORKERS):
+    """Start the worker pool (called once at app startup)."""
+    if _workers:
+        return
+
+    _recover_and_prune()
+    _stop.clear()
+
+    for i in range(max(0, count)):
+        t = threading.Thread(target=_worker_loop, name=f"index-worker-{i}", daemon=True)
+        t.start()
+        _workers.append(t)
+
+    logger.info(f"Index job workers started: {len(_workers)}")
+
+
+def stop_workers(timeout: float = 10.0):
+    """Ask workers to exit after their current job and wait for them."""
+    _stop.set()
+    _wakeup.set()
+    for t in _workers:
+        t.join(timeout)
+    _workers.clear()
+
+
+# -------------------------------------------------------
+# Status
+# -------------------------------------------------------
+
+def get_job(job_id: int):
+    conn = get_connection()
+    row = conn.execute(f"SELECT {JOB_COLUMNS} FROM index_jobs WHERE id = ?", (job_id,)).fetchone()
+    return _row_to_job(row) if row else None
+
+
+def list_jobs(status: str = None, file_id: int = None, limit: int = 100):
+    conn = get_connection()
+
+    where, params = [], []
+    if status:
+        where.append("status = ?")
+        params.append(status)
+    if file_id is not None:
+        where.append("file_id = ?")
+        params.append(file_id)
+
+    sql = f"SELECT {JOB_COLUMNS} FROM index_jobs"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY id DESC LIMIT ?"
+    params.append(limit)
+
+    return [_row_to_job(r) for r in conn.execute(sql, params).fetchall()]
+
+
+def queue_stats():
+    conn = get_connection()
+    counts = dict(conn.execute("SELECT status, COUNT(*) FROM index_jobs GROUP BY status").fetchall())
+    return {
+        "workers": sum(1 for t in _workers if t.is_alive()),
+        "pending": counts.get("pending", 0),
+        "running": counts.get("running", 0),
+        "done": counts.get("done", 0),
+        "failed": counts.get("failed", 0),
+    }
@@ -1,34 +1,26 @@
 # services/project_db.py
 
-import sqlite3
 from datetime import datetime
-from core.config import DB_PATH
+from core.database import get_connection
 
 
 def create_project(name: str):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+    conn = get_connection()
     now = datetime.utcnow().isoformat()
 
-    cur.execute(
+    cur = conn.execute(
         "INSERT INTO projects (name, created_at) VALUES (?, ?)",
         (name, now)
     )
 
-    conn.commit()
-    project_id = cur.lastrowid
-    conn.close()
-
-    return project_id
+    return cur.lastrowid
 
 
 def get_all_projects():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute("SELECT id, name, created_at FROM projects ORDER BY created_at DESC")
-    rows = cur.fetchall()
-    conn.close()
+    conn = get_connection()
+    rows = conn.execute(
+        "SELECT id, name, created_at FROM projects ORDER BY created_at DESC"
+    ).fetchall()
 
     projects = [
         {"id": r[0], "name": r[1], "created_at": r[2]}
@@ -38,12 +30,10 @@ def get_all_projects():
 
 
 def get_project_by_id(project_id: int):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute("SELECT id, name, created_at FROM projects WHERE id=?", (project_id,))
-    row = cur.fetchone()
-    conn.close()
+    conn = get_connection()
+    row = conn.execute(
+        "SELECT id, name, created_at FROM projects WHERE id=?", (project_id,)
+    ).fetchone()
 
     if row:
         return {"id": row[0], "name": row[1], "created_at": row[2]}
@@ -51,9 +41,5 @@ def get_project_by_id(project_id: int):
 
 
 def delete_project_from_db(project_id: int):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute("DELETE FROM projects WHERE id=?", (project_id,))
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+    conn.execute("DELETE FROM projects WHERE id=?", (project_id,))
@@ -0,0 +1,216 @@
+# services/range_service.py
+
+import os
+import secrets
+from email.utils import formatdate
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from core.concurrency import iterate_offloaded
+from encryption.crypto_engine import decrypt_file, decrypt_range, read_layout
+
+MAX_RANGES = 32  # more than this is treated as abuse and answered with the full file
+MEDIA_TYPE = "application/octet-stream"
+
+
+# -------------------------------------------------------
+# Header helpers
+# -------------------------------------------------------
+
+def _etag_for(file: dict, source) -> str:
+    # Strong validator: changes whenever the stored bytes are rewritten
+    return f'"{file["id"]}-{source.stored_size}-{source.validator}"'
+
+
+def parse_range_header(range_header: str, size: int):
+    """
+    Parse a `Range: bytes=...` header against a body of `size` bytes.
+    Returns a list of inclusive (start, end) tuples, overlapping ones
+    merged, or None when the header is absent or malformed (RFC 9110:
+    serve the full body).
+    Raises 416 if the header is valid but no range is satisfiable.
+    """
+    if not range_header:
+        return None
+
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+
+    parts = [p.strip() for p in spec.split(",") if p.strip()]
+    if len(parts) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for part in parts:
+        first, sep, last = part.partition("-")
+        if not sep:
+            return None
+
+        try:
+            if first == "":
+                # Suffix range: last N bytes
+                length = int(last)
+                if length <= 0:
+                    continue
+                start, end = max(size - length, 0), size - 1
+            else:
+                start = int(first)
+                end = int(last) if last else size - 1
+                if last and start > end:
+                    return None
+                end = min(end, size - 1)
+        except ValueError:
+            return None
+
+        if start < size and start <= end:
+            ranges.append((start, end))
+
+    if not ranges:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+
+    return _coalesce(ranges)
+
+
+def _coalesce(ranges):
+    """
+    Merge overlapping ranges (RFC 9110 14.3), so no byte is decrypted twice;
+    the merged ranges come back in ascending order. Disjoint ranges are
+    returned as requested.
+    """
+    ordered = sorted(ranges)
+    if all(prev[1] < cur[0] for prev, cur in zip(ordered, ordered[1:])):
+        return ranges
+
+    merged = [ordered[0]]
+    for start, end in ordered[1:]:
+        if start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _if_range_matches(if_range: str, etag: str, last_modified: str) -> bool:
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        # Weak validators never match for If-Range
+        return if_range == etag
+    return if_range == last_modified
+
+
+# -------------------------------------------------------
+# Plaintext sources
+# -------------------------------------------------------
+#
+# A source exposes `size` (plaintext bytes), `mtime`, `stored_size` and
+# `validator` (for the ETag), `iter_all()` and `iter_range(start, end)`.
+# Whole blobs are read through crypto_engine; chunked old versions through
+# services.chunk_store.ManifestSource.
+
+class EncryptedFileSource:
+    def __init__(self, abs_path, plain_size: int = None):
+        stat = os.stat(abs_path)
+        self.abs_path = abs_path
+        # Read once per request and shared by every range of it
+        self.layout = read_layout(abs_path, plain_size)
+        self.size = self.layout["plain_size"]
+        self.mtime = stat.st_mtime
+        self.stored_size = stat.st_size
+        self.validator = stat.st_mtime_ns
+
+    def iter_all(self):
+        return decrypt_file(self.abs_path)
+
+    def iter_range(self, start: int, end: int):
+        return decrypt_range(self.abs_path, start, end, self.layout)
+
+
+# -------------------------------------------------------
+# Response builder
+# -------------------------------------------------------
+
+def _multipart_body(source, ranges, size: int, boundary: str):
+    for start, end in ranges:
+        yield (
+            f"--{boundary}\r\n"
+            f"Content-Type: {MEDIA_TYPE}\r\n"
+            f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+        ).encode()
+        yield from source.iter_range(start, end)
+        yield b"\r\n"
+    yield f"--{boundary}--\r\n".encode()
+
+
+def _multipart_length(ranges, size: int, boundary: str) -> int:
+    total = len(f"--{boundary}--\r\n")
+    for start, end in ranges:
+        total += len(
+            f"--{boundary}\r\n"
+            f"Content-Type: {MEDIA_TYPE}\r\n"
+            f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+        )
+        total += (end - start + 1) + 2
+    return total
+
+
+def build_download_response(file: dict, abs_path, range_header=None, if_range=None):
+    """Stream an encrypted file from disk (see build_source_response)."""
+    source = EncryptedFileSource(abs_path, file.get("plain_size"))
+    return build_source_response(file, source, range_header, if_range)
+
+
+def build_source_response(file: dict, source, range_header=None, if_range=None):
+    """
+    Stream a decrypted file, honouring Range / If-Range.
+      - no (or stale) Range  → 200 with the whole body
+      - one range            → 206 with Content-Range
+      - several ranges       → 206 multipart/byteranges
+    Only the encrypted chunks covering the requested bytes are decrypted,
+    in the bounded download threads (core/concurrency.py).
+    """
+    size = source.size
+    etag = _etag_for(file, source)
+    last_modified = formatdate(source.mtime, usegmt=True)
+
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Content-Disposition": f'attachment; filename="{file["name"]}"',
+    }
+
+    ranges = None
+    if _if_range_matches(if_range, etag, last_modified):
+        ranges = parse_range_header(range_header, size)
+
+    if not ranges:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(iterate_offloaded(source.iter_all()), media_type=MEDIA_TYPE, headers=headers)
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            iterate_offloaded(source.iter_range(start, end)),
+            status_code=206,
+            media_type=MEDIA_TYPE,
+            headers=headers,
+        )
+
+    boundary = secrets.token_hex(16)
+    headers["Content-Length"] = str(_multipart_length(ranges, size, boundary))
+    return StreamingResponse(
+        iterate_offloaded(_multipart_body(source, ranges, size, boundary)),
+        status_code=206,
+        media_type=f"multipart/byteranges; boundary={boundary}",
+        headers=headers,
+    )
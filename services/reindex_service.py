@@ -0,0 +1,268 @@
+# services/reindex_service.py
+
+import threading
+import time
+from datetime import datetime
+
+from fastapi import HTTPException
+
+from core.database import get_connection, close_connection
+from core.logger import logger
+from services.embedding_service import upsert_embeddings, _ensure_model, MODEL_NAME
+from services.job_queue import enqueue_jobs, PRIORITY_BACKFILL
+from services.text_extraction_service import extractor_version
+
+# -------------------------------------------------------
+# Embedding rebuild / backfill
+# -------------------------------------------------------
+#
+# Re-embeds every indexed file (or one project's) from file_index.content,
+# without decrypting or extracting anything: files are read in keyset pages
+# and handed to upsert_embeddings in groups, so the model sees full batches
+# and each group is written in one transaction. Files that were never
+# indexed are queued as normal 'index' jobs instead.
+#
+# One rebuild runs at a time, in its own thread; progress is kept in memory.
+#
+# sweep_stale() is the incremental variant: files whose bytes or extractor
+# changed since extraction are queued for re-indexing, and a rebuild limited
+# to vectors that don't match their text or MODEL_NAME re-embeds the rest.
+# When nothing changed it does nothing.
+
+REBUILD_PAGE_FILES = 256
+REBUILD_GROUP_CHARS = 2_000_000   # text handed to one upsert_embeddings call
+
+_lock = threading.Lock()
+_cancel = threading.Event()
+_state = None
+
+
+def _scope(project_id):
+    if project_id is None:
+        return "", []
+    return " AND f.project_id = ?", [project_id]
+
+
+def _queue_unindexed(project_id) -> int:
+    where, params = _scope(project_id)
+    rows = get_connection().execute(
+        f"""
+        SELECT f.id FROM files f
+        LEFT JOIN file_index i ON i.file_id = f.id
+        WHERE i.file_id IS NULL{where}
+        """,
+        params,
+    ).fetchall()
+    return enqueue_jobs([file_id for (file_id,) in rows], "index", PRIORITY_BACKFILL)
+
+
+# Vectors missing for non-empty text, from another model, or from other text
+_STALE_EMBEDDING = """
+    CASE WHEN e.file_id IS NULL THEN trim(COALESCE(i.content, '')) != ''
+         ELSE e.model_name IS NOT ? OR e.text_hash IS NOT i.text_hash END
+"""
+
+
+def _pages(project_id, stale_only: bool = False):
+    where, params = _scope(project_id)
+    if stale_only:
+        where += f" AND {_STALE_EMBEDDING}"
+        params = [*params, MODEL_NAME]
+    last_id = 0
+    while True:
+        rows = get_connection().execute(
+            f"""
+            SELECT i.file_id, i.content
+            FROM file_index i
+            JOIN files f ON f.id = i.file_id
+            LEFT JOIN file_embeddings e ON e.file_id = i.file_id
+            WHERE i.file_id > ?{where}
+            ORDER BY i.file_id
+            LIMIT ?
+            """,
+            [last_id, *params, REBUILD_PAGE_FILES],
+        ).fetchall()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def _embed(state, group):
+    try:
+        state["chunks"] += upsert_embeddings(group)
+        state["done"] += len(group)
+    except Exception as e:
+        # Retry one by one so a single bad file doesn't sink the group
+        logger.error(f"Embedding group failed ({len(group)} files), retrying singly: {e}")
+        for item in group:
+            try:
+                state["chunks"] += upsert_embeddings([item])
+                state["done"] += 1
+            except Exception as e:
+                state["failed"] += 1
+                state["last_error"] = f"file_id={item[0]}: {e}"
+
+
+def _run(state):
+    started = time.perf_counter()
+    try:
+        group, chars = [], 0
+        for rows in _pages(state["project_id"], state["stale_only"]):
+            for file_id, content in rows:
+                group.append((file_id, content or ""))
+                chars += len(content or "")
+                if chars >= REBUILD_GROUP_CHARS:
+                    _embed(state, group)
+                    group, chars = [], 0
+                    _progress(state, started)
+                if _cancel.is_set():
+                    state["status"] = "cancelled"
+                    return
+        if group:
+            _embed(state, group)
+        state["status"] = "done"
+    except Exception as e:
+        logger.error(f"Embedding rebuild failed: {e}")
+        state["status"] = "failed"
+        state["last_error"] = str(e)
+    finally:
+        _progress(state, started)
+        state["finished_at"] = datetime.utcnow().isoformat()
+        logger.info(
+            f"Embedding rebuild {state['status']} | files={state['done']}/{state['total']} "
+            f"chunks={state['chunks']} failed={state['failed']} "
+            f"| {state['files_per_second']} files/s"
+        )
+        close_connection()
+
+
+def _progress(state, started):
+    elapsed = time.perf_counter() - started
+    state["elapsed_seconds"] = round(elapsed, 1)
+    state["files_per_second"] = round(state["done"] / elapsed, 2) if elapsed else 0.0
+    remaining = state["total"] - state["done"] - state["failed"]
+    rate = state["files_per_second"]
+    state["eta_seconds"] = round(remaining / rate, 1) if rate else None
+
+
+def start_rebuild(project_id: int = None, stale_only: bool = False):
+    """
+    Start re-embedding all indexed files (or those of one project) in the
+    background; with stale_only, just those whose vectors are out of date.
+    Returns the initial progress dict; 409 if one is running.
+    """
+    global _state
+
+    with _lock:
+        if _state is not None and _state["status"] == "running":
+            raise HTTPException(status_code=409, detail="A rebuild is already running")
+        try:
+            _ensure_model()
+        except RuntimeError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+
+        total = _count_embeddable(project_id, stale_only)
+
+        _state = {
+            "status": "running",
+            "project_id": project_id,
+            "stale_only": stale_only,
+            "total": total,
+            "done": 0,
+            "failed": 0,
+            "chunks": 0,
+            "queued_for_indexing": 0 if stale_only else _queue_unindexed(project_id),
+            "elapsed_seconds": 0.0,
+            "files_per_second": 0.0,
+            "eta_seconds": None,
+            "last_error": None,
+            "started_at": datetime.utcnow().isoformat(),
+            "finished_at": None,
+        }
+        _cancel.clear()
+        threading.Thread(target=_run, args=(_state,), name="embedding-rebuild",
+                         daemon=True).start()
+        return dict(_state)
+
+
+def _count_embeddable(project_id, stale_only: bool) -> int:
+    where, params = _scope(project_id)
+    if stale_only:
+        where += f" AND {_STALE_EMBEDDING}"
+        params = [*params, MODEL_NAME]
+    return get_connection().execute(
+        f"""
+        SELECT COUNT(*)
+        FROM file_index i
+        JOIN files f ON f.id = i.file_id
+        LEFT JOIN file_embeddings e ON e.file_id = i.file_id
+        WHERE 1 = 1{where}
+        """,
+        params,
+    ).fetchone()[0]
+
+
+def _stale_extractions(project_id, retry_failed: bool):
+    """Files never extracted, or extracted from other bytes / by an older extractor."""
+    where, params = _scope(project_id)
+    if not retry_failed:
+        # Same bytes + same extractor would fail the same way again
+        where += """ AND NOT EXISTS (
+            SELECT 1 FROM index_jobs j
+            WHERE j.file_id = f.id AND j.kind = 'index' AND j.status = 'failed'
+        )"""
+    rows = get_connection().execute(
+        f"""
+        SELECT f.id, f.name, f.content_hash, i.file_id, i.content_hash, i.extractor_version
+        FROM files f
+        LEFT JOIN file_index i ON i.file_id = f.id
+        WHERE 1 = 1{where}
+        """,
+        params,
+    ).fetchall()
+    return [
+        r[0] for r in rows
+        if r[3] is None or r[5] != extractor_version(r[1]) or r[4] != r[2]
+    ]
+
+
+def sweep_stale(project_id: int = None, retry_failed: bool = False):
+    """
+    Reprocess only what is out of date: re-extraction jobs for stale
+    file_index rows, a stale_only rebuild for stale vectors. A rerun with
+    nothing changed queues nothing. Files whose index job failed for good
+    are skipped unless retry_failed (e.g. after an extractor fix).
+    """
+    reextract = _stale_extractions(project_id, retry_failed)
+    # The job re-embeds too, but only if the new text differs
+    enqueue_jobs(reextract, "index", PRIORITY_BACKFILL)
+
+    result = {"reextract_queued": len(reextract), "reembed": 0, "rebuild": None}
+
+    reembed = _count_embeddable(project_id, stale_only=True)
+    if reembed:
+        result["reembed"] = reembed
+        try:
+            result["rebuild"] = start_rebuild(project_id, stale_only=True)
+        except HTTPException as e:
+            result["rebuild"] = {"status": "skipped", "detail": e.detail}
+
+    if reextract or reembed:
+        logger.info(
+            f"Index sweep | re-extract queued={len(reextract)} re-embed={reembed}"
+            + (f" (project {project_id})" if project_id is not None else "")
+        )
+    return result
+
+
+def cancel_rebuild():
+    """Stop the running rebuild after its current group."""
+    _cancel.set()
+    return get_rebuild_status()
+
+
+def get_rebuild_status():
+    if _state is None:
+        return {"status": "idle"}
+    return dict(_state)
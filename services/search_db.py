@@ -1,25 +1,18 @@
-import sqlite3
-from core.config import DB_PATH
+from core.database import get_connection
 
 def add_search_index(file_id: int, text: str, embedding: list):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute("""
+    conn = get_connection()
+    conn.execute("""
         INSERT INTO search_index (file_id, text_content, embedding)
         VALUES (?, ?, ?)
     """, (file_id, text, ",".join(map(str, embedding))))
 
-    conn.commit()
-    conn.close()
-
 
 def search_by_file_id(file_id: int):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT text_content FROM search_index WHERE file_id = ?", (file_id,))
-    result = cur.fetchone()
-    conn.close()
+    conn = get_connection()
+    result = conn.execute(
+        "SELECT text_content FROM search_index WHERE file_id = ?", (file_id,)
+    ).fetchone()
     return result[0] if result else None
 
 
@@ -27,11 +20,8 @@ def get_all_search_embeddings():
     """
     Returns: [(file_id, embedding_vector_as_list), ...]
     """
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT file_id, embedding FROM search_index")
-    rows = cur.fetchall()
-    conn.close()
+    conn = get_connection()
+    rows = conn.execute("SELECT file_id, embedding FROM search_index").fetchall()
 
     vectors = []
     for fid, emb in rows:
@@ -1,7 +1,9 @@
+import re
 import sqlite3
+import unicodedata
 from fastapi import HTTPException
 
-from core.config import DB_PATH
+from core.database import get_connection
 from services.embedding_service import semantic_search as _semantic_search
 from services.file_service_db import get_file_by_id
 
@@ -9,50 +11,190 @@ from services.file_service_db import get_file_by_id
 # -------------------------------------------------------------
 #   FULL TEXT SEARCH (keyword) — latest versions only
 # -------------------------------------------------------------
-def search_by_content(q: str, limit: int = 100):
+SNIPPET_TOKENS = 16
+# FTS5's snippet() scores every match of a hit to pick its best window, which
+# is quadratic on documents with many matches (a log with "INFO" per line).
+# Hits are ranked without it; snippets come from this prefix of the content.
+SNIPPET_SCAN_CHARS = 64 * 1024
+
+CONTENT_SEARCH_SQL = """
+    SELECT
+        f.id, f.name, f.path, f.size, f.created_at, f.modified_at,
+        f.project_id, f.version, f.is_latest,
+        bm25(file_index_fts) AS rank,
+        i.id
+    FROM file_index_fts
+    JOIN file_index i ON i.id = file_index_fts.rowid
+    JOIN files f ON f.id = i.file_id
+    WHERE file_index_fts MATCH ?
+      AND f.is_latest = 1
+    ORDER BY rank
+    LIMIT ?
+"""
+
+SNIPPET_SOURCE_SQL = "SELECT substr(content, 1, ?) FROM file_index WHERE id = ?"
+
+_TOKEN_RE = re.compile(r"\w+")
+# "quoted phrase"[*] or a bare word; parentheses and quotes separate words
+_QUERY_TERM_RE = re.compile(r'"((?:[^"]|"")*)"(\*?)|([^\s"()]+)')
+_FTS_OPERATORS = {"AND", "OR", "NOT"}
+
+
+def _to_fts_query(q: str) -> str:
+    """
+    Turn free text into a safe FTS5 query: every term is quoted (so stray
+    punctuation can't break the syntax) and terms are AND-ed. A trailing
+    `*` keeps prefix matching, e.g. `invoic* 2024` → "invoic"* "2024".
+    """
+    terms = []
+    for word in q.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+def _fold(token: str) -> str:
+    """Case- and diacritic-insensitive form, like the unicode61 tokenizer's."""
+    decomposed = unicodedata.normalize("NFKD", token)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def _match_terms(match: str) -> list:
+    """(term, is_prefix) pairs of an FTS5 query, for highlighting snippets."""
+    terms = []
+    for phrase, star, bare in _QUERY_TERM_RE.findall(match):
+        if bare:
+            if bare in _FTS_OPERATORS or bare.startswith("NEAR"):
+                continue
+            star = "*" if bare.endswith("*") else ""
+            phrase = bare.rstrip("*").rpartition(":")[2]   # drop a column filter
+        words = [_fold(w) for w in _TOKEN_RE.findall(phrase)]
+        terms += [(w, False) for w in words[:-1]]
+        if words:
+            terms.append((words[-1], bool(star)))
+    return terms
+
+
+def _is_hit(token: str, terms: list) -> bool:
+    folded = _fold(token)
+    return any(folded == t or (prefix and folded.startswith(t)) for t, prefix in terms)
+
+
+def _first_hit(text: str, terms: list):
+    """Offset of the first token of `text` that matches a query term, or None."""
+    if not terms:
+        return None
+    pattern = "|".join(re.escape(t) + (r"\w*" if prefix else "") for t, prefix in terms)
+    m = re.search(rf"(?<!\w)(?:{pattern})(?!\w)", text, re.IGNORECASE)
+    if m:
+        return m.start()
+    if text.isascii():
+        return None
+    # Accents are folded by the tokenizer, not by the regex
+    return next((m.start() for m in _TOKEN_RE.finditer(text) if _is_hit(m.group(), terms)), None)
+
+
+def _snippet(text: str, terms: list) -> str:
+    """
+    FTS5-style snippet: SNIPPET_TOKENS tokens around the first match in
+    `text` (or its opening tokens), matches in [brackets], cut ends marked
+    with ' … '.
+    """
+    offset = _first_hit(text, terms)
+    before = []
+    if offset is None:
+        offset = 0
+    else:
+        lead_in = text[max(0, offset - 256):offset]
+        before = [m.group() for m in _TOKEN_RE.finditer(lead_in)][-(SNIPPET_TOKENS // 4):]
+        if before:
+            offset -= len(lead_in) - lead_in.rindex(before[0])
+
+    window = []
+    for m in _TOKEN_RE.finditer(text, offset):
+        window.append(m)
+        if len(window) == SNIPPET_TOKENS:
+            break
+    if not window:
+        return ""
+
+    parts = []
+    pos = window[0].start()
+    for m in window:
+        parts.append(text[pos:m.start()])
+        parts.append(f"[{m.group()}]" if _is_hit(m.group(), terms) else m.group())
+        pos = m.end()
+
+    head = " … " if _TOKEN_RE.search(text, 0, window[0].start()) else ""
+    tail = " … " if _TOKEN_RE.search(text, pos) else ""
+    return head + "".join(parts) + tail
+
+
+def search_by_content(q: str, limit: int = 100, syntax: str = "simple"):
+    """
+    BM25-ranked full-text search over extracted content (FTS5).
+    syntax="simple" → plain words (AND), `word*` for prefixes
+    syntax="fts"    → raw FTS5 syntax: "exact phrase", pre*, AND / OR / NOT, NEAR()
+    Each hit carries its file metadata, a relevance score and a highlighted snippet.
+    """
     if not q or not q.strip():
         raise HTTPException(status_code=400, detail="Query cannot be empty")
 
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute(
-        """
-        SELECT f.id
-        FROM file_index i
-        JOIN files f ON f.id = i.file_id
-        WHERE i.content LIKE ?
-          AND f.is_latest = 1
-        ORDER BY f.modified_at DESC
-        LIMIT ?
-        """,
-        (f"%{q}%", limit),
-    )
-
-    ids = [row[0] for row in cur.fetchall()]
-    conn.close()
-
-    if not ids:
+    if syntax == "fts":
+        match = q.strip()
+    elif syntax == "simple":
+        match = _to_fts_query(q)
+    else:
+        raise HTTPException(status_code=400, detail="syntax must be 'simple' or 'fts'")
+
+    if not match:
+        raise HTTPException(status_code=400, detail="Query cannot be empty")
+
+    conn = get_connection()
+    try:
+        rows = conn.execute(CONTENT_SEARCH_SQL, (match, limit)).fetchall()
+    except sqlite3.OperationalError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid search query: {e}")
+
+    if not rows:
         raise HTTPException(status_code=404, detail="No files matched content search")
 
-    results = []
-    for fid in ids:
-        f = get_file_by_id(fid)
-        if f:
-            results.append(f)
+    terms = _match_terms(match)
+    snippets = [
+        _snippet(conn.execute(SNIPPET_SOURCE_SQL, (SNIPPET_SCAN_CHARS, r[10])).fetchone()[0] or "",
+                 terms)
+        for r in rows
+    ]
 
-    return results
+    return [
+        {
+            "id": r[0],
+            "name": r[1],
+            "path": r[2],
+            "size": r[3],
+            "created_at": r[4],
+            "modified_at": r[5],
+            "project_id": r[6],
+            "version": r[7],
+            "is_latest": r[8],
+            "score": -r[9],  # bm25() is lower-is-better; flip so higher = more relevant
+            "snippet": snippet,
+        }
+        for r, snippet in zip(rows, snippets)
+    ]
 
 
 # -------------------------------------------------------------
 #   SEMANTIC SEARCH (vector similarity)
 # -------------------------------------------------------------
-def search_by_semantic(q: str, top_k: int = 10):
+def search_by_semantic(q: str, top_k: int = 10, probes: int = None, exact: bool = False):
     if not q or not q.strip():
         raise HTTPException(status_code=400, detail="Query cannot be empty")
 
     try:
-        hits = _semantic_search(q, top_k=top_k)
+        hits = _semantic_search(q, top_k=top_k, probes=probes, exact=exact)
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -67,6 +209,7 @@ def search_by_semantic(q: str, top_k: int = 10):
                 {
                     **f,  # copy metadata
                     "score": h["score"],
+                    "passages": h["passages"],
                 }
             )
 
@@ -76,10 +219,8 @@ def search_by_semantic(q: str, top_k: int = 10):
 # -------------------------------------------------------------
 #   METADATA SEARCH (filename, extension, tags, project)
 # -------------------------------------------------------------
-def search_files(q=None, project_id=None, ext=None, tag=None, limit: int = 200):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
+def search_files_query(q=None, project_id=None, ext=None, tag=None, limit: int = 200):
+    """(sql, params) of the search_files lookup."""
     base_query = """
         SELECT 
             f.id,
@@ -98,10 +239,10 @@ def search_files(q=None, project_id=None, ext=None, tag=None, limit: int = 200):
     where = []
     params = []
 
-    # Tag filtering
+    # Tag filtering (tags are stored lowercased, so the tag index applies)
     if tag:
         joins.append("JOIN file_tags t ON t.file_id = f.id")
-        where.append("LOWER(t.tag) = ?")
+        where.append("t.tag = ?")
         params.append(tag.lower().strip())
 
     # Project filtering
@@ -131,10 +272,12 @@ def search_files(q=None, project_id=None, ext=None, tag=None, limit: int = 200):
 
     query += " ORDER BY f.modified_at DESC LIMIT ?"
     params.append(limit)
+    return query, params
 
-    cur.execute(query, params)
-    rows = cur.fetchall()
-    conn.close()
+
+def search_files(q=None, project_id=None, ext=None, tag=None, limit: int = 200):
+    query, params = search_files_query(q, project_id, ext, tag, limit)
+    rows = get_connection().execute(query, params).fetchall()
 
     results = []
     for r in rows:
@@ -1,9 +1,10 @@
-import sqlite3
 from datetime import datetime
 from fastapi import HTTPException
-from core.config import DB_PATH
+from core.database import get_connection
 from services.file_service_db import get_file_by_id
 
+TAG_EXISTS_SQL = "SELECT 1 FROM file_tags WHERE file_id = ? AND tag = ?"
+
 
 def add_tag(file_id: int, tag: str):
     tag = tag.strip().lower()
@@ -14,40 +15,30 @@ def add_tag(file_id: int, tag: str):
     if not file:
         raise HTTPException(status_code=404, detail="File not found")
 
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+    conn = get_connection()
 
     # Avoid exact duplicates
-    cur.execute(
-        "SELECT 1 FROM file_tags WHERE file_id = ? AND tag = ?",
-        (file_id, tag),
-    )
-    if cur.fetchone():
-        conn.close()
+    exists = conn.execute(TAG_EXISTS_SQL, (file_id, tag)).fetchone()
+    if exists:
         return {"message": "Tag already exists"}
 
     now = datetime.utcnow().isoformat()
-    cur.execute(
+    conn.execute(
         "INSERT INTO file_tags (file_id, tag, created_at) VALUES (?, ?, ?)",
         (file_id, tag, now),
     )
-    conn.commit()
-    conn.close()
 
     return {"message": "Tag added", "tag": tag}
 
 
 def remove_tag(file_id: int, tag: str):
     tag = tag.strip().lower()
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
+    conn = get_connection()
+    cur = conn.execute(
         "DELETE FROM file_tags WHERE file_id = ? AND tag = ?",
         (file_id, tag),
     )
     deleted = cur.rowcount
-    conn.commit()
-    conn.close()
 
     if deleted == 0:
         raise HTTPException(status_code=404, detail="Tag not found on file")
@@ -60,13 +51,10 @@ def list_tags_for_file(file_id: int):
     if not file:
         raise HTTPException(status_code=404, detail="File not found")
 
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
+    conn = get_connection()
+    rows = conn.execute(
         "SELECT tag FROM file_tags WHERE file_id = ? ORDER BY tag ASC",
         (file_id,),
-    )
-    rows = cur.fetchall()
-    conn.close()
+    ).fetchall()
 
     return [r[0] for r in rows]
@@ -0,0 +1,120 @@
+# services/text_cache.py
+
+import threading
+from collections import OrderedDict
+
+from core.config import INDEX_MAX_CHARS, TEXT_CACHE_MAX_CHARS
+from core.database import get_connection
+from core.logger import logger
+from services.extraction_pool import extract_stored
+from services.file_service_db import get_file_by_id
+
+# -------------------------------------------------------
+# Tiered extracted-text cache
+# -------------------------------------------------------
+#
+#   1. file_index.content  - what index_file_content already extracted
+#   2. in-memory LRU       - keyed by (file_id, modified_at), bounded by
+#                            total characters (TEXT_CACHE_MAX_CHARS)
+#   3. extraction pool     - decrypt + extract, result kept in the LRU
+#
+# A version's bytes never change (a new upload is a new file id), so tier 1
+# needs no invalidation; the modified_at in the LRU key guards against ids
+# being reused after a delete.
+
+_lock = threading.Lock()
+_lru = OrderedDict()   # (file_id, modified_at) -> text
+_chars = 0
+_stats = {"index_hits": 0, "memory_hits": 0, "misses": 0, "extract_failures": 0}
+
+
+def _count(name: str):
+    with _lock:
+        _stats[name] += 1
+
+
+def _lru_get(key):
+    with _lock:
+        text = _lru.get(key)
+        if text is not None:
+            _lru.move_to_end(key)
+            _stats["memory_hits"] += 1
+        return text
+
+
+def _lru_put(key, text: str):
+    global _chars
+    if len(text) > TEXT_CACHE_MAX_CHARS:
+        return
+    with _lock:
+        old = _lru.pop(key, None)
+        if old is not None:
+            _chars -= len(old)
+        _lru[key] = text
+        _chars += len(text)
+        while _chars > TEXT_CACHE_MAX_CHARS:
+            _, evicted = _lru.popitem(last=False)
+            _chars -= len(evicted)
+
+
+def _indexed_text(file_id: int):
+    row = get_connection().execute(
+        "SELECT content FROM file_index WHERE file_id = ?", (file_id,)
+    ).fetchone()
+    return row[0] if row and row[0] is not None else None
+
+
+def get_file_text(file_record: dict, max_chars: int = INDEX_MAX_CHARS) -> str:
+    """
+    Extracted text of a file version (at most max_chars), from the cheapest
+    tier that has it. file_record is a row dict from get_file_by_id or a
+    search hit. Returns "" if extraction fails.
+    """
+    file_id = file_record["id"]
+
+    text = _indexed_text(file_id)
+    if text is not None:
+        _count("index_hits")
+        return text[:max_chars]
+
+    if "storage" not in file_record or "modified_at" not in file_record:
+        # Search hits carry a subset of columns
+        file_record = get_file_by_id(file_id) or file_record
+
+    key = (file_id, file_record.get("modified_at"))
+    text = _lru_get(key)
+    if text is not None:
+        return text[:max_chars]
+
+    _count("misses")
+    # Extract up to the index limit so later, longer requests hit as well
+    result = extract_stored(file_record, max_chars=INDEX_MAX_CHARS)
+    if not result["ok"]:
+        _count("extract_failures")
+        logger.error(f"Extraction failed for {file_record['name']}: {result['error']}")
+        return ""
+
+    _lru_put(key, result["text"])
+    return result["text"][:max_chars]
+
+
+def discard_file_text(file_id: int):
+    """Drop a deleted version from the in-memory tier."""
+    global _chars
+    with _lock:
+        for key in [k for k in _lru if k[0] == file_id]:
+            _chars -= len(_lru.pop(key))
+
+
+def text_cache_stats() -> dict:
+    with _lock:
+        lookups = sum(_stats[k] for k in ("index_hits", "memory_hits", "misses"))
+        hits = _stats["index_hits"] + _stats["memory_hits"]
+        return {
+            **_stats,
+            "lookups": lookups,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "entries": len(_lru),
+            "cached_chars": _chars,
+            "max_chars": TEXT_CACHE_MAX_CHARS,
+        }
@@ -6,130 +6,288 @@ from core.logger import logger
 
 
 # ---------------------------
-# Safe UTF-8 decode fallback
+# EXTRACTORS
 # ---------------------------
-def _safe_decode(raw: bytes) -> str:
-    try:
-        return raw.decode("utf-8", errors="ignore")
-    except Exception:
-        return ""
+# Extractors are generators yielding segments as they are read:
+#     {"text": str, "location": {"page": 3} | {"sheet": "Q1", "rows": [1, 500]} | ...}
+# so callers can stop early (see collect_text) and memory stays bounded by
+# one page / slide / block of rows. They raise on failure;
+# extract_text_from_bytes turns that into "", services/extraction_pool.py
+# into a structured error.
 
+TEXT_BLOCK_BYTES = 1024 * 1024
+XLSX_ROWS_PER_SEGMENT = 500
+
+# Scanned-PDF fallback: pages with (almost) no text layer but embedded images
+# are rendered and OCR'd in batches
+OCR_MIN_PAGE_CHARS = 20
+OCR_PDF_DPI = 200
+OCR_MAX_PDF_PAGES = 50
+OCR_PDF_BATCH_PAGES = 8
+
+
+def _segment(text: str, **location):
+    return {"text": text, "location": location}
 
-# ---------------------------
-# EXTRACTORS
-# ---------------------------
-def extract_pdf(raw_bytes: bytes) -> str:
-    try:
-        import fitz  # PyMuPDF
-        doc = fitz.open(stream=raw_bytes, filetype="pdf")
-        return "\n".join([page.get_text() for page in doc])
-    except Exception as e:
-        logger.error(f"PDF extraction failed: {e}")
-        return ""
 
+def iter_text(raw_bytes: bytes):
+    return iter_text_pieces([raw_bytes])
 
-def extract_docx(raw_bytes: bytes) -> str:
+
+def iter_text_pieces(pieces):
+    """
+    Text segments of TEXT_BLOCK_BYTES from an iterable of byte pieces (e.g.
+    decrypt_file), read only as far as the consumer goes; closing the
+    generator closes `pieces`.
+    """
+    # Incremental decode, so a multi-byte sequence split across blocks survives
+    import codecs
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    block, offset = bytearray(), 0
     try:
-        from docx import Document
-        doc = Document(BytesIO(raw_bytes))
-        return "\n".join(p.text for p in doc.paragraphs)
-    except Exception as e:
-        logger.error(f"DOCX extraction failed: {e}")
-        return ""
+        for piece in pieces:
+            block += piece
+            while len(block) >= TEXT_BLOCK_BYTES:
+                yield _segment(decoder.decode(bytes(block[:TEXT_BLOCK_BYTES])), byte_offset=offset)
+                del block[:TEXT_BLOCK_BYTES]
+                offset += TEXT_BLOCK_BYTES
+        yield _segment(decoder.decode(bytes(block), True), byte_offset=offset)
+    finally:
+        if hasattr(pieces, "close"):
+            pieces.close()
 
 
-def extract_pptx(raw_bytes: bytes) -> str:
+def _render_page(page):
+    import numpy as np
+    pix = page.get_pixmap(dpi=OCR_PDF_DPI)
+    rgb = np.frombuffer(pix.samples, np.uint8).reshape(pix.height, pix.width, pix.n)
+    return np.ascontiguousarray(rgb[:, :, 2::-1])  # RGB(A) → BGR
+
+
+def _ocr_pages(doc, page_numbers):
+    """OCR scanned pages in one batch; falls back to their text layer."""
     try:
-        from pptx import Presentation
-        prs = Presentation(BytesIO(raw_bytes))
-        texts = []
-        for slide in prs.slides:
-            for shape in slide.shapes:
-                if hasattr(shape, "text"):
-                    texts.append(shape.text)
-        return "\n".join(texts)
+        from services.extractors.image_extractor import extract_text_from_images
+        texts = extract_text_from_images([_render_page(doc[i]) for i in page_numbers])
     except Exception as e:
-        logger.error(f"PPTX extraction failed: {e}")
-        return ""
+        logger.error(f"PDF page OCR failed: {e}")
+        texts = [doc[i].get_text() for i in page_numbers]
+    for i, text in zip(page_numbers, texts):
+        yield _segment(text, page=i + 1, ocr=True)
+
+
+def iter_pdf(raw_bytes: bytes):
+    import fitz  # PyMuPDF
+    with fitz.open(stream=raw_bytes, filetype="pdf") as doc:
+        scanned = []      # consecutive scanned pages awaiting one OCR batch
+        ocr_budget = OCR_MAX_PDF_PAGES
+
+        for i, page in enumerate(doc):
+            text = page.get_text()
+            if ocr_budget and len(text.strip()) < OCR_MIN_PAGE_CHARS and page.get_images():
+                scanned.append(i)
+                ocr_budget -= 1
+                if len(scanned) == OCR_PDF_BATCH_PAGES:
+                    yield from _ocr_pages(doc, scanned)
+                    scanned = []
+                continue
+
+            if scanned:
+                yield from _ocr_pages(doc, scanned)
+                scanned = []
+            yield _segment(text, page=i + 1)
 
+        if scanned:
+            yield from _ocr_pages(doc, scanned)
 
-def extract_xlsx(raw_bytes: bytes) -> str:
+
+def iter_docx(raw_bytes: bytes):
+    from docx import Document
+    doc = Document(BytesIO(raw_bytes))
+    for i, p in enumerate(doc.paragraphs):
+        if p.text:
+            yield _segment(p.text, paragraph=i + 1)
+
+
+def iter_pptx(raw_bytes: bytes):
+    from pptx import Presentation
+    prs = Presentation(BytesIO(raw_bytes))
+    for number, slide in enumerate(prs.slides, start=1):
+        texts = [shape.text for shape in slide.shapes if hasattr(shape, "text")]
+        if texts:
+            yield _segment("\n".join(texts), slide=number)
+
+
+def iter_xlsx(raw_bytes: bytes):
+    from openpyxl import load_workbook
+    wb = load_workbook(BytesIO(raw_bytes), data_only=True, read_only=True)
     try:
-        from openpyxl import load_workbook
-        wb = load_workbook(BytesIO(raw_bytes), data_only=True)
-        texts = []
         for sheet in wb.worksheets:
-            for row in sheet.iter_rows(values_only=True):
+            lines, first = [], None
+            for number, row in enumerate(sheet.iter_rows(values_only=True), start=1):
                 row_vals = [str(v) for v in row if v is not None]
-                if row_vals:
-                    texts.append(" ".join(row_vals))
-        return "\n".join(texts)
-    except Exception as e:
-        logger.error(f"XLSX extraction failed: {e}")
-        return ""
+                if not row_vals:
+                    continue
+                if first is None:
+                    first = number
+                lines.append(" ".join(row_vals))
+                if len(lines) == XLSX_ROWS_PER_SEGMENT:
+                    yield _segment("\n".join(lines), sheet=sheet.title, rows=[first, number])
+                    lines, first = [], None
+            if lines:
+                yield _segment("\n".join(lines), sheet=sheet.title, rows=[first, number])
+    finally:
+        wb.close()
 
 
-def extract_image(raw_bytes: bytes) -> str:
-    try:
-        import easyocr
-        import numpy as np
-        import cv2
-
-        reader = easyocr.Reader(["en"])
-        np_img = np.frombuffer(raw_bytes, np.uint8)
-        img = cv2.imdecode(np_img, cv2.IMREAD_COLOR)
-        result = reader.readtext(img, detail=0)
-        return "\n".join(result)
-    except Exception as e:
-        logger.error(f"OCR failed: {e}")
-        return ""
+def iter_image(raw_bytes: bytes):
+    # Shared, lazily loaded reader (models load once per process)
+    from services.extractors.image_extractor import extract_text_from_image
+    yield _segment(extract_text_from_image(raw_bytes), image=1)
 
 
-def extract_html(raw_bytes: bytes) -> str:
-    try:
-        from bs4 import BeautifulSoup
-        html = raw_bytes.decode("utf-8", errors="ignore")
-        soup = BeautifulSoup(html, "html.parser")
-        return soup.get_text(separator="\n")
-    except Exception as e:
-        logger.error(f"HTML extraction failed: {e}")
-        return ""
+def iter_html(raw_bytes: bytes):
+    from bs4 import BeautifulSoup
+    html = raw_bytes.decode("utf-8", errors="ignore")
+    soup = BeautifulSoup(html, "html.parser")
+    yield _segment(soup.get_text(separator="\n"))
 
 
 # ---------------------------
 # Main extraction router
 # ---------------------------
-def extract_text_from_bytes(filename: str, raw_bytes: bytes) -> str:
-    ext = os.path.splitext(filename.lower())[1]
+TEXT_EXTENSIONS = {".txt", ".md", ".log", ".json", ".csv"}
+XLSX_EXTENSIONS = {".xlsx", ".xlsm", ".xltx"}
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+HTML_EXTENSIONS = {".html", ".htm"}
 
-    try:
-        if ext in [".txt", ".md", ".log", ".json"]:
-            return _safe_decode(raw_bytes)
+# Parsers that need the whole document in memory; everything else is read
+# as text and can be decoded piece by piece
+WHOLE_DOCUMENT_EXTENSIONS = (
+    {".pdf", ".docx", ".pptx"} | XLSX_EXTENSIONS | IMAGE_EXTENSIONS | HTML_EXTENSIONS
+)
+
+
+# Bump the entry for a format whenever its extractor's output changes; the
+# reindex sweeper then re-extracts only files of that format
+EXTRACTOR_VERSIONS = {
+    "text": 1,
+    ".pdf": 1,
+    ".docx": 1,
+    ".pptx": 1,
+    "xlsx": 1,
+    "image": 1,
+    "html": 1,
+}
+
+
+def file_extension(filename: str) -> str:
+    return os.path.splitext(filename.lower())[1]
+
+
+def extractor_version(filename: str) -> int:
+    """Version of the extractor iter_segments routes `filename` to."""
+    ext = file_extension(filename)
+    if ext in XLSX_EXTENSIONS:
+        return EXTRACTOR_VERSIONS["xlsx"]
+    if ext in IMAGE_EXTENSIONS:
+        return EXTRACTOR_VERSIONS["image"]
+    if ext in HTML_EXTENSIONS:
+        return EXTRACTOR_VERSIONS["html"]
+    return EXTRACTOR_VERSIONS.get(ext, EXTRACTOR_VERSIONS["text"])
+
+
+def iter_segments(filename: str, raw_bytes: bytes):
+    """Route by extension to the matching segment generator."""
+    ext = file_extension(filename)
 
-        if ext == ".csv":
-            return _safe_decode(raw_bytes)
+    if ext in TEXT_EXTENSIONS:
+        return iter_text(raw_bytes)
 
-        if ext == ".pdf":
-            return extract_pdf(raw_bytes)
+    if ext == ".pdf":
+        return iter_pdf(raw_bytes)
 
-        if ext == ".docx":
-            return extract_docx(raw_bytes)
+    if ext == ".docx":
+        return iter_docx(raw_bytes)
 
-        if ext == ".pptx":
-            return extract_pptx(raw_bytes)
+    if ext == ".pptx":
+        return iter_pptx(raw_bytes)
 
-        if ext in [".xlsx", ".xlsm", ".xltx"]:
-            return extract_xlsx(raw_bytes)
+    if ext in XLSX_EXTENSIONS:
+        return iter_xlsx(raw_bytes)
 
-        if ext in [".jpg", ".jpeg", ".png"]:
-            return extract_image(raw_bytes)
+    if ext in IMAGE_EXTENSIONS:
+        return iter_image(raw_bytes)
 
-        if ext in [".html", ".htm"]:
-            return extract_html(raw_bytes)
+    if ext in HTML_EXTENSIONS:
+        return iter_html(raw_bytes)
 
-        # Fallback attempt
-        return _safe_decode(raw_bytes)
+    # Fallback attempt
+    return iter_text(raw_bytes)
 
+
+def iter_segments_from_pieces(filename: str, pieces):
+    """
+    iter_segments over an iterable of plaintext pieces. Text is decoded as
+    the pieces arrive, so a consumer that stops early (collect_text with
+    max_chars) stops the decryption too; other formats join the pieces first.
+    """
+    if file_extension(filename) in WHOLE_DOCUMENT_EXTENSIONS:
+        return iter_segments(filename, b"".join(pieces))
+    return iter_text_pieces(pieces)
+
+
+def collect_text(segments, max_chars: int = None):
+    """
+    Join segments with newlines, consuming the generator only until
+    `max_chars` is reached (None = no cap). Returns
+    {"text", "truncated", "locations"} where locations are
+    [{"start": char offset, **segment location}] for each segment kept.
+    """
+    parts, locations = [], []
+    length = 0
+    truncated = False
+
+    try:
+        for segment in segments:
+            text = segment["text"] or ""
+            if not text:
+                continue
+            if max_chars is not None and length >= max_chars:
+                truncated = True
+                break
+            # Text blocks are one continuous stream; everything else is a new line
+            if parts and "byte_offset" not in segment["location"]:
+                parts.append("\n")
+                length += 1
+
+            if segment["location"]:
+                locations.append({"start": length, **segment["location"]})
+
+            if max_chars is not None and length + len(text) > max_chars:
+                text = text[:max(0, max_chars - length)]
+                truncated = True
+
+            parts.append(text)
+            length += len(text)
+            if truncated:
+                break
+    finally:
+        if hasattr(segments, "close"):
+            segments.close()  # release the document (e.g. PyMuPDF) early
+
+    return {"text": "".join(parts), "truncated": truncated, "locations": locations}
+
+
+def extract_text_strict(filename: str, raw_bytes: bytes, max_chars: int = None) -> str:
+    """Extract up to max_chars; exceptions from the extractor propagate."""
+    return collect_text(iter_segments(filename, raw_bytes), max_chars)["text"]
+
+
+def extract_text_from_bytes(filename: str, raw_bytes: bytes, max_chars: int = None) -> str:
+    """In-process extraction; returns "" when the extractor fails."""
+    try:
+        return extract_text_strict(filename, raw_bytes, max_chars)
     except Exception as e:
-        logger.error(f"Extraction router failed for {filename}: {e}")
+        logger.error(f"Extraction failed for {filename}: {e}")
         return ""
@@ -0,0 +1,395 @@
+# services/upload_session_service.py
+
+import os
+import secrets
+import threading
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException, Request
+from starlette.requests import ClientDisconnect
+
+from core.concurrency import run_upload_work
+from core.config import (
+    STORAGE_DIR,
+    RESUMABLE_UPLOAD_MAX_SIZE,
+    UPLOAD_SESSION_TTL_HOURS,
+    UPLOAD_SESSION_DIR,
+)
+from core.database import get_connection, transaction
+from core.logger import logger
+from encryption.compression import compression_for
+from encryption.crypto_engine import (
+    CHUNK_SIZE,
+    HEADER_SIZE_V2,
+    new_container_header,
+    seal_records,
+    reseal_records,
+    decrypt_file,
+)
+from services.blob_store import content_hasher
+from services.file_service import _commit_upload, _commit_upload_to_project
+from services.project_db import get_project_by_id
+from services.validation_service import validate_upload
+
+# -------------------------------------------------------
+# Resumable upload sessions
+# -------------------------------------------------------
+#
+#   POST   /uploads?filename=&size=[&project_id=]   -> session (id, chunk_size)
+#   PUT    /uploads/{id}?offset=N                   body = bytes N.. of the file
+#   GET    /uploads/{id}                            -> how much has arrived
+#   POST   /uploads/{id}/finalize                   -> same result as /upload
+#   DELETE /uploads/{id}                            abort
+#
+# Bytes are sealed into the session's container (UPLOAD_SESSION_DIR/<id>) as
+# they arrive, APPEND_BYTES at a time, and `received` is committed after each
+# append, so a dropped connection or a restart loses at most the append in
+# flight: the client asks GET /uploads/{id} and resumes at `received`.
+# Every PUT but the one that reaches the declared size must therefore be a
+# multiple of CHUNK_SIZE (one container record).
+#
+# A record's nonce is fixed by its index, so an index must never be sealed
+# twice under one key (the resumed bytes may differ from the lost ones).
+# Each append commits the indices it is about to seal (`sealed_records`)
+# first; finding them ahead of `received` means the last append died after
+# sealing, and the committed records are re-keyed under a fresh header
+# before anything else is appended.
+#
+# Finalize hashes the plaintext by reading the container back (hasher state
+# can't outlive a restart), then hands it to the normal upload commit, which
+# dedups against the blob store. Sessions idle for UPLOAD_SESSION_TTL_HOURS
+# are dropped.
+
+APPEND_BYTES = 8 * CHUNK_SIZE   # plaintext buffered per append
+
+SESSION_COLUMNS = (
+    "id, project_id, filename, total_size, received, stored_size, created_at, updated_at, sealed_records"
+)
+
+_locks_guard = threading.Lock()
+_locks = {}
+
+
+def _session_lock(session_id: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(session_id, threading.Lock())
+
+
+def _session_path(session_id: str):
+    return UPLOAD_SESSION_DIR / session_id
+
+
+def _row_to_session(r):
+    return {
+        "id": r[0],
+        "project_id": r[1],
+        "filename": r[2],
+        "total_size": r[3],
+        "received": r[4],
+        "stored_size": r[5],
+        "created_at": r[6],
+        "updated_at": r[7],
+        "sealed_records": r[8],
+        "chunk_size": CHUNK_SIZE,
+        # Past the header means the final record is sealed (zero-byte uploads)
+        "complete": r[4] == r[3] and r[5] > HEADER_SIZE_V2,
+    }
+
+
+def get_session(session_id: str) -> dict:
+    row = get_connection().execute(
+        f"SELECT {SESSION_COLUMNS} FROM upload_sessions WHERE id = ?", (session_id,)
+    ).fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return _row_to_session(row)
+
+
+# -------------------------------------------------------
+# Create / abort / expire
+# -------------------------------------------------------
+
+def create_session(filename: str, size: int, project_id: int = None) -> dict:
+    validate_upload(filename, size, RESUMABLE_UPLOAD_MAX_SIZE)
+    if size < 0:
+        raise HTTPException(status_code=400, detail="Size must not be negative")
+
+    if project_id is not None:
+        if not get_project_by_id(project_id):
+            raise HTTPException(status_code=404, detail="Project not found")
+    elif (STORAGE_DIR / filename).exists():
+        raise HTTPException(status_code=409, detail="File already exists")
+
+    expire_sessions()
+
+    session_id = secrets.token_hex(16)
+    header = new_container_header(compression_for(filename))
+    UPLOAD_SESSION_DIR.mkdir(parents=True, exist_ok=True)
+    with open(_session_path(session_id), "wb") as f:
+        f.write(header)
+
+    now = datetime.utcnow().isoformat()
+    with transaction() as conn:
+        conn.execute(
+            f"INSERT INTO upload_sessions ({SESSION_COLUMNS}) VALUES (?, ?, ?, ?, 0, ?, ?, ?, 0)",
+            (session_id, project_id, filename, size, len(header), now, now),
+        )
+
+    if size == 0:
+        _append(session_id, 0, b"", final=True)
+
+    logger.info(f"Upload session {session_id} | {filename} ({size} bytes, project={project_id})")
+    return get_session(session_id)
+
+
+def _remove_session(session_id: str):
+    with transaction() as conn:
+        conn.execute("DELETE FROM upload_sessions WHERE id = ?", (session_id,))
+    for path in (_session_path(session_id), _session_path(session_id + ".commit"),
+                 _session_path(session_id + ".rekey")):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+    with _locks_guard:
+        _locks.pop(session_id, None)
+
+
+def abort_session(session_id: str):
+    get_session(session_id)
+    with _session_lock(session_id):
+        _remove_session(session_id)
+    return {"message": "Upload session aborted", "id": session_id}
+
+
+def expire_sessions() -> int:
+    """
+    Drop sessions idle for longer than UPLOAD_SESSION_TTL_HOURS and session
+    files without a row (left by a crash during create). Returns sessions dropped.
+    """
+    cutoff = (datetime.utcnow() - timedelta(hours=UPLOAD_SESSION_TTL_HOURS)).isoformat()
+    conn = get_connection()
+    stale = [r[0] for r in conn.execute(
+        "SELECT id FROM upload_sessions WHERE updated_at < ?", (cutoff,)
+    )]
+    for session_id in stale:
+        _remove_session(session_id)
+
+    if UPLOAD_SESSION_DIR.exists():
+        known = {r[0] for r in conn.execute("SELECT id FROM upload_sessions")}
+        for path in UPLOAD_SESSION_DIR.iterdir():
+            if path.name.split(".")[0] in known:
+                continue
+            try:
+                if datetime.utcfromtimestamp(path.stat().st_mtime).isoformat() < cutoff:
+                    path.unlink()
+            except OSError:
+                pass
+
+    if stale:
+        logger.info(f"Expired {len(stale)} idle upload sessions")
+    return len(stale)
+
+
+# -------------------------------------------------------
+# Append
+# -------------------------------------------------------
+
+def _rekey(session: dict, compression) -> int:
+    """
+    Cut the session container back to its committed records and re-encrypt
+    them under a fresh header (new key and nonce prefix). Returns the new
+    container size.
+    """
+    path = _session_path(session["id"])
+    rekeyed = _session_path(session["id"] + ".rekey")
+    header = new_container_header(compression)
+    with open(path, "r+b") as src, open(rekeyed, "wb") as dst:
+        src.truncate(session["stored_size"])
+        dst.write(header)
+        for record in reseal_records(src, header, compression[1] if compression else 0):
+            dst.write(record)
+        dst.flush()
+        os.fsync(dst.fileno())
+        stored_size = dst.tell()
+    os.replace(rekeyed, path)
+    logger.info(f"Upload session {session['id']} re-keyed after an interrupted append")
+    return stored_size
+
+
+def _append(session_id: str, expected: int, data: bytes, final: bool) -> int:
+    """
+    Seal `data` (plaintext at offset `expected`) onto the session container
+    and commit the new `received`. Anything past the committed container
+    size (an interrupted append) is cut off first, and the container is
+    re-keyed if those records were sealed already. Returns `received`.
+    """
+    with _session_lock(session_id):
+        session = get_session(session_id)
+        if session["complete"]:
+            raise HTTPException(status_code=409, detail="Upload is already complete")
+        if session["received"] != expected:
+            raise HTTPException(
+                status_code=409,
+                detail={"message": "Offset does not match the upload", "received": session["received"]},
+            )
+
+        compression = compression_for(session["filename"])
+        level = compression[1] if compression else 0
+        first_index = expected // CHUNK_SIZE
+        stored_size = session["stored_size"]
+        if session["sealed_records"] > first_index:
+            stored_size = _rekey(session, compression)
+
+        # Reserve the indices before any of them reaches the cipher
+        with transaction() as conn:
+            conn.execute(
+                "UPDATE upload_sessions SET stored_size = ?, sealed_records = ? WHERE id = ?",
+                (stored_size, first_index + len(data) // CHUNK_SIZE + (1 if final else 0), session_id),
+            )
+
+        with open(_session_path(session_id), "r+b") as f:
+            header = f.read(HEADER_SIZE_V2)
+            f.truncate(stored_size)
+            f.seek(stored_size)
+            for record in seal_records(header, first_index, data, final, level):
+                f.write(record)
+            f.flush()
+            os.fsync(f.fileno())
+            stored_size = f.tell()
+
+        received = expected + len(data)
+        with transaction() as conn:
+            conn.execute(
+                "UPDATE upload_sessions SET received = ?, stored_size = ?, updated_at = ? WHERE id = ?",
+                (received, stored_size, datetime.utcnow().isoformat(), session_id),
+            )
+        return received
+
+
+async def handle_put_chunk(session_id: str, offset: int, request: Request):
+    """
+    Stream the request body into the session starting at `offset`, which
+    must equal the bytes received so far (409 otherwise, with `received`).
+    """
+    session = await run_upload_work(get_session, session_id)
+    total = session["total_size"]
+    if offset != session["received"]:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Offset does not match the upload", "received": session["received"]},
+        )
+    if session["complete"]:
+        # A retried last PUT: everything is sealed already, nothing to append
+        async for piece in request.stream():
+            if piece:
+                raise HTTPException(status_code=400, detail="Chunk runs past the declared size")
+        return {"id": session_id, "received": total, "total_size": total, "complete": True}
+
+    length = request.headers.get("content-length")
+    if length is not None:
+        end = offset + int(length)
+        if end > total:
+            raise HTTPException(status_code=400, detail="Chunk runs past the declared size")
+        if end < total and int(length) % CHUNK_SIZE:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Chunks before the last must be a multiple of {CHUNK_SIZE} bytes",
+            )
+
+    received = offset
+    buffer = bytearray()
+    try:
+        async for piece in request.stream():
+            buffer += piece
+            if received + len(buffer) > total:
+                raise HTTPException(status_code=400, detail="Chunk runs past the declared size")
+            if len(buffer) >= APPEND_BYTES:
+                cut = len(buffer) - len(buffer) % CHUNK_SIZE
+                received = await run_upload_work(_append, session_id, received, bytes(buffer[:cut]), False)
+                del buffer[:cut]
+    except ClientDisconnect:
+        # Whole records already appended are kept; the client resumes at `received`
+        logger.info(f"Upload session {session_id} interrupted at {received} bytes")
+        raise
+
+    if received + len(buffer) == total:
+        received = await run_upload_work(_append, session_id, received, bytes(buffer), True)
+    else:
+        cut = len(buffer) - len(buffer) % CHUNK_SIZE
+        if cut:
+            received = await run_upload_work(_append, session_id, received, bytes(buffer[:cut]), False)
+        if cut != len(buffer):
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "message": f"Chunks before the last must be a multiple of {CHUNK_SIZE} bytes",
+                    "received": received,
+                },
+            )
+
+    return {"id": session_id, "received": received, "total_size": total, "complete": received == total}
+
+
+# -------------------------------------------------------
+# Finalize
+# -------------------------------------------------------
+
+def _finalize(session_id: str):
+    with _session_lock(session_id):
+        session = get_session(session_id)
+        if not session["complete"]:
+            raise HTTPException(
+                status_code=409,
+                detail={"message": "Upload is incomplete", "received": session["received"]},
+            )
+
+        filename = session["filename"]
+        project = None
+        if session["project_id"] is not None:
+            project = get_project_by_id(session["project_id"])
+            if not project:
+                raise HTTPException(status_code=404, detail="Project not found")
+        elif (STORAGE_DIR / filename).exists():
+            raise HTTPException(status_code=409, detail="File already exists")
+
+        # Reading the container back also authenticates every record
+        path = _session_path(session_id)
+        hasher, plain_size = content_hasher(), 0
+        try:
+            for piece in decrypt_file(path):
+                hasher.update(piece)
+                plain_size += len(piece)
+        except ValueError as e:
+            logger.error(f"Upload session {session_id} container is corrupt: {e}")
+            raise HTTPException(status_code=500, detail="Upload is corrupt; abort and retry")
+        if plain_size != session["total_size"]:
+            raise HTTPException(status_code=500, detail="Upload is corrupt; abort and retry")
+
+        # Commit a second link, so a failed commit (which discards its
+        # staging file) leaves the session intact for another finalize
+        staging = _session_path(session_id + ".commit")
+        try:
+            os.link(path, staging)
+        except FileExistsError:
+            pass
+        except OSError:
+            staging = path
+        staged = {
+            "hash": hasher.hexdigest(),
+            "plain_size": plain_size,
+            "staging": staging,
+            "compression": compression_for(filename),
+        }
+
+        if project is None:
+            result = _commit_upload(filename, staged)
+        else:
+            result = _commit_upload_to_project(project, filename, staged)
+
+        _remove_session(session_id)
+        return result
+
+
+async def handle_finalize(session_id: str):
+    return await run_upload_work(_finalize, session_id)
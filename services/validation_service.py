@@ -3,8 +3,9 @@
 import os
 from fastapi import HTTPException
 
-MAX_FILE_SIZE_MB = 500  # adjust as needed
-MAX_FILE_SIZE = MAX_FILE_SIZE_MB * 1024 * 1024
+from core.config import MAX_UPLOAD_SIZE
+
+MAX_FILE_SIZE = MAX_UPLOAD_SIZE  # single-request uploads; larger files use upload sessions
 
 ILLEGAL_FILENAME_CHARS = set(r'\/:*?"<>|')
 
@@ -27,22 +28,23 @@ def validate_filename(name: str):
     return True
 
 
-def validate_file_size(size: int):
+def validate_file_size(size: int, limit: int = MAX_FILE_SIZE):
     """
     Enforce max file size constraints.
     """
-    if size > MAX_FILE_SIZE:
+    if size > limit:
         raise HTTPException(
             status_code=413,
-            detail=f"File size exceeds the limit of {MAX_FILE_SIZE_MB} MB"
+            detail=f"File size exceeds the limit of {limit // (1024 * 1024)} MB"
         )
     return True
 
 
-def validate_upload(filename: str, raw_bytes: bytes):
+def validate_upload(filename: str, size: int, limit: int = MAX_FILE_SIZE):
     """
-    Main upload validator used by file_service.py
+    Main upload validator used by file_service.py.
+    Takes the upload size rather than its bytes so callers can stream.
     """
     validate_filename(filename)
-    validate_file_size(len(raw_bytes))
+    validate_file_size(size, limit)
     return True
@@ -0,0 +1,187 @@
+# services/vector_store.py
+
+import json
+import threading
+
+import numpy as np
+
+
+def encode_vector(vec) -> bytes:
+    """Serialise an embedding as a float32 BLOB for SQLite."""
+    return np.asarray(vec, dtype=np.float32).tobytes()
+
+
+def decode_vector(value):
+    """Inverse of encode_vector; also accepts the old JSON TEXT encoding."""
+    if isinstance(value, str):
+        return np.asarray(json.loads(value), dtype=np.float32)
+    return np.frombuffer(value, dtype=np.float32)
+
+
+class VectorStore:
+    """
+    Process-wide, contiguous float32 matrix of normalised embeddings plus a
+    parallel int64 id array. Loaded once from SQLite via `loader`, then kept
+    current with upsert()/remove() so queries never touch the database.
+
+    With an `ann` backend (services/ann_index.py) and at least `ann_min`
+    vectors, queries score only the backend's candidates instead of every row.
+    """
+
+    def __init__(self, loader, ann=None, ann_min: int = 0):
+        self._loader = loader
+        self._ann = ann
+        self._ann_min = ann_min
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._matrix = None          # shape (capacity, dim), rows [0, _count) live
+        self._ids = np.empty(0, dtype=np.int64)
+        self._pos = {}               # id -> row
+        self._count = 0
+
+    # ---------- loading ----------
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            for key, blob in self._loader():
+                self._put(key, decode_vector(blob))
+            self._loaded = True
+
+            if self._ann is not None and self._count:
+                keys, matrix = self._ids[:self._count], self._matrix[:self._count]
+                if not self._ann.load(keys, matrix):
+                    self._maybe_train()
+
+    def reload(self):
+        with self._lock:
+            self._matrix = None
+            self._ids = np.empty(0, dtype=np.int64)
+            self._pos = {}
+            self._count = 0
+            self._loaded = False
+        self._ensure_loaded()
+
+    # ---------- ANN maintenance ----------
+    def _maybe_train(self):
+        """(Re)build the ANN index once the collection is big enough, and
+        again whenever it has doubled since the last build."""
+        if self._ann is None or self._count < self._ann_min:
+            return
+        if self._ann.ready and self._count < 2 * self._ann.trained_size:
+            return
+
+        self._ann.train(self._ids[:self._count].copy(), self._matrix[:self._count])
+        self._ann.save()
+
+    def save_ann(self):
+        with self._lock:
+            if self._ann is not None and self._loaded:
+                self._ann.save()
+
+    # ---------- mutation ----------
+    def _grow(self, dim: int):
+        capacity = 0 if self._matrix is None else self._matrix.shape[0]
+        new_capacity = max(1024, capacity * 2)
+
+        matrix = np.empty((new_capacity, dim), dtype=np.float32)
+        ids = np.empty(new_capacity, dtype=np.int64)
+        if self._count:
+            matrix[:self._count] = self._matrix[:self._count]
+            ids[:self._count] = self._ids[:self._count]
+        self._matrix, self._ids = matrix, ids
+
+    def _put(self, key: int, vec):
+        vec = np.asarray(vec, dtype=np.float32).ravel()
+
+        row = self._pos.get(key)
+        if row is not None:
+            self._matrix[row] = vec
+            return
+
+        if self._matrix is None or self._count == self._matrix.shape[0]:
+            self._grow(vec.shape[0])
+
+        self._matrix[self._count] = vec
+        self._ids[self._count] = key
+        self._pos[key] = self._count
+        self._count += 1
+
+    def upsert(self, key: int, vec):
+        with self._lock:
+            # Writes before the first query are picked up by the initial load
+            if self._loaded:
+                self._put(key, vec)
+                if self._ann is not None:
+                    self._ann.add(key, self._matrix[self._pos[key]])
+                    self._maybe_train()
+
+    def remove(self, key: int):
+        with self._lock:
+            if not self._loaded:
+                return
+            row = self._pos.pop(key, None)
+            if row is None:
+                return
+            if self._ann is not None:
+                self._ann.remove(key)
+
+            # Swap the last live row into the hole to keep the matrix dense
+            last = self._count - 1
+            if row != last:
+                self._matrix[row] = self._matrix[last]
+                moved = int(self._ids[last])
+                self._ids[row] = moved
+                self._pos[moved] = row
+            self._count = last
+
+    # ---------- queries ----------
+    def __len__(self):
+        self._ensure_loaded()
+        return self._count
+
+    def search(self, query_vec, top_k: int = 10, probes=None, exact: bool = False):
+        """
+        Cosine search (vectors are normalised). Exact mode is one
+        matrix-vector product plus argpartition; ANN mode scores only the
+        candidate rows proposed by the backend (`probes` widens the search).
+        Returns [(id, score), ...] best first.
+        """
+        self._ensure_loaded()
+        query_vec = np.asarray(query_vec, dtype=np.float32).ravel()
+
+        with self._lock:
+            n = self._count
+            if n == 0 or top_k <= 0:
+                return []
+
+            use_ann = (
+                not exact
+                and self._ann is not None
+                and self._ann.ready
+                and n >= self._ann_min
+            )
+            if use_ann:
+                keys = self._ann.candidates(query_vec, top_k, probes)
+                rows = np.fromiter(
+                    (self._pos[k] for k in keys if k in self._pos), dtype=np.int64
+                )
+            else:
+                rows = None
+
+            if rows is None:
+                scores = self._matrix[:n] @ query_vec
+                ids = self._ids[:n].copy()
+            else:
+                if len(rows) == 0:
+                    return []
+                scores = self._matrix[rows] @ query_vec
+                ids = self._ids[rows]
+
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [(int(ids[i]), float(scores[i])) for i in top]
@@ -0,0 +1,59 @@
+# tests/test_content_search.py
+
+import time
+
+import pytest
+
+from core import config
+from core.database import close_connection, get_connection
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "DB_PATH", tmp_path / "vault.db")
+    close_connection()
+    from core.db_init import init_db
+    init_db()
+    yield get_connection()
+    close_connection()
+
+
+def _index(conn, name: str, content: str):
+    file_id = conn.execute(
+        "INSERT INTO files (name, path, size, created_at, modified_at, is_latest) "
+        "VALUES (?, ?, 1, 'x', 'x', 1)",
+        (name, name),
+    ).lastrowid
+    conn.execute(
+        "INSERT INTO file_index (file_id, content, created_at, updated_at) VALUES (?, ?, 'x', 'x')",
+        (file_id, content),
+    )
+
+
+def test_many_matches_search_is_not_quadratic(fresh_db):
+    # snippet() used to take ~16s here: it scores every one of the 40k matches
+    _index(fresh_db, "app.log", "2024-01-01 INFO request served ok\n" * 40_000)
+    from services.search_service import search_by_content
+
+    started = time.perf_counter()
+    [hit] = search_by_content("INFO")
+    assert time.perf_counter() - started < 2
+    assert hit["name"] == "app.log"
+    assert hit["snippet"].startswith("2024-01-01 [INFO] request served ok")
+    assert hit["snippet"].endswith(" … ")
+
+
+@pytest.mark.parametrize("q, syntax, highlighted", [
+    ("invoice 2024", "simple", ["[invoice]", "[2024]"]),
+    ("invo*", "simple", ["[invoice]"]),
+    ("cafe", "simple", ["[café]"]),                  # diacritics folded like the index
+    ('"invoice for" OR nothing', "fts", ["[invoice] [for]"]),
+])
+def test_snippet_highlights_first_match(fresh_db, q, syntax, highlighted):
+    _index(fresh_db, "b.txt", "lorem ipsum " * 500 + "the café invoice for 2024 was paid" + " dolor" * 500)
+    from services.search_service import search_by_content
+
+    [hit] = search_by_content(q, syntax=syntax)
+    assert hit["snippet"].startswith(" … ") and hit["snippet"].endswith(" … ")
+    for word in highlighted:
+        assert word in hit["snippet"]
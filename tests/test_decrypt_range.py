@@ -0,0 +1,92 @@
+# tests/test_decrypt_range.py
+
+import os
+from io import BytesIO
+
+import pytest
+from Crypto.Cipher import AES
+
+from encryption.compression import CODEC_ZLIB
+from encryption.crypto_engine import (
+    KEY,
+    decrypt_bytes,
+    decrypt_range,
+    encrypt_stream,
+    pad,
+    plaintext_size,
+    read_layout,
+)
+
+CHUNK = 64   # small records, so boundaries are cheap to hit
+
+
+def _store(tmp_path, data: bytes, compression=None):
+    path = tmp_path / "blob"
+    path.write_bytes(b"".join(encrypt_stream(BytesIO(data), CHUNK, compression)))
+    return path
+
+
+def _boundary_ranges(size: int):
+    """(start, end) pairs around every record boundary, plus whole-body reads."""
+    ranges = {(0, size - 1), (0, 0), (size - 1, size - 1)}
+    for edge in range(CHUNK, size, CHUNK):
+        ranges |= {
+            (edge - 1, edge - 1),               # last byte of a record
+            (edge, edge),                       # first byte of the next
+            (edge - 1, edge),                   # straddling the boundary
+            (edge - CHUNK, edge - 1),           # exactly one record
+            (max(edge - 5, 0), min(edge + CHUNK + 5, size - 1)),   # spans records
+        }
+    return sorted(r for r in ranges if 0 <= r[0] <= r[1] < size)
+
+
+# Exact multiples end in an empty final record
+SIZES = [1, CHUNK - 1, CHUNK, CHUNK + 1, 3 * CHUNK, 3 * CHUNK + 17]
+
+
+@pytest.mark.parametrize("compression", [None, (CODEC_ZLIB, 6)], ids=["raw", "zlib"])
+@pytest.mark.parametrize("size", SIZES)
+def test_decrypt_range_matches_decrypt_bytes(tmp_path, size, compression):
+    # Half random, half repetitive: some records compress, some are stored raw
+    data = os.urandom(size // 2) + b"a" * (size - size // 2)
+    path = _store(tmp_path, data, compression)
+    plain = decrypt_bytes(path.read_bytes())
+    assert plain == data
+    assert plaintext_size(path) == size
+
+    for start, end in _boundary_ranges(size):
+        assert b"".join(decrypt_range(path, start, end)) == plain[start:end + 1], (start, end)
+
+
+@pytest.mark.parametrize("compression", [None, (CODEC_ZLIB, 6)], ids=["raw", "zlib"])
+@pytest.mark.parametrize("size", SIZES)
+def test_decrypt_range_with_stored_size_layout(tmp_path, size, compression):
+    # One layout from the stored plain_size, shared by every range of a request
+    data = os.urandom(size // 2) + b"a" * (size - size // 2)
+    path = _store(tmp_path, data, compression)
+    layout = read_layout(path, plain_size=size)
+    assert layout["records"] == read_layout(path)["records"]
+
+    for start, end in reversed(_boundary_ranges(size)):
+        assert b"".join(decrypt_range(path, start, end, layout)) == data[start:end + 1], (start, end)
+
+
+def test_decrypt_range_past_the_end_is_clamped(tmp_path):
+    data = os.urandom(2 * CHUNK)
+    path = _store(tmp_path, data)
+    assert b"".join(decrypt_range(path, 2 * CHUNK - 3, 10 * CHUNK)) == data[-3:]
+
+
+@pytest.mark.parametrize("size", [1, 15, 16, 17, 100])
+def test_decrypt_range_legacy_blob(tmp_path, size):
+    data = os.urandom(size)
+    iv = os.urandom(16)
+    path = tmp_path / "legacy"
+    path.write_bytes(iv + AES.new(KEY, AES.MODE_CBC, iv).encrypt(pad(data)))
+
+    assert decrypt_bytes(path.read_bytes()) == data
+    assert plaintext_size(path) == size
+    assert read_layout(path, plain_size=size) == {"legacy": True, "plain_size": size}
+    for start in range(size):
+        for end in range(start, size):
+            assert b"".join(decrypt_range(path, start, end)) == data[start:end + 1]
@@ -0,0 +1,43 @@
+# tests/test_image_extractor.py
+
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Runs in a fresh interpreter, so the reader is created lazily on the first
+# call exactly as in a new extraction worker; easyocr is replaced by a stub.
+_SCRIPT = textwrap.dedent("""
+    import sys, types
+    import numpy as np
+    import cv2
+
+    class Reader:
+        def __init__(self, langs):
+            pass
+        def readtext(self, img, detail=0, batch_size=1):
+            return ["hello", "world"]
+        def readtext_batched(self, images, detail=0, batch_size=1):
+            return [["hello"] for _ in images]
+
+    sys.modules["easyocr"] = types.SimpleNamespace(Reader=Reader)
+
+    from services.extractors import image_extractor
+
+    png = cv2.imencode(".png", np.full((20, 20, 3), 255, np.uint8))[1].tobytes()
+    assert image_extractor.extract_text_from_image(png) == "hello\\nworld"
+    assert image_extractor.extract_text_from_image(png) == "hello\\nworld"
+    assert image_extractor.extract_text_from_images([png, png]) == ["hello", "hello"]
+    print("ok")
+""")
+
+
+def test_first_extraction_in_fresh_process_does_not_deadlock():
+    result = subprocess.run(
+        [sys.executable, "-c", _SCRIPT],
+        cwd=ROOT, capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().endswith("ok")
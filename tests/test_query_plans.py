@@ -0,0 +1,28 @@
+# tests/test_query_plans.py
+
+import pytest
+
+from core import config
+from core.database import close_connection, get_connection
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    # A new database built the way the app builds it, on this thread only
+    monkeypatch.setattr(config, "DB_PATH", tmp_path / "vault.db")
+    close_connection()
+    from core.db_init import init_db
+    init_db()
+    yield get_connection()
+    close_connection()
+
+
+def test_hot_path_queries_use_indexes(fresh_db):
+    from core.schema import audit_query_plans, hot_path_queries
+
+    for name, (sql, params) in hot_path_queries().items():
+        plan = [row[3] for row in fresh_db.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        assert not any("SCAN files" in d for d in plan), f"{name}: {plan}"
+
+    # Also catches scans of aliased tables (FROM files f) and of other tables
+    assert audit_query_plans() == {}
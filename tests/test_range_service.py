@@ -0,0 +1,154 @@
+# tests/test_range_service.py
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from services.range_service import (
+    MAX_RANGES,
+    _if_range_matches,
+    build_source_response,
+    parse_range_header,
+)
+
+SIZE = 1000
+
+
+class MemorySource:
+    """Range source over an in-memory body, like chunk_store.ManifestSource."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.size = len(data)
+        self.mtime = 0
+        self.stored_size = len(data)
+        self.validator = "m1"
+
+    def iter_all(self):
+        yield self.data
+
+    def iter_range(self, start: int, end: int):
+        yield self.data[start:end + 1]
+
+
+def _body(response) -> bytes:
+    async def collect():
+        return b"".join([piece async for piece in response.body_iterator])
+    return asyncio.run(collect())
+
+
+# -------------------------------------------------------
+# parse_range_header
+# -------------------------------------------------------
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", [(0, 99)]),
+    ("bytes=500-", [(500, 999)]),
+    ("bytes=-100", [(900, 999)]),
+    ("bytes=-5000", [(0, 999)]),               # suffix longer than the body
+    ("bytes=990-5000", [(990, 999)]),          # end clamped to the body
+    ("bytes=999-999", [(999, 999)]),
+    ("BYTES = 0-0", [(0, 0)]),
+    ("bytes=0-9, 20-29", [(0, 9), (20, 29)]),
+    ("bytes=20-29,0-9", [(20, 29), (0, 9)]),       # disjoint ranges keep their order
+    ("bytes=0-99,50-149", [(0, 149)]),             # overlapping ranges are merged
+    ("bytes=0-9,900-,-50,5-5", [(0, 9), (900, 999)]),
+    ("bytes=0-9,,5000-6000", [(0, 9)]),           # unsatisfiable part dropped
+])
+def test_parse_range(header, expected):
+    assert parse_range_header(header, SIZE) == expected
+
+
+@pytest.mark.parametrize("header", [
+    None,
+    "",
+    "items=0-9",
+    "bytes=",
+    "bytes=abc",
+    "bytes=5",
+    "bytes=9-0",
+    "bytes=x-9",
+    "bytes=" + ",".join(f"{i}-{i}" for i in range(MAX_RANGES + 1)),
+])
+def test_parse_range_ignored(header):
+    # Malformed headers are ignored: the whole body is served
+    assert parse_range_header(header, SIZE) is None
+
+
+@pytest.mark.parametrize("header", [
+    "bytes=1000-",
+    "bytes=5000-6000",
+    "bytes=-0",
+    "bytes=1000-1999,2000-",
+])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(HTTPException) as e:
+        parse_range_header(header, SIZE)
+    assert e.value.status_code == 416
+    assert e.value.headers["Content-Range"] == f"bytes */{SIZE}"
+
+
+def test_parse_range_empty_body():
+    with pytest.raises(HTTPException) as e:
+        parse_range_header("bytes=0-0", 0)
+    assert e.value.status_code == 416
+
+
+# -------------------------------------------------------
+# If-Range
+# -------------------------------------------------------
+
+def test_if_range():
+    etag, date = '"7-100-1"', "Thu, 01 Jan 1970 00:00:00 GMT"
+    assert _if_range_matches(None, etag, date)
+    assert _if_range_matches(etag, etag, date)
+    assert _if_range_matches(date, etag, date)
+    assert not _if_range_matches('"7-100-2"', etag, date)
+    assert not _if_range_matches("W/" + etag, etag, date)   # weak never matches
+    assert not _if_range_matches("Fri, 02 Jan 1970 00:00:00 GMT", etag, date)
+
+
+# -------------------------------------------------------
+# Responses
+# -------------------------------------------------------
+
+FILE = {"id": 7, "name": "a.bin"}
+DATA = bytes(range(256)) * 4
+
+
+def test_single_range_response():
+    response = build_source_response(FILE, MemorySource(DATA), "bytes=10-19")
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == f"bytes 10-19/{len(DATA)}"
+    assert response.headers["Content-Length"] == "10"
+    assert _body(response) == DATA[10:20]
+
+
+def test_stale_if_range_serves_full_body():
+    source = MemorySource(DATA)
+    response = build_source_response(FILE, source, "bytes=10-19", if_range='"stale"')
+    assert response.status_code == 200
+    assert response.headers["Content-Length"] == str(len(DATA))
+    assert _body(response) == DATA
+
+    etag = response.headers["ETag"]
+    response = build_source_response(FILE, source, "bytes=10-19", if_range=etag)
+    assert response.status_code == 206
+
+
+def test_multipart_response_with_overlapping_ranges():
+    response = build_source_response(FILE, MemorySource(DATA), "bytes=-10,0-99,50-149")
+    assert response.status_code == 206
+    boundary = response.media_type.split("boundary=")[1]
+    body = _body(response)
+    assert len(body) == int(response.headers["Content-Length"])
+
+    parts = body.split(f"--{boundary}".encode())
+    assert parts[0] == b"" and parts[-1] == b"--\r\n"
+    expected = [(0, 149), (len(DATA) - 10, len(DATA) - 1)]
+    assert len(parts) == len(expected) + 2
+    for part, (start, end) in zip(parts[1:-1], expected):
+        head, _, payload = part.partition(b"\r\n\r\n")
+        assert f"Content-Range: bytes {start}-{end}/{len(DATA)}".encode() in head
+        assert payload == DATA[start:end + 1] + b"\r\n"